@@ -0,0 +1,174 @@
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Espera máxima, em segundos, pelo índice ocupado por outro processo
+ESPERA_INDICE = 30
+# Segmentos mantidos abertos ao mesmo tempo; os menos usados são fechados e reabertos quando preciso
+SEGMENTOS_ABERTOS = 8
+
+class ArquivoExtratos:
+    '''
+    Arquivo permanente das respostas da API VORTX, para auditoria e para
+    reprocessar datas sem consultar a API (--replay).
+
+    Cada resposta é um membro gzip independente, com uma linha JSON,
+    acrescentado ao fim de <pasta>/<aaaa-mm-dd>/<segmento>.jsonl.gz; o arquivo
+    continua sendo um gzip válido de JSON por linha (zcat e gzip.open leem
+    todos os membros em sequência). Cada processo grava no seu próprio
+    segmento (máquina, PID e horário de início), de modo que execuções
+    simultâneas, inclusive com --shard, não disputam o mesmo arquivo.
+
+    O índice <pasta>/indice.sqlite guarda, por (CNPJ, data), o arquivo, a
+    posição e o tamanho da versão mais recente, permitindo ler um único
+    extrato sem percorrer os demais. Versões anteriores permanecem nos arquivos.
+    O índice usa WAL e cada gravação é confirmada em uma transação curta, de
+    modo que vários processos podem compartilhar a mesma pasta.
+
+    Falhas ao gravar são exibidas e não interrompem a busca: o arquivo é
+    complementar ao banco, não uma etapa obrigatória.
+    '''
+
+    def __init__(self, pasta='./Arquivo'):
+        os.makedirs(pasta, exist_ok=True)
+        self.pasta = pasta
+        self.segmento = f'{socket.gethostname()}_{os.getpid()}_{time.strftime("%Y%m%d%H%M%S")}'
+        self.gravados = 0
+        self.falhas = 0
+        self._arquivos = OrderedDict()
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(os.path.join(pasta, 'indice.sqlite'), check_same_thread=False,
+                                        timeout=ESPERA_INDICE)
+        # Com WAL, leitores não bloqueiam o escritor; sem suporte (ex.: pasta de rede), segue no modo padrão
+        self._conexao.execute('PRAGMA journal_mode=WAL')
+        self._conexao.execute('PRAGMA synchronous=NORMAL')
+        self._conexao.execute('''
+            CREATE TABLE IF NOT EXISTS extratos (
+                cnpj TEXT NOT NULL,
+                data TEXT NOT NULL,
+                arquivo TEXT NOT NULL,
+                posicao INTEGER NOT NULL,
+                tamanho INTEGER NOT NULL,
+                gravado_em REAL NOT NULL,
+                PRIMARY KEY (cnpj, data)
+            )
+        ''')
+        self._conexao.execute('CREATE INDEX IF NOT EXISTS ix_extratos_data ON extratos (data)')
+        self._conexao.commit()
+
+    def _arquivo_data(self, data):
+        '''
+        Segmento deste processo para a data, aberto para acréscimo. Só os
+        SEGMENTOS_ABERTOS usados mais recentemente ficam abertos, de modo que
+        uma carga de muitas datas não esgota os descritores de arquivo.
+        '''
+        arquivo = self._arquivos.get(data)
+        if arquivo is not None:
+            self._arquivos.move_to_end(data)
+            return arquivo
+        while len(self._arquivos) >= SEGMENTOS_ABERTOS:
+            self._arquivos.popitem(last=False)[1].close()
+        pasta_data = os.path.join(self.pasta, data)
+        os.makedirs(pasta_data, exist_ok=True)
+        arquivo = self._arquivos[data] = open(os.path.join(pasta_data, f'{self.segmento}.jsonl.gz'), 'ab')
+        return arquivo
+
+    def gravar(self, cnpj, data, dados):
+        '''
+        Acrescenta a resposta ao segmento da data e aponta o índice para ela.
+        Retorna False (após exibir o erro) se a gravação falhar.
+        '''
+        data = str(data)[:10]
+        with self._trava:
+            try:
+                linha = json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+                membro = gzip.compress(linha)
+                arquivo = self._arquivo_data(data)
+                arquivo.seek(0, os.SEEK_END)
+                posicao = arquivo.tell()
+                arquivo.write(membro)
+                # O índice só pode apontar para bytes que já estão no arquivo
+                arquivo.flush()
+                with self._conexao:
+                    self._conexao.execute(
+                        'INSERT OR REPLACE INTO extratos VALUES (?, ?, ?, ?, ?, ?)',
+                        (cnpj, data, f'{data}/{self.segmento}.jsonl.gz', posicao, len(membro), time.time()),
+                    )
+            except (OSError, sqlite3.Error, TypeError, ValueError) as e:
+                self.falhas += 1
+                print(f'Erro ao arquivar o extrato de {cnpj} em {data}: {e}')
+                return False
+            self.gravados += 1
+        return True
+
+    def contem(self, cnpj, data):
+        ''' Indica se há extrato arquivado para (CNPJ, data); em caso de erro no índice, retorna False. '''
+        with self._trava:
+            try:
+                return self._conexao.execute(
+                    'SELECT 1 FROM extratos WHERE cnpj = ? AND data = ?', (cnpj, str(data)[:10])
+                ).fetchone() is not None
+            except sqlite3.Error as e:
+                print(f'Erro ao consultar o índice do arquivo de extratos: {e}')
+                return False
+
+    def _ler_membro(self, arquivo, posicao, tamanho):
+        arquivo.seek(posicao)
+        return json.loads(gzip.decompress(arquivo.read(tamanho)))
+
+    def ler(self, cnpj, data):
+        ''' Retorna a versão mais recente do extrato arquivado, ou None se não houver. '''
+        with self._trava:
+            linha = self._conexao.execute(
+                'SELECT arquivo, posicao, tamanho FROM extratos WHERE cnpj = ? AND data = ?', (cnpj, str(data)[:10])
+            ).fetchone()
+        if linha is None:
+            return None
+        with open(os.path.join(self.pasta, linha[0]), 'rb') as arquivo:
+            return self._ler_membro(arquivo, linha[1], linha[2])
+
+    def iterar_data(self, data, cnpjs=None):
+        '''
+        Lê os extratos arquivados da data (apenas dos `cnpjs`, se informados),
+        percorrendo cada segmento em ordem de posição.
+
+        Retorno:
+            Gerador de tuplas (cnpj, dados), no formato de service.iterar_extratos.
+        '''
+        with self._trava:
+            linhas = self._conexao.execute(
+                'SELECT cnpj, arquivo, posicao, tamanho FROM extratos WHERE data = ? ORDER BY arquivo, posicao',
+                (str(data)[:10],),
+            ).fetchall()
+        if cnpjs is not None:
+            cnpjs = set(cnpjs)
+            linhas = [linha for linha in linhas if linha[0] in cnpjs]
+
+        aberto = None
+        try:
+            for cnpj, caminho, posicao, tamanho in linhas:
+                if aberto is None or aberto.name != os.path.join(self.pasta, caminho):
+                    if aberto is not None:
+                        aberto.close()
+                    aberto = open(os.path.join(self.pasta, caminho), 'rb')
+                yield cnpj, self._ler_membro(aberto, posicao, tamanho)
+        finally:
+            if aberto is not None:
+                aberto.close()
+
+    def fechar(self):
+        ''' Fecha os segmentos, confirma o índice e exibe o resumo. '''
+        with self._trava:
+            for arquivo in self._arquivos.values():
+                arquivo.close()
+            self._arquivos.clear()
+            self._conexao.commit()
+            self._conexao.close()
+        if self.gravados or self.falhas:
+            print(f'Arquivo de extratos: {self.gravados} resposta(s) gravada(s) em {self.pasta}'
+                  + (f', {self.falhas} falha(s) de gravação.' if self.falhas else '.'))
@@ -0,0 +1,182 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from Util.metricas import METRICAS
+
+URL_LOGIN = 'https://apis.vortx.com.br/vxlogin/api/user/AuthUserApi'
+CAMINHO_TOKEN = './Cache/token.json'
+
+# Validade assumida quando nem o token (JWT) nem a resposta do login informam a expiração
+VALIDADE_PADRAO = 3600
+# Antecedência, em segundos, com que o token é renovado antes de expirar
+MARGEM_RENOVACAO = 300
+# Após um login com falha, segundos até a próxima tentativa (as requisições nesse intervalo falham de imediato)
+ESPERA_NOVO_LOGIN = 30
+
+class TokenIndisponivel(requests.RequestException):
+    ''' Não há token de acesso válido para enviar a requisição (o login falhou). '''
+
+def autenticar(token, login):
+    '''
+    Faz o login na API da Vortx (AuthUserApi).
+
+    Retorno:
+        dict: O JSON da resposta (com a chave 'token') se a solicitação for bem-sucedida, caso contrário, None.
+    '''
+    payload = {
+        'token': token,
+        'login': login
+        }
+
+    headers = {
+        'Content-Type': 'application/json'
+        }
+
+    try:
+        response = requests.post(URL_LOGIN, json=payload, headers=headers, timeout=30)
+    except requests.RequestException as e:
+        print(f'Erro de comunicação ao autenticar: {e}')
+        return None
+    if response.status_code == 200:
+        return response.json()
+    print(f'Erro ao autenticar: {response.status_code}, {response.text}')
+    return None
+
+def ler_expiracao(access_token, resposta=None):
+    '''
+    Determina o instante (epoch) de expiração do token: pelo campo `exp` do
+    JWT, por `expiresIn`/`expires_in` (segundos) na resposta do login ou, na
+    falta de ambos, VALIDADE_PADRAO a partir de agora.
+    '''
+    try:
+        conteudo = access_token.split('.')[1]
+        conteudo += '=' * (-len(conteudo) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(conteudo)).get('exp')
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError, AttributeError):
+        pass
+
+    for chave in ('expiresIn', 'expires_in'):
+        if resposta and resposta.get(chave):
+            try:
+                return time.time() + float(resposta[chave])
+            except (TypeError, ValueError):
+                pass
+    return time.time() + VALIDADE_PADRAO
+
+class GerenciadorToken:
+    '''
+    Mantém o token de acesso da API da Vortx durante a execução e entre execuções.
+
+    O token é guardado em `caminho` (permissão 0600), junto com sua expiração
+    e um hash das credenciais, e reaproveitado enquanto for válido. É renovado
+    antes de expirar (MARGEM_RENOVACAO) e quando a API o rejeita (401). As
+    renovações são serializadas: threads que encontram o token vencido ao
+    mesmo tempo disparam um único login. Se o login falhar, o token vencido
+    ou rejeitado é descartado e um novo login só é tentado após
+    ESPERA_NOVO_LOGIN segundos.
+    '''
+
+    def __init__(self, token, login, caminho=CAMINHO_TOKEN, margem=MARGEM_RENOVACAO):
+        self._credenciais = (token, login)
+        self._hash_credenciais = hashlib.sha256(f'{login}:{token}'.encode('utf-8')).hexdigest()
+        self.caminho = caminho
+        self.margem = margem
+        self._trava = threading.Lock()
+        self._token = None
+        self._expira_em = 0.0
+        self._novo_login_em = 0.0
+        self._ler_arquivo()
+
+    def _ler_arquivo(self):
+        ''' Carrega o token salvo por uma execução anterior, se for das mesmas credenciais. '''
+        if not self.caminho or not os.path.exists(self.caminho):
+            return
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as arquivo:
+                salvo = json.load(arquivo)
+        except (OSError, ValueError):
+            return
+        if salvo.get('credenciais') == self._hash_credenciais and salvo.get('token'):
+            self._token = salvo['token']
+            self._expira_em = float(salvo.get('expira_em') or 0)
+
+    def _salvar_arquivo(self):
+        ''' Grava o token atual de forma atômica, legível apenas pelo usuário. '''
+        if not self.caminho:
+            return
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = f'{self.caminho}.tmp'
+        descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'credenciais': self._hash_credenciais,
+                'token': self._token,
+                'expira_em': self._expira_em,
+            }, arquivo)
+        os.chmod(temporario, 0o600)
+        os.replace(temporario, self.caminho)
+
+    def _valido(self):
+        return self._token is not None and time.time() < self._expira_em - self.margem
+
+    def _descartar(self):
+        ''' Esquece o token atual (e o salvo em disco), para que não volte a ser enviado. '''
+        self._token = None
+        self._expira_em = 0.0
+        self._salvar_arquivo()
+
+    def _renovar(self):
+        if time.monotonic() < self._novo_login_em:
+            return None
+        with METRICAS.medir('autenticacao'):
+            resposta = autenticar(*self._credenciais)
+        novo = resposta.get('token') if resposta else None
+        if not novo:
+            self._novo_login_em = time.monotonic() + ESPERA_NOVO_LOGIN
+            return None
+        self._token = novo
+        self._expira_em = ler_expiracao(novo, resposta)
+        self._salvar_arquivo()
+        print(f'Token obtido com sucesso! Válido até {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._expira_em))}.')
+        return novo
+
+    def obter(self):
+        '''
+        Retorna um token válido, renovando-o se estiver perto de expirar.
+
+        Retorno:
+            str: O token de acesso, ou None se o login falhar e o token
+                 atual (se houver) já tiver expirado.
+        '''
+        with self._trava:
+            if self._valido():
+                return self._token
+            novo = self._renovar()
+            if novo is None and self._token is not None:
+                if time.time() < self._expira_em:
+                    # Login indisponível, mas o token atual ainda não expirou
+                    return self._token
+                self._descartar()
+            return novo
+
+    def invalidar(self, token_rejeitado):
+        '''
+        Renova o token após a API rejeitar `token_rejeitado` (401). Se outra
+        thread já o renovou, apenas retorna o token atual. Se o login falhar,
+        o token rejeitado é descartado e o retorno é None.
+        '''
+        with self._trava:
+            if self._token != token_rejeitado and self._valido():
+                return self._token
+            novo = self._renovar()
+            if novo is None:
+                self._descartar()
+            return novo
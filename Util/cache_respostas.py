@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+
+class CacheRespostas:
+    '''
+    Cache local, em disco, das respostas da API VORTX, indexado por
+    (cnpjFundo, data, hash da query).
+
+    As respostas são gravadas comprimidas (zlib) em um arquivo SQLite. Datas
+    anteriores à janela de `dias_recentes` são consideradas fechadas e ficam em
+    cache indefinidamente; datas dentro da janela só são reaproveitadas enquanto
+    tiverem menos de `ttl_recentes` segundos (0 = sempre consultar a API).
+    Quando o total armazenado passa de `tamanho_maximo_mb`, as entradas
+    acessadas há mais tempo são removidas (LRU).
+    '''
+
+    def __init__(self, caminho='./Cache/respostas.sqlite', tamanho_maximo_mb=512,
+                 dias_recentes=1, ttl_recentes=0, atualizar=False):
+        '''
+        Entrada:
+            caminho (str): Arquivo SQLite do cache.
+            tamanho_maximo_mb (float): Limite do total comprimido armazenado.
+            dias_recentes (int): Datas a partir de hoje - dias_recentes seguem ttl_recentes.
+            ttl_recentes (int): Validade, em segundos, das respostas de datas recentes.
+            atualizar (bool): Ignora o conteúdo existente na leitura, mas grava as novas respostas.
+        '''
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024)
+        self.dias_recentes = dias_recentes
+        self.ttl_recentes = ttl_recentes
+        self.atualizar = atualizar
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute('''
+            CREATE TABLE IF NOT EXISTS respostas (
+                cnpj TEXT NOT NULL,
+                data TEXT NOT NULL,
+                hash_query TEXT NOT NULL,
+                conteudo BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                gravado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                PRIMARY KEY (cnpj, data, hash_query)
+            )
+        ''')
+        self._conexao.execute('CREATE INDEX IF NOT EXISTS ix_respostas_acesso ON respostas (acessado_em)')
+        self._conexao.commit()
+        self._tamanho_total = self._conexao.execute('SELECT COALESCE(SUM(tamanho), 0) FROM respostas').fetchone()[0]
+        self.acertos = 0
+        self.faltas = 0
+
+    def _data_fechada(self, data):
+        ''' Indica se a data está fora da janela de datas recentes. '''
+        limite = date.today() - timedelta(days=self.dias_recentes)
+        return date.fromisoformat(str(data)[:10]) < limite
+
+    def contem(self, cnpj, data, hash_query):
+        '''
+        Indica se obter() encontraria uma entrada válida, sem ler o conteúdo
+        nem contar acerto ou falta (usado para decidir o que consultar na API).
+        '''
+        if self.atualizar:
+            return False
+        with self._trava:
+            linha = self._conexao.execute(
+                'SELECT gravado_em FROM respostas WHERE cnpj = ? AND data = ? AND hash_query = ?',
+                (cnpj, str(data), hash_query),
+            ).fetchone()
+        return linha is not None and (self._data_fechada(data) or time.time() - linha[0] < self.ttl_recentes)
+
+    def obter(self, cnpj, data, hash_query):
+        ''' Retorna a resposta armazenada ou None se não houver entrada válida. '''
+        if self.atualizar:
+            self.faltas += 1
+            return None
+
+        with self._trava:
+            linha = self._conexao.execute(
+                'SELECT conteudo, gravado_em FROM respostas WHERE cnpj = ? AND data = ? AND hash_query = ?',
+                (cnpj, str(data), hash_query),
+            ).fetchone()
+            agora = time.time()
+            if linha is None or (not self._data_fechada(data) and agora - linha[1] >= self.ttl_recentes):
+                self.faltas += 1
+                return None
+
+            self._conexao.execute(
+                'UPDATE respostas SET acessado_em = ? WHERE cnpj = ? AND data = ? AND hash_query = ?',
+                (agora, cnpj, str(data), hash_query),
+            )
+            self._conexao.commit()
+            self.acertos += 1
+
+        return json.loads(zlib.decompress(linha[0]))
+
+    def salvar(self, cnpj, data, hash_query, dados):
+        ''' Grava (ou substitui) a resposta e aplica o limite de tamanho. '''
+        conteudo = zlib.compress(json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        agora = time.time()
+        with self._trava:
+            anterior = self._conexao.execute(
+                'SELECT tamanho FROM respostas WHERE cnpj = ? AND data = ? AND hash_query = ?',
+                (cnpj, str(data), hash_query),
+            ).fetchone()
+            self._conexao.execute(
+                'INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (cnpj, str(data), hash_query, conteudo, len(conteudo), agora, agora),
+            )
+            self._tamanho_total += len(conteudo) - (anterior[0] if anterior else 0)
+            self._remover_excedente()
+            self._conexao.commit()
+
+    def _remover_excedente(self):
+        ''' Remove as entradas menos acessadas até respeitar o tamanho máximo. '''
+        while self._tamanho_total > self.tamanho_maximo:
+            linhas = self._conexao.execute(
+                'SELECT rowid, tamanho FROM respostas ORDER BY acessado_em LIMIT 100'
+            ).fetchall()
+            if not linhas:
+                self._tamanho_total = 0
+                return
+            for rowid, tamanho in linhas:
+                if self._tamanho_total <= self.tamanho_maximo:
+                    return
+                self._conexao.execute('DELETE FROM respostas WHERE rowid = ?', (rowid,))
+                self._tamanho_total -= tamanho
+
+    def fechar(self):
+        ''' Encerra o arquivo do cache e exibe o resumo de uso. '''
+        with self._trava:
+            self._conexao.close()
+        print(f'Cache de respostas: {self.acertos} acerto(s), {self.faltas} consulta(s) à API.')
@@ -0,0 +1,65 @@
+import json
+import os
+from datetime import datetime
+from Util.db_integracao import obter_fundos, obter_assinatura_fundos
+
+CAMINHO_CADASTRO = './Cache/fundos.json'
+
+def _ler_cadastro(caminho):
+    ''' Lê o cadastro salvo localmente, ou None se não existir ou estiver corrompido. '''
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError) as e:
+        print(f'Cadastro local de fundos ignorado ({e}).')
+        return None
+
+def _salvar_cadastro(caminho, assinatura, fundos):
+    ''' Grava o cadastro localmente, substituindo o arquivo anterior de forma atômica. '''
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'assinatura': assinatura,
+            'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+            'fundos': fundos,
+        }, arquivo, ensure_ascii=False, indent=2, default=str)
+    os.replace(temporario, caminho)
+
+def carregar_fundos(conexao, caminho=CAMINHO_CADASTRO, forcar=False):
+    '''
+    Retorna o cadastro dos fundos, reaproveitando a cópia local enquanto as
+    tabelas de origem não mudarem.
+
+    A cada chamada é feita apenas a consulta de assinatura (quantidade de linhas
+    e checksum das colunas usadas de cada tabela); a junção completa de
+    obter_fundos só é executada quando a assinatura difere da salva, quando
+    não há cópia local ou com `forcar`.
+
+    Retorno:
+        list: Registros de fundo (ver db_integracao.obter_fundos), ou None.
+    '''
+    assinatura = obter_assinatura_fundos(conexao)
+    cadastro = None if forcar else _ler_cadastro(caminho)
+
+    if cadastro and assinatura and cadastro.get('assinatura') == assinatura:
+        fundos = cadastro['fundos']
+        print(f'Cadastro de fundos sem alterações desde {cadastro.get("atualizado_em")}: {len(fundos)} fundo(s) em cache.')
+        return fundos
+
+    fundos = obter_fundos(conexao)
+    if fundos and assinatura:
+        _salvar_cadastro(caminho, assinatura, fundos)
+    return fundos
+
+def mapa_ids_cota(fundos):
+    ''' Monta o mapa Nomenclatura_Carteira -> ID_Cota_Cadastro a partir dos registros de fundo. '''
+    return {
+        fundo['codigo_carteira']: fundo['id_cota_cadastro']
+        for fundo in fundos
+        if fundo.get('codigo_carteira') and fundo.get('id_cota_cadastro')
+    }
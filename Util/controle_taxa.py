@@ -0,0 +1,245 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from Util.autenticacao import GerenciadorToken, TokenIndisponivel
+from Util.metricas import METRICAS, PREFIXO_STATUS_HTTP
+
+STATUS_RETENTATIVA = {429, 500, 502, 503, 504}
+STATUS_LIMITACAO = {429, 503}
+
+def calcular_espera(tentativa, base=0.5, teto=30.0):
+    ''' Espera exponencial com jitter completo: aleatória entre 0 e base * 2^tentativa (limitada ao teto). '''
+    return random.uniform(0, min(teto, base * (2 ** tentativa)))
+
+def ler_retry_after(valor, teto=120.0):
+    ''' Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera, ou None. '''
+    if not valor:
+        return None
+    try:
+        segundos = float(valor)
+    except ValueError:
+        try:
+            segundos = (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, min(segundos, teto))
+
+class LimiteAdaptativo:
+    '''
+    Limite de requisições simultâneas ajustado por AIMD: cresce aditivamente
+    (cerca de +1 a cada `limite` respostas rápidas) enquanto a latência fica
+    abaixo do alvo, e cai pela metade em caso de limitação (429/503, timeout)
+    ou latência acima do alvo. Reduções em sequência só ocorrem após um
+    intervalo de `latencia_alvo`, para que uma rajada de falhas conte uma vez.
+    '''
+
+    def __init__(self, inicial=4, minimo=1, maximo=32, latencia_alvo=5.0):
+        self.minimo = max(1, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.limite = float(min(max(inicial, self.minimo), self.maximo))
+        self.latencia_alvo = latencia_alvo
+        self._em_andamento = 0
+        self._ultima_reducao = 0.0
+        self._condicao = threading.Condition()
+
+    @contextmanager
+    def vaga(self):
+        ''' Aguarda uma vaga dentro do limite atual e a libera ao final. '''
+        with self._condicao:
+            while self._em_andamento >= int(self.limite):
+                self._condicao.wait()
+            self._em_andamento += 1
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._em_andamento -= 1
+                self._condicao.notify_all()
+
+    def registrar_sucesso(self, latencia):
+        ''' Aumenta o limite se a resposta foi rápida; reduz se passou da latência alvo. '''
+        if latencia > self.latencia_alvo:
+            self.registrar_limitacao()
+            return
+        with self._condicao:
+            self.limite = min(self.maximo, self.limite + 1.0 / self.limite)
+            self._condicao.notify_all()
+
+    def registrar_limitacao(self):
+        ''' Reduz o limite pela metade (no máximo uma vez por intervalo de latência alvo). '''
+        with self._condicao:
+            agora = time.monotonic()
+            if agora - self._ultima_reducao >= self.latencia_alvo:
+                self.limite = max(self.minimo, self.limite / 2)
+                self._ultima_reducao = agora
+
+class AgendadorRequisicoes:
+    '''
+    Envia requisições HTTP respeitando um LimiteAdaptativo e refazendo as que
+    falham por timeout, erro de conexão, 5xx ou 429, com espera exponencial
+    com jitter ou o tempo indicado em Retry-After. Com um GerenciadorToken,
+    o cabeçalho Authorization é montado a cada tentativa e um 401 provoca uma
+    renovação do token e uma nova tentativa imediata.
+    '''
+
+    def __init__(self, limite=None, max_tentativas=4, espera_base=0.5, espera_maxima=30.0):
+        self.limite = limite
+        self.max_tentativas = max(1, max_tentativas)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+
+    @staticmethod
+    def _post(sessao, url, kwargs):
+        ''' Executa o POST registrando latência, status e bytes recebidos nas métricas. '''
+        inicio = time.perf_counter()
+        try:
+            response = sessao.post(url, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            METRICAS.incrementar('http_falhas_comunicacao')
+            raise
+        latencia = time.perf_counter() - inicio
+        METRICAS.observar('http_latencia_segundos', latencia)
+        METRICAS.incrementar(f'{PREFIXO_STATUS_HTTP}{response.status_code}')
+        if not kwargs.get('stream'):
+            # Com stream=True o corpo é contado durante a leitura (ver service.iterar_lotes_extrato)
+            METRICAS.incrementar('http_bytes_recebidos', len(response.content))
+        return response, latencia
+
+    def _enviar(self, sessao, url, kwargs):
+        if self.limite is None:
+            return self._post(sessao, url, kwargs)[0]
+        with self.limite.vaga():
+            try:
+                response, latencia = self._post(sessao, url, kwargs)
+            except (requests.Timeout, requests.ConnectionError):
+                self.limite.registrar_limitacao()
+                raise
+            if response.status_code in STATUS_LIMITACAO:
+                self.limite.registrar_limitacao()
+            elif response.status_code < 500:
+                self.limite.registrar_sucesso(latencia)
+            return response
+
+    @staticmethod
+    def _autorizar(kwargs, token):
+        '''
+        Acrescenta o cabeçalho Authorization aos argumentos e retorna o token
+        usado. Lança TokenIndisponivel se o GerenciadorToken não tiver token.
+        '''
+        if token is None:
+            return None
+        valor = token.obter() if isinstance(token, GerenciadorToken) else token
+        if not valor:
+            raise TokenIndisponivel('token de acesso indisponível (falha no login)')
+        kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Authorization': f'Bearer {valor}'}
+        return valor
+
+    def post(self, sessao, url, descricao='', token=None, **kwargs):
+        '''
+        Executa sessao.post(url, **kwargs) com novas tentativas.
+
+        Entrada:
+            token (str | GerenciadorToken): Token enviado como Bearer, se informado.
+
+        Retorno:
+            requests.Response: A primeira resposta sem erro transitório, ou a
+            última recebida. Se a última tentativa falhar por timeout ou
+            conexão, a exceção é lançada. Sem token disponível, a requisição
+            não é enviada e TokenIndisponivel (um requests.RequestException)
+            é lançada.
+        '''
+        tentativa = 0
+        token_renovado = False
+        while True:
+            ultima = tentativa >= self.max_tentativas - 1
+            usado = self._autorizar(kwargs, token)
+            try:
+                response = self._enviar(sessao, url, kwargs)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if ultima:
+                    raise
+                espera = calcular_espera(tentativa, self.espera_base, self.espera_maxima)
+                print(f'{descricao}: {type(e).__name__}, nova tentativa em {espera:.1f} s.')
+                METRICAS.incrementar('http_retentativas')
+                time.sleep(espera)
+                tentativa += 1
+                continue
+
+            # Token expirado ou revogado: renova uma vez, sem contar como tentativa
+            if response.status_code == 401 and isinstance(token, GerenciadorToken) and not token_renovado:
+                print(f'{descricao}: token rejeitado (401), renovando.')
+                response.close()
+                token.invalidar(usado)
+                token_renovado = True
+                continue
+
+            if response.status_code not in STATUS_RETENTATIVA or ultima:
+                return response
+
+            espera = ler_retry_after(response.headers.get('Retry-After'))
+            if espera is None:
+                espera = calcular_espera(tentativa, self.espera_base, self.espera_maxima)
+            print(f'{descricao}: status {response.status_code}, nova tentativa em {espera:.1f} s.')
+            METRICAS.incrementar('http_retentativas')
+            response.close()
+            time.sleep(espera)
+            tentativa += 1
+
+class RegistroFalhas:
+    '''
+    Lista, de forma segura entre threads, os pares (CNPJ, data) cujo extrato
+    não foi obtido na execução, para relatório e reprocessamento.
+    '''
+
+    def __init__(self):
+        self._falhas = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, cnpj, data, motivo):
+        with self._trava:
+            self._falhas[(cnpj, str(data))] = str(motivo)
+
+    def remover(self, cnpj, data):
+        ''' Remove o par, caso uma nova tentativa posterior tenha obtido o extrato. '''
+        with self._trava:
+            self._falhas.pop((cnpj, str(data)), None)
+
+    def contem(self, cnpj, data):
+        with self._trava:
+            return (cnpj, str(data)) in self._falhas
+
+    def listar(self):
+        with self._trava:
+            return [
+                {'cnpj': cnpj, 'data': data, 'motivo': motivo}
+                for (cnpj, data), motivo in sorted(self._falhas.items(), key=lambda item: (item[0][1], item[0][0]))
+            ]
+
+    def salvar(self, pasta='./Relatorios'):
+        '''
+        Grava o relatório de falhas em JSON e retorna o caminho do arquivo,
+        ou None se não houve falhas. O arquivo pode ser usado em --reprocessar-falhas.
+        '''
+        falhas = self.listar()
+        if not falhas:
+            return None
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f'falhas_{datetime.now():%Y%m%d_%H%M%S}.json')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(falhas, arquivo, indent=2, ensure_ascii=False)
+        return caminho
+
+def ler_relatorio_falhas(caminho):
+    ''' Lê um relatório de RegistroFalhas.salvar, retornando {data: {cnpj, ...}}. '''
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        falhas = json.load(arquivo)
+    pendentes = {}
+    for falha in falhas:
+        pendentes.setdefault(falha['data'], set()).add(falha['cnpj'])
+    return pendentes
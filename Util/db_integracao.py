@@ -1,4 +1,12 @@
+import time
+import hashlib
+import functools
+import threading
+from contextlib import contextmanager
+import numpy as np
 import pyodbc
+import pandas as pd
+from Util.metricas import METRICAS
 
 def conectar_banco(server, database, username, password):
     '''
@@ -16,9 +24,200 @@ def conectar_banco(server, database, username, password):
     except pyodbc.Error as e:
         print(f'Erro na conexão com o banco: {e}')
         return None
-    
+
+def conexao_ativa(conexao):
+    '''Verifica, com um SELECT 1, se a conexão (ou uma conexão do pool) ainda responde.'''
+    if conexao is None:
+        return False
+    if isinstance(conexao, PoolConexoes):
+        return conexao.verificar()
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute('SELECT 1;')
+            cursor.fetchall()
+        return True
+    except pyodbc.Error:
+        return False
+
+class _ConexaoPool:
+    '''Conexão mantida pelo PoolConexoes, com as estatísticas de uso.'''
+
+    def __init__(self, numero, conexao):
+        self.numero = numero
+        self.conexao = conexao
+        self.criada_em = time.monotonic()
+        self.ultimo_uso = self.criada_em
+        self.usos = 0
+        self.segundos_em_uso = 0.0
+        self.reconexoes = 0
+
+class PoolConexoes:
+    '''
+    Pool de conexões pyodbc com o SQL Server, para que várias threads usem o
+    banco ao mesmo tempo, cada uma com a sua conexão.
+
+    Até `tamanho` conexões são abertas sob demanda. Ao reservar uma conexão
+    ociosa há `verificar_apos` segundos ou mais, ela é testada com SELECT 1 e
+    refeita se tiver caído. Ao devolvê-la, a transação não confirmada é
+    desfeita; se isso falhar, a conexão é descartada. Reservas aninhadas na
+    mesma thread reutilizam a conexão já reservada.
+
+    As funções deste módulo que recebem `conexao` aceitam também um PoolConexoes.
+    '''
+
+    def __init__(self, server, database, username, password, tamanho=4, espera_maxima=60, verificar_apos=30):
+        self._credenciais = (server, database, username, password)
+        self.tamanho = max(1, tamanho)
+        self.espera_maxima = espera_maxima
+        self.verificar_apos = verificar_apos
+        self._livres = []
+        self._todas = {}
+        self._abertas = 0
+        self._numero = 0
+        self._condicao = threading.Condition()
+        self._local = threading.local()
+
+    def _abrir(self):
+        conexao = conectar_banco(*self._credenciais)
+        if conexao is None:
+            raise ConnectionError('Não foi possível conectar ao banco.')
+        return conexao
+
+    def _reservar(self, verificar):
+        with self._condicao:
+            limite = time.monotonic() + self.espera_maxima
+            while not self._livres and self._abertas >= self.tamanho:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise TimeoutError(f'Nenhuma conexão livre no pool após {self.espera_maxima} s.')
+                self._condicao.wait(restante)
+            item = self._livres.pop() if self._livres else None
+            if item is None:
+                self._abertas += 1
+                self._numero += 1
+                numero = self._numero
+
+        try:
+            if item is None:
+                item = _ConexaoPool(numero, self._abrir())
+                with self._condicao:
+                    self._todas[numero] = item
+            elif (verificar or time.monotonic() - item.ultimo_uso >= self.verificar_apos) and not conexao_ativa(item.conexao):
+                print(f'Conexão {item.numero} do pool inativa. Reconectando...')
+                self._fechar_silenciosamente(item.conexao)
+                item.conexao = self._abrir()
+                item.reconexoes += 1
+        except Exception:
+            with self._condicao:
+                self._abertas -= 1
+                if item is not None:
+                    self._todas.pop(item.numero, None)
+                self._condicao.notify()
+            raise
+        return item
+
+    def _devolver(self, item, inicio):
+        agora = time.monotonic()
+        item.usos += 1
+        item.segundos_em_uso += agora - inicio
+        item.ultimo_uso = agora
+        try:
+            item.conexao.rollback()
+            descartar = False
+        except pyodbc.Error:
+            self._fechar_silenciosamente(item.conexao)
+            descartar = True
+
+        with self._condicao:
+            if descartar:
+                self._abertas -= 1
+                self._todas.pop(item.numero, None)
+            else:
+                self._livres.append(item)
+            self._condicao.notify()
+
+    @staticmethod
+    def _fechar_silenciosamente(conexao):
+        try:
+            conexao.close()
+        except pyodbc.Error:
+            pass
+
+    @contextmanager
+    def conexao(self, verificar=False):
+        '''
+        Reserva uma conexão durante o bloco `with`. O que não for confirmado
+        (commit) dentro do bloco é desfeito na devolução.
+        '''
+        atual = getattr(self._local, 'item', None)
+        if atual is not None:
+            yield atual.conexao
+            return
+
+        item = self._reservar(verificar)
+        self._local.item = item
+        inicio = time.monotonic()
+        try:
+            yield item.conexao
+        finally:
+            self._local.item = None
+            self._devolver(item, inicio)
+
+    def verificar(self):
+        ''' Testa (e refaz, se preciso) uma conexão do pool. Retorna False se o banco estiver inacessível. '''
+        try:
+            with self.conexao(verificar=True):
+                return True
+        except (ConnectionError, TimeoutError, pyodbc.Error) as e:
+            print(f'Banco indisponível: {e}')
+            return False
+
+    def utilizacao(self):
+        '''
+        Retorno:
+            list: Por conexão aberta: número, usos, segundos em uso, fração do
+                  tempo de vida em uso e reconexões.
+        '''
+        agora = time.monotonic()
+        with self._condicao:
+            itens = sorted(self._todas.values(), key=lambda item: item.numero)
+        return [
+            {
+                'conexao': item.numero,
+                'usos': item.usos,
+                'segundos_em_uso': round(item.segundos_em_uso, 3),
+                'utilizacao': round(item.segundos_em_uso / max(agora - item.criada_em, 1e-9), 3),
+                'reconexoes': item.reconexoes,
+            }
+            for item in itens
+        ]
+
+    def fechar(self):
+        ''' Fecha as conexões ociosas e exibe a utilização de cada conexão. '''
+        for uso in self.utilizacao():
+            print(f'Conexão {uso["conexao"]}: {uso["usos"]} uso(s), {uso["segundos_em_uso"]:.1f} s em uso '
+                  f'({uso["utilizacao"]:.0%}), {uso["reconexoes"]} reconexão(ões).')
+        with self._condicao:
+            livres, self._livres = self._livres, []
+            for item in livres:
+                self._fechar_silenciosamente(item.conexao)
+                self._todas.pop(item.numero, None)
+                self._abertas -= 1
+
+def _aceita_pool(funcao):
+    '''Permite passar um PoolConexoes no lugar da conexão: uma conexão é reservada durante a chamada.'''
+    @functools.wraps(funcao)
+    def envolvida(conexao, *args, **kwargs):
+        if isinstance(conexao, PoolConexoes):
+            with conexao.conexao() as reservada:
+                return funcao(reservada, *args, **kwargs)
+        return funcao(conexao, *args, **kwargs)
+    return envolvida
+
+@_aceita_pool
 def executar_query(conexao, query, params=None):
     try:
+        METRICAS.incrementar('db_comandos')
         with conexao.cursor() as cursor:
             if params:
                 cursor.execute(query, params)
@@ -30,8 +229,22 @@ def executar_query(conexao, query, params=None):
         print(f'Erro ao executar a query: {e}')
         return None
 
-def obter_cnpj_fundo(conexao):
-    '''Obtém a lista de CNPJs dos fundos do banco de dados.'''
+CNPJ_ADMINISTRADOR_VORTX = '22610500000188'
+
+def formatar_cnpj(cnpj_fundo):
+    '''Formata um CNPJ de 14 dígitos como 00.000.000/0000-00.'''
+    return f'{cnpj_fundo[:2]}.{cnpj_fundo[2:5]}.{cnpj_fundo[5:8]}/{cnpj_fundo[8:12]}-{cnpj_fundo[12:]}'
+
+def obter_fundos(conexao):
+    '''
+    Obtém o cadastro dos fundos VORTX ativos, um registro por CNPJ.
+
+    Retorno:
+        list: dicts com id_fundo_vortx, nome_fundo, cnpj (somente dígitos),
+              cnpj_formatado, codigo_carteira (Nomenclatura_Carteira) e
+              id_cota_cadastro (str, ou None se a nomenclatura não for do
+              administrador VORTX). None em caso de erro ou sem resultados.
+    '''
     try:
         query = '''
                 SELECT f.[ID_Fundo_VORTX]
@@ -42,6 +255,8 @@ def obter_cnpj_fundo(conexao):
                 ,fun.[Pasta_Carteira_Padrao]
                 ,replace(tp.Tipo_Fundo_Abreviado+' '+fun.Nome_Fundo+'_-_DEMONSTRATIVO_CAIXA_-_[AAAAMMDD]_-_VORTX.json', ' ', '_') padrao_nome_arquivo
                 ,cn.Nomenclatura_Carteira Codigo_Carteira
+                ,cn.ID_Cota_Cadastro
+                ,cn.CNPJ_Administrador
         FROM [ISYS].[ApiVORTX].[FundosVORTX] f
         INNER JOIN [ISYS].[Cadastro].[Fundo] fun ON f.ID_CNPJ_Fundo = fun.ID_CNPJ_Fundo
         INNER JOIN [ISYS].[Parametro].[Tipo_Fundo] tp on fun.ID_Tipo_Fundo = tp.ID_Tipo_Fundo
@@ -54,25 +269,77 @@ def obter_cnpj_fundo(conexao):
         AND cn.Conta_Carteira = 'VORTX - CARTEIRA'
         AND cn.ID_Status = 1 -- Cota Nomenclatura Ativa;
         '''
-        
+
         resultados = executar_query(conexao, query)
-        cnpjs_convencionais= []
-        if resultados:
-            for resultado in resultados:
-                cnpj_fundo = resultado[2]
-                if cnpj_fundo and len(cnpj_fundo) == 14:
-                    cnpj_convencional = f'{cnpj_fundo[:2]}.{cnpj_fundo[2:5]}.{cnpj_fundo[5:8]}/{cnpj_fundo[8:12]}-{cnpj_fundo[12:]}'
-                    cnpjs_convencionais.append(cnpj_convencional)
-                    print(f'CNPJ encontrado: {cnpj_fundo}')
-            return cnpjs_convencionais
-        else:
+        if not resultados:
             print('Nenhum resultado encontrado.')
             return None
-          
+
+        fundos = {}
+        for resultado in resultados:
+            cnpj_fundo = resultado[2]
+            if not cnpj_fundo or len(cnpj_fundo) != 14:
+                continue
+            id_cota = str(resultado[8]) if resultado[7] and resultado[9] == CNPJ_ADMINISTRADOR_VORTX else None
+            fundo = fundos.get(cnpj_fundo)
+            if fundo is None:
+                print(f'CNPJ encontrado: {cnpj_fundo}')
+                fundos[cnpj_fundo] = {
+                    'id_fundo_vortx': resultado[0],
+                    'nome_fundo': resultado[1],
+                    'cnpj': cnpj_fundo,
+                    'cnpj_formatado': formatar_cnpj(cnpj_fundo),
+                    'codigo_carteira': resultado[7],
+                    'id_cota_cadastro': id_cota,
+                }
+            elif fundo['id_cota_cadastro'] is None and id_cota is not None:
+                # Prefere a nomenclatura do administrador VORTX
+                fundo['codigo_carteira'] = resultado[7]
+                fundo['id_cota_cadastro'] = id_cota
+        return list(fundos.values())
+
     except Exception as e:
         print(f'Erro na manipulação do banco de dados: {e}')
         return None
-        
+
+# Colunas de cada tabela de obter_fundos que influenciam o resultado (projeção, junções e filtros)
+COLUNAS_CADASTRO_FUNDOS = {
+    '[ISYS].[ApiVORTX].[FundosVORTX]': ('ID_Fundo_VORTX', 'Nome_Fundo', 'ID_CNPJ_Fundo', 'ID_Status'),
+    '[ISYS].[Cadastro].[Fundo]': ('ID_Fundo', 'ID_CNPJ_Fundo', 'ID_Tipo_Fundo', 'Is_Gestao_Solis'),
+    '[ISYS].[Parametro].[Tipo_Fundo]': ('ID_Tipo_Fundo',),
+    '[ISYS].[Cota].[Cota_Cadastro]': ('ID_Cota_Cadastro', 'ID_Fundo_Cadastro', 'ID_Cota_Tipo'),
+    '[ISYS].[Cota].[Cota_Nomenclatura]': ('ID_Cota_Cadastro', 'Nomenclatura_Carteira', 'CNPJ_Administrador',
+                                          'Conta_Carteira', 'ID_Status'),
+}
+
+def obter_assinatura_fundos(conexao):
+    '''
+    Calcula uma assinatura barata das tabelas usadas por obter_fundos
+    (quantidade de linhas e checksum agregado das colunas de
+    COLUNAS_CADASTRO_FUNDOS), para detectar mudanças no cadastro sem executar
+    a junção completa. Cada tabela é lida uma única vez e só nessas colunas,
+    que o SQL Server pode obter de um índice estreito; alterações em outras
+    colunas não invalidam o cadastro local.
+
+    Retorno:
+        str: Assinatura, ou None em caso de erro.
+    '''
+    query = '\nUNION ALL\n'.join(
+        f"SELECT {ordem}, COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM({', '.join(colunas)})) FROM {tabela}"
+        for ordem, (tabela, colunas) in enumerate(COLUNAS_CADASTRO_FUNDOS.items())
+    )
+    resultados = executar_query(conexao, f'{query};')
+    if not resultados:
+        return None
+    return '|'.join(f'{quantidade}|{checksum}' for _, quantidade, checksum in sorted(resultados))
+
+def obter_cnpj_fundo(conexao):
+    '''Obtém a lista de CNPJs dos fundos do banco de dados.'''
+    fundos = obter_fundos(conexao)
+    if not fundos:
+        return None
+    return [fundo['cnpj_formatado'] for fundo in fundos]
+
 def obter_data_posicao(conexao, data_inicial, data_final):
     '''Retorna lista de datas de posição válidas entre data_inicial e data_final.'''
     query = '''
@@ -107,8 +374,40 @@ def obter_id_cota_cadastro(conexao, nome_fundo):
         print(f'Erro na manipulação do banco de dados: {e}')
         return None
     
+def obter_ids_cota_cadastro(conexao, nomes_fundos):
+    '''
+    Obtém o ID_Cota_Cadastro de vários fundos pelo nome em uma única consulta
+    (em blocos, se a lista passar do limite de parâmetros do SQL Server).
+
+    Retorno:
+        dict: Nomenclatura_Carteira -> ID_Cota_Cadastro (str), apenas para os nomes encontrados.
+    '''
+    ids = {}
+    nomes = list(dict.fromkeys(nomes_fundos))
+    try:
+        for inicio in range(0, len(nomes), LIMITE_PARAMETROS - 1):
+            lote = nomes[inicio:inicio + LIMITE_PARAMETROS - 1]
+            query = f'''
+                SELECT Nomenclatura_Carteira, ID_Cota_Cadastro FROM isys.cota.Cota_Nomenclatura
+                WHERE Nomenclatura_Carteira IN ({', '.join(['?'] * len(lote))})
+                AND CNPJ_Administrador = '{CNPJ_ADMINISTRADOR_VORTX}';
+            '''
+            for nome, id_cota in executar_query(conexao, query, lote) or []:
+                ids.setdefault(nome, str(id_cota))
+        return ids
+    except Exception as e:
+        print(f'Erro na manipulação do banco de dados: {e}')
+        return ids
+
+@_aceita_pool
 def deletar_dados_existentes(conexao, data_posicao, nome_tabela, cnpj):
-    '''Deleta dados existentes na tabela para a data de posição e CNPJ especificados.'''
+    '''
+    Deleta dados existentes na tabela para a data de posição e CNPJ especificados.
+
+    Mantida como API pública para scripts externos: app.py não a usa mais (a
+    carga substitui as partições com sincronizar_particoes). O hash da
+    partição é invalidado, para que a próxima sincronização a regrave.
+    '''
     try:
         # Verifica se existem dados para deletar
         verifica_query = f'''
@@ -118,14 +417,18 @@ def deletar_dados_existentes(conexao, data_posicao, nome_tabela, cnpj):
         cursor = conexao.cursor()
         cursor.execute(verifica_query, [data_posicao, cnpj])
         count = cursor.fetchone()[0]
+        METRICAS.incrementar('db_comandos')
 
         if count > 0:
             delete_query = f'''
                 DELETE FROM {nome_tabela}
                 WHERE Data_Posicao = ? AND ID_CNPJ_Fundo = ?;
             '''
-            cursor.execute(delete_query, [data_posicao, cnpj])
-            conexao.commit()
+            with METRICAS.medir('delete'):
+                cursor.execute(delete_query, [data_posicao, cnpj])
+                _invalidar_hashes(cursor, nome_tabela, [(data_posicao, cnpj)])
+                conexao.commit()
+            METRICAS.incrementar('db_comandos', 2)
             print(f'{count} registro(s) removido(s) da tabela {nome_tabela} para o CNPJ {cnpj} na data {data_posicao} e os dados reinserido(s) com sucesso.')
         else:
             print(f'Nenhum dado encontrado para {cnpj} na data {data_posicao}. Nada foi deletado.')
@@ -137,23 +440,589 @@ def deletar_dados_existentes(conexao, data_posicao, nome_tabela, cnpj):
         print(f'Erro ao deletar dados existentes: {e}')
         return False
 
-def inserir_dados(conexao, nome_tabela, df):
-    '''Insere os dados tratados na tabela do banco de dados.'''
+ESTRATEGIAS_CARGA = ('executemany', 'fast', 'multirow', 'staging')
+LIMITE_PARAMETROS = 2100  # Limite de parâmetros por comando no SQL Server
+LINHAS_POR_INSERT = 1000  # Limite de linhas em um INSERT ... VALUES no SQL Server
+TAMANHO_LOTE_CARGA = 10000
+
+def _tipos_parametros(df):
+    '''Define o tipo SQL de cada coluna para o setinputsizes do fast_executemany.'''
+    tipos = []
+    for coluna, dtype in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            tipos.append((pyodbc.SQL_BIT, 0, 0))
+        elif pd.api.types.is_integer_dtype(dtype):
+            tipos.append((pyodbc.SQL_BIGINT, 0, 0))
+        elif pd.api.types.is_float_dtype(dtype):
+            tipos.append((pyodbc.SQL_DOUBLE, 0, 0))
+        else:
+            tamanho = df[coluna].astype(str).str.len().max()
+            tipos.append((pyodbc.SQL_WVARCHAR, max(1, int(tamanho or 1)), 0))
+    return tipos
+
+def _lotes(linhas, tamanho):
+    '''Divide a lista de linhas em fatias de até `tamanho` elementos.'''
+    for inicio in range(0, len(linhas), tamanho):
+        yield linhas[inicio:inicio + tamanho]
+
+def _executemany_rapido(cursor, query, df, linhas, tamanho_lote):
+    '''Executa o executemany com fast_executemany e parâmetros tipados, em lotes.'''
+    cursor.fast_executemany = True
+    cursor.setinputsizes(_tipos_parametros(df))
+    for lote in _lotes(linhas, tamanho_lote):
+        cursor.executemany(query, lote)
+        METRICAS.incrementar('db_comandos')
+
+def _inserir(cursor, nome_tabela, df, estrategia, tamanho_lote):
+    '''Envia as linhas do DataFrame pelo cursor, sem commit. Retorna a quantidade de linhas.'''
+    if estrategia not in ESTRATEGIAS_CARGA:
+        raise ValueError(f'Estratégia de carga desconhecida: {estrategia}')
+    with METRICAS.medir('insert'):
+        inseridos = _enviar_linhas(cursor, nome_tabela, df, estrategia, tamanho_lote)
+    METRICAS.incrementar('db_linhas_inseridas', inseridos)
+    return inseridos
+
+def _enviar_linhas(cursor, nome_tabela, df, estrategia, tamanho_lote):
+    '''Executa os comandos de INSERT da estratégia escolhida.'''
+    colunas = ', '.join(df.columns)
+    valores = ', '.join(['?' for _ in df.columns])
+    query = f'INSERT INTO {nome_tabela} ({colunas}) VALUES ({valores})'
+    linhas = list(df.itertuples(index=False, name=None))
+
+    if estrategia == 'executemany':
+        cursor.executemany(query, linhas)
+        # Sem fast_executemany, o pyodbc envia uma linha por ida ao banco
+        METRICAS.incrementar('db_comandos', len(linhas))
+
+    elif estrategia == 'fast':
+        _executemany_rapido(cursor, query, df, linhas, tamanho_lote)
+
+    elif estrategia == 'multirow':
+        linhas_por_comando = max(1, min(LINHAS_POR_INSERT, (LIMITE_PARAMETROS - 1) // len(df.columns)))
+        for lote in _lotes(linhas, linhas_por_comando):
+            query_lote = f'INSERT INTO {nome_tabela} ({colunas}) VALUES ' + ', '.join([f'({valores})'] * len(lote))
+            cursor.execute(query_lote, [valor for linha in lote for valor in linha])
+            METRICAS.incrementar('db_comandos')
+
+    elif estrategia == 'staging':
+        # A tabela temporária vive enquanto a conexão (reaproveitada pelo pool) estiver aberta:
+        # uma carga anterior interrompida pode tê-la deixado para trás
+        cursor.execute("IF OBJECT_ID('tempdb..#carga_staging') IS NOT NULL DROP TABLE #carga_staging")
+        cursor.execute(f'SELECT TOP 0 {colunas} INTO #carga_staging FROM {nome_tabela}')
+        try:
+            _executemany_rapido(cursor, f'INSERT INTO #carga_staging ({colunas}) VALUES ({valores})', df, linhas, tamanho_lote)
+            cursor.execute(f'INSERT INTO {nome_tabela} ({colunas}) SELECT {colunas} FROM #carga_staging')
+        finally:
+            try:
+                cursor.execute('DROP TABLE #carga_staging')
+            except Exception as e:
+                # Não encobre o erro da carga; a próxima carga remove a tabela antes de criá-la
+                print(f'Não foi possível remover a tabela temporária #carga_staging: {e}')
+            METRICAS.incrementar('db_comandos', 4)
+
+    return len(linhas)
+
+@_aceita_pool
+def inserir_dados(conexao, nome_tabela, df, estrategia='executemany', tamanho_lote=TAMANHO_LOTE_CARGA):
+    '''
+    Insere os dados tratados na tabela do banco de dados, sem remover os
+    existentes.
+
+    Mantida como API pública (usada também pelo fluxo legado do benchmark
+    ponta a ponta): app.py carrega com sincronizar_particoes. Os hashes das
+    partições inseridas são invalidados, para que a próxima sincronização as regrave.
+
+    Entrada:
+        estrategia (str): Forma de envio das linhas ao SQL Server.
+            - 'executemany': INSERT parametrizado, uma ida ao banco por linha.
+            - 'fast': fast_executemany do pyodbc com parâmetros tipados, enviado em lotes.
+            - 'multirow': INSERT ... VALUES (...), (...) com várias linhas por comando.
+            - 'staging': carga rápida em tabela temporária e um único
+                         INSERT ... SELECT para a tabela de destino.
+        tamanho_lote (int): Linhas por lote nas estratégias 'fast' e 'staging'.
+
+    Retorno:
+        int: Quantidade de linhas inseridas, ou None em caso de erro.
+    '''
     try:
         # Verificação do DataFrame
         if df.empty:
             print('DataFrame está vazio. Nenhum dado foi inserido.')
-            return
-
-        # Preparação da query
-        cursor = conexao.cursor()
-        colunas = ', '.join(df.columns)
-        valores = ', '.join(['?' for _ in df.columns])
-        query = f'INSERT INTO {nome_tabela} ({colunas}) VALUES ({valores})'
+            return 0
 
+        inicio = time.perf_counter()
         with conexao.cursor() as cursor:
-            cursor.executemany(query, df.itertuples(index=False, name=None))
+            inseridos = _inserir(cursor, nome_tabela, df, estrategia, tamanho_lote)
+            _invalidar_hashes(cursor, nome_tabela, _particoes(df))
             conexao.commit()
+        duracao = time.perf_counter() - inicio
+
         print(f'\nDados inseridos na tabela {nome_tabela} para data posição {df["Data_Posicao"].iloc[0]} com sucesso.')
+        print(f'{inseridos} linha(s) em {duracao:.2f} s ({inseridos / max(duracao, 1e-9):.0f} linhas/s, estratégia {estrategia}).')
+        return inseridos
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao inserir dados: {e}')
+        return None
+
+def _particoes(df):
+    ''' Lista os pares (Data_Posicao, ID_CNPJ_Fundo) distintos do DataFrame. '''
+    return list(df[['Data_Posicao', 'ID_CNPJ_Fundo']].drop_duplicates().itertuples(index=False, name=None))
+
+def _deletar_particoes(cursor, nome_tabela, particoes):
+    ''' Remove, sem commit, as linhas das partições informadas. Retorna a quantidade removida. '''
+    deletados = 0
+    with METRICAS.medir('delete'):
+        for lote in _lotes(particoes, LINHAS_POR_INSERT):
+            valores = ', '.join(['(?, ?)'] * len(lote))
+            cursor.execute(f'''
+                DELETE t FROM {nome_tabela} t
+                INNER JOIN (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo)
+                    ON t.Data_Posicao = p.Data_Posicao AND t.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo;
+            ''', [valor for particao in lote for valor in particao])
+            deletados += max(cursor.rowcount, 0)
+            METRICAS.incrementar('db_comandos')
+    return deletados
+
+def _tabela_sincronizacao(nome_tabela):
+    ''' Nome da tabela com o hash de cada partição carregada em `nome_tabela`. '''
+    return f'{nome_tabela}_Sincronizacao'
+
+def _garantir_tabela_sincronizacao(cursor, nome_tabela):
+    ''' Cria, se não existir, a tabela de hashes das partições de `nome_tabela`. '''
+    tabela = _tabela_sincronizacao(nome_tabela)
+    METRICAS.incrementar('db_comandos')
+    cursor.execute(f'''
+        IF OBJECT_ID(N'{tabela}', N'U') IS NULL
+            CREATE TABLE {tabela} (
+                Data_Posicao DATE NOT NULL,
+                ID_CNPJ_Fundo VARCHAR(20) NOT NULL,
+                Hash_Conteudo CHAR(32) NOT NULL,
+                Linhas INT NOT NULL,
+                Atualizado_Em DATETIME2(0) NOT NULL DEFAULT SYSDATETIME(),
+                CONSTRAINT PK_{tabela.replace('.', '_')} PRIMARY KEY (Data_Posicao, ID_CNPJ_Fundo)
+            );
+    ''')
+    return tabela
+
+# Hash gravado para partições alteradas fora de sincronizar_particoes; nunca coincide com um hash real
+HASH_INVALIDADO = 'invalidado'
+
+def _invalidar_hashes(cursor, nome_tabela, particoes):
+    '''
+    Marca, sem commit, o hash das partições alteradas sem cálculo de hash,
+    para que a próxima sincronização não as considere inalteradas. A linha
+    é mantida, de modo que essas partições são contadas como substituídas
+    (e não como novas).
+    '''
+    tabela = _garantir_tabela_sincronizacao(cursor, nome_tabela)
+    for lote in _lotes(list(particoes), LINHAS_POR_INSERT):
+        valores = ', '.join(['(?, ?)'] * len(lote))
+        cursor.execute(f'''
+            UPDATE s SET Hash_Conteudo = ?
+            FROM {tabela} s
+            INNER JOIN (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo)
+                ON s.Data_Posicao = p.Data_Posicao AND s.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo;
+        ''', [HASH_INVALIDADO] + [valor for particao in lote for valor in particao])
+        METRICAS.incrementar('db_comandos')
+
+def hash_particoes(df):
+    '''
+    Calcula um hash do conteúdo de cada partição (Data_Posicao, ID_CNPJ_Fundo)
+    de um DataFrame já tratado (tratar_colunas).
+
+    Cada linha é reduzida a um inteiro com pd.util.hash_pandas_object (colunas
+    em ordem alfabética, sem o índice); os hashes das linhas de uma partição
+    são ordenados e resumidos com BLAKE2b. O resultado independe da ordem das
+    linhas e das colunas, mas muda com qualquer valor alterado, incluído ou removido.
+
+    Retorno:
+        dict: (Data_Posicao, ID_CNPJ_Fundo) -> (hash hexadecimal de 32 caracteres, quantidade de linhas).
+    '''
+    if df.empty:
+        return {}
+    colunas = sorted(df.columns)
+    hashes_linhas = pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+    cabecalho = '|'.join(colunas).encode('utf-8')
+
+    resultado = {}
+    grupos = df.groupby(['Data_Posicao', 'ID_CNPJ_Fundo'], observed=True, sort=False).indices
+    for (data, cnpj), posicoes in grupos.items():
+        resumo = hashlib.blake2b(cabecalho, digest_size=16)
+        resumo.update(np.sort(hashes_linhas[posicoes]).tobytes())
+        resultado[(str(data), str(cnpj))] = (resumo.hexdigest(), len(posicoes))
+    return resultado
+
+@_aceita_pool
+def obter_hashes_particoes(conexao, nome_tabela, particoes):
+    '''
+    Lê os hashes gravados para as partições informadas.
+
+    Retorno:
+        dict: (Data_Posicao, ID_CNPJ_Fundo) -> hash, apenas para as partições
+              já sincronizadas. Vazio se a tabela de hashes ainda não existir.
+    '''
+    tabela = _tabela_sincronizacao(nome_tabela)
+    existe = executar_query(conexao, 'SELECT OBJECT_ID(?, \'U\');', [tabela])
+    if not existe or existe[0][0] is None:
+        return {}
+
+    hashes = {}
+    with conexao.cursor() as cursor:
+        for lote in _lotes(list(particoes), LINHAS_POR_INSERT):
+            valores = ', '.join(['(?, ?)'] * len(lote))
+            cursor.execute(f'''
+                SELECT CONVERT(CHAR(10), s.Data_Posicao, 23), s.ID_CNPJ_Fundo, s.Hash_Conteudo
+                FROM {tabela} s
+                INNER JOIN (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo)
+                    ON s.Data_Posicao = p.Data_Posicao AND s.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo;
+            ''', [valor for particao in lote for valor in particao])
+            METRICAS.incrementar('db_comandos')
+            for data, cnpj, hash_conteudo in cursor.fetchall():
+                hashes[(data, cnpj)] = hash_conteudo
+    return hashes
+
+def _gravar_hashes(cursor, nome_tabela, hashes):
+    ''' Substitui, sem commit, o hash das partições informadas. '''
+    tabela = _garantir_tabela_sincronizacao(cursor, nome_tabela)
+    _deletar_particoes(cursor, tabela, list(hashes))
+    cursor.executemany(
+        f'INSERT INTO {tabela} (Data_Posicao, ID_CNPJ_Fundo, Hash_Conteudo, Linhas) VALUES (?, ?, ?, ?)',
+        [(data, cnpj, hash_conteudo, linhas) for (data, cnpj), (hash_conteudo, linhas) in hashes.items()],
+    )
+    METRICAS.incrementar('db_comandos', len(hashes))
+
+@_aceita_pool
+def substituir_particoes_em_lotes(conexao, nome_tabela, lotes, estrategia='executemany', tamanho_lote=TAMANHO_LOTE_CARGA,
+                                  reserva=None):
+    '''
+    Substitui os dados das partições (Data_Posicao, ID_CNPJ_Fundo) recebidas
+    como um iterador de DataFrames, para cargas que não cabem em memória de
+    uma vez (modo --streaming).
+
+    Cada partição (Data_Posicao, ID_CNPJ_Fundo) é removida na primeira vez em
+    que aparece em um lote; em seguida o lote é inserido. Tudo ocorre em uma
+    única transação, confirmada só depois do último lote. Se o iterador falhar
+    no meio, nada é alterado. Partições sem nenhum lote não são tocadas.
+
+    Entrada:
+        reserva (dict): Ver sincronizar_particoes. Se a reserva de alguma
+                        partição tiver sido assumida por outro trabalhador,
+                        nada é gravado.
+
+    Retorno:
+        tuple: (linhas removidas, linhas inseridas), ou None em caso de erro.
+    '''
+    try:
+        deletados = inseridos = 0
+        particoes_vistas = set()
+
+        inicio = time.perf_counter()
+        with conexao.cursor() as cursor:
+            if reserva is not None:
+                perdidas = set(reserva['particoes']) - _concluir_reservas(cursor, nome_tabela, reserva)
+                if perdidas:
+                    conexao.rollback()
+                    print(f'{len(perdidas)} partição(ões) com a reserva assumida por outro trabalhador. Carga descartada.')
+                    return 0, 0
+            for df in lotes:
+                if df.empty:
+                    continue
+                novas = [particao for particao in _particoes(df) if particao not in particoes_vistas]
+                if novas:
+                    deletados += _deletar_particoes(cursor, nome_tabela, novas)
+                    particoes_vistas.update(novas)
+                inseridos += _inserir(cursor, nome_tabela, df, estrategia, tamanho_lote)
+            if particoes_vistas:
+                _invalidar_hashes(cursor, nome_tabela, list(particoes_vistas))
+            conexao.commit()
+        duracao = time.perf_counter() - inicio
+
+        if particoes_vistas:
+            print(f'{len(particoes_vistas)} partição(ões) substituída(s) em lotes na tabela {nome_tabela}: '
+                  f'{deletados} registro(s) removido(s), {inseridos} inserido(s) em {duracao:.2f} s '
+                  f'({inseridos / max(duracao, 1e-9):.0f} linhas/s, estratégia {estrategia}).')
+        return deletados, inseridos
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao substituir dados: {e}')
+        return None
+
+@_aceita_pool
+def sincronizar_particoes(conexao, nome_tabela, df, estrategia='executemany', tamanho_lote=TAMANHO_LOTE_CARGA, forcar=False,
+                          reserva=None):
+    '''
+    Substitui os dados das partições (Data_Posicao, ID_CNPJ_Fundo) presentes
+    no DataFrame, que pode conter várias datas, de forma incremental: só
+    remove e reinsere as partições cujo conteúdo mudou desde a última carga,
+    comparando hash_particoes com os hashes gravados em
+    <nome_tabela>_Sincronizacao (criada se não existir). A remoção é feita
+    por um DELETE com junção sobre a lista de partições e a inserção usa a
+    estratégia de inserir_dados.
+
+    Remoção, inserção e atualização dos hashes ocorrem em uma única transação,
+    de modo que o hash gravado sempre corresponde ao conteúdo da tabela.
+
+    Entrada:
+        forcar (bool): Regrava todas as partições, mesmo sem alteração.
+        reserva (dict): Reserva das partições na execução distribuída (ver
+                        reservar_particoes), com as chaves 'execucao',
+                        'trabalhador' e 'particoes'. As partições são
+                        marcadas como concluídas na mesma transação; as cuja
+                        reserva foi assumida por outro trabalhador não são gravadas.
+
+    Retorno:
+        dict: Quantidade de partições 'ignoradas' (sem alteração), 'substituidas'
+              (hash diferente), 'novas' (sem hash gravado) e 'reservas_perdidas',
+              e de linhas 'removidas' e 'inseridas'; ou None em caso de erro.
+    '''
+    resumo = {'ignoradas': 0, 'substituidas': 0, 'novas': 0, 'reservas_perdidas': 0, 'removidas': 0, 'inseridas': 0}
+    try:
+        if df.empty:
+            print('DataFrame está vazio. Nenhum dado foi inserido.')
+            return resumo
+
+        todas = hashes = hash_particoes(df)
+        anteriores = obter_hashes_particoes(conexao, nome_tabela, hashes)
+        datas = ', '.join(sorted({data for data, _ in hashes}))
+
+        inicio = time.perf_counter()
+        with conexao.cursor() as cursor:
+            if reserva is not None:
+                # A conclusão vem antes da gravação: enquanto a transação estiver
+                # aberta, nenhum outro trabalhador consegue assumir essas partições
+                concluidas = _concluir_reservas(cursor, nome_tabela, reserva)
+                resumo['reservas_perdidas'] = len(set(reserva['particoes']) - concluidas)
+                hashes = {particao: valor for particao, valor in hashes.items() if particao in concluidas}
+
+            alteradas = {
+                particao: valor for particao, valor in hashes.items()
+                if forcar or anteriores.get(particao) != valor[0]
+            }
+            resumo['ignoradas'] = len(hashes) - len(alteradas)
+            resumo['substituidas'] = sum(1 for particao in alteradas if particao in anteriores)
+            resumo['novas'] = len(alteradas) - resumo['substituidas']
+
+            if alteradas:
+                if len(alteradas) < len(todas):
+                    chaves = pd.MultiIndex.from_arrays([df['Data_Posicao'].astype(str), df['ID_CNPJ_Fundo'].astype(str)])
+                    df = df[chaves.isin(list(alteradas))]
+                resumo['removidas'] = _deletar_particoes(cursor, nome_tabela, list(alteradas))
+                resumo['inseridas'] = _inserir(cursor, nome_tabela, df, estrategia, tamanho_lote)
+                _gravar_hashes(cursor, nome_tabela, alteradas)
+            if alteradas or reserva is not None:
+                conexao.commit()
+        duracao = time.perf_counter() - inicio
+
+        if resumo['reservas_perdidas']:
+            print(f'\n{resumo["reservas_perdidas"]} partição(ões) de {datas} com a reserva assumida por outro '
+                  f'trabalhador. Carga dessas partições descartada.')
+        if not alteradas:
+            print(f'\n{len(hashes)} partição(ões) sem alteração na tabela {nome_tabela} para data(s) {datas}. Nada a carregar.')
+            return resumo
+
+        print(f'\nSincronização da tabela {nome_tabela} para data(s) {datas}: '
+              f'{resumo["ignoradas"]} partição(ões) sem alteração, {resumo["substituidas"]} substituída(s), '
+              f'{resumo["novas"]} nova(s); {resumo["removidas"]} registro(s) removido(s), '
+              f'{resumo["inseridas"]} inserido(s) em {duracao:.2f} s '
+              f'({resumo["inseridas"] / max(duracao, 1e-9):.0f} linhas/s, estratégia {estrategia}).')
+        return resumo
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao sincronizar dados: {e}')
+        return None
+
+def _tabela_reservas(nome_tabela):
+    ''' Nome da tabela de reservas das partições de `nome_tabela` na execução distribuída. '''
+    return f'{nome_tabela}_Reservas'
+
+@_aceita_pool
+def preparar_reservas(conexao, nome_tabela):
+    '''
+    Cria, se não existir, a tabela de reservas (uma linha por execução e
+    partição). Retorna False se a tabela não puder ser criada.
+    '''
+    tabela = _tabela_reservas(nome_tabela)
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(f'''
+                IF OBJECT_ID(N'{tabela}', N'U') IS NULL
+                    CREATE TABLE {tabela} (
+                        Execucao VARCHAR(100) NOT NULL,
+                        Data_Posicao DATE NOT NULL,
+                        ID_CNPJ_Fundo VARCHAR(20) NOT NULL,
+                        Trabalhador VARCHAR(200) NULL,
+                        Expira_Em DATETIME2(0) NOT NULL,
+                        Concluido_Em DATETIME2(0) NULL,
+                        Tentativas INT NOT NULL DEFAULT 0,
+                        CONSTRAINT PK_{tabela.replace('.', '_')} PRIMARY KEY (Execucao, Data_Posicao, ID_CNPJ_Fundo)
+                    );
+            ''')
+            conexao.commit()
+            METRICAS.incrementar('db_comandos')
+        return True
     except Exception as e:
-        print(f'Erro ao inserir dados: {e}')
\ No newline at end of file
+        conexao.rollback()
+        # Outro trabalhador pode ter criado a tabela ao mesmo tempo
+        existe = executar_query(conexao, 'SELECT OBJECT_ID(?, \'U\');', [tabela])
+        if existe and existe[0][0] is not None:
+            return True
+        print(f'Erro ao criar a tabela de reservas {tabela}: {e}')
+        return False
+
+@_aceita_pool
+def reservar_particoes(conexao, nome_tabela, execucao, trabalhador, particoes, duracao):
+    '''
+    Reserva para `trabalhador`, por `duracao` segundos, as partições
+    (Data_Posicao, ID_CNPJ_Fundo) ainda não concluídas na `execucao` que
+    estejam livres, com a reserva expirada ou já reservadas por ele.
+
+    Cada lote é reservado com um único MERGE (HOLDLOCK), de modo que dois
+    trabalhadores nunca obtêm a mesma partição.
+
+    Retorno:
+        list: Partições reservadas, ou None em caso de erro.
+    '''
+    tabela = _tabela_reservas(nome_tabela)
+    reservadas = []
+    try:
+        with conexao.cursor() as cursor:
+            for lote in _lotes(sorted(particoes), LINHAS_POR_INSERT):
+                valores = ', '.join(['(?, ?)'] * len(lote))
+                cursor.execute(f'''
+                    MERGE {tabela} WITH (HOLDLOCK) AS r
+                    USING (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo)
+                        ON r.Execucao = ? AND r.Data_Posicao = p.Data_Posicao AND r.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo
+                    WHEN MATCHED AND r.Concluido_Em IS NULL AND (r.Expira_Em <= SYSUTCDATETIME() OR r.Trabalhador = ?) THEN
+                        UPDATE SET Trabalhador = ?, Expira_Em = DATEADD(SECOND, ?, SYSUTCDATETIME()), Tentativas = r.Tentativas + 1
+                    WHEN NOT MATCHED THEN
+                        INSERT (Execucao, Data_Posicao, ID_CNPJ_Fundo, Trabalhador, Expira_Em, Tentativas)
+                        VALUES (?, p.Data_Posicao, p.ID_CNPJ_Fundo, ?, DATEADD(SECOND, ?, SYSUTCDATETIME()), 1)
+                    OUTPUT CONVERT(CHAR(10), inserted.Data_Posicao, 23), inserted.ID_CNPJ_Fundo;
+                ''', [valor for particao in lote for valor in particao]
+                    + [execucao, trabalhador, trabalhador, duracao, execucao, trabalhador, duracao])
+                METRICAS.incrementar('db_comandos')
+                reservadas += [(data, cnpj) for data, cnpj in cursor.fetchall()]
+            conexao.commit()
+        return reservadas
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao reservar partições: {e}')
+        return None
+
+@_aceita_pool
+def renovar_reservas(conexao, nome_tabela, execucao, trabalhador, duracao):
+    ''' Prorroga por `duracao` segundos as reservas não concluídas do trabalhador. Retorna a quantidade, ou None. '''
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {_tabela_reservas(nome_tabela)}
+                SET Expira_Em = DATEADD(SECOND, ?, SYSUTCDATETIME())
+                WHERE Execucao = ? AND Trabalhador = ? AND Concluido_Em IS NULL;
+            ''', [duracao, execucao, trabalhador])
+            renovadas = max(cursor.rowcount, 0)
+            conexao.commit()
+            METRICAS.incrementar('db_comandos')
+        return renovadas
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao renovar reservas: {e}')
+        return None
+
+@_aceita_pool
+def liberar_reservas(conexao, nome_tabela, execucao, trabalhador, particoes=None):
+    '''
+    Libera as reservas não concluídas do trabalhador (todas, ou apenas as
+    `particoes` informadas), para que outro trabalhador as assuma sem esperar
+    a expiração. Retorna a quantidade liberada, ou None.
+    '''
+    tabela = _tabela_reservas(nome_tabela)
+    comando = f'''
+        UPDATE r SET Trabalhador = NULL, Expira_Em = SYSUTCDATETIME()
+        FROM {tabela} r
+        {{juncao}}
+        WHERE r.Execucao = ? AND r.Trabalhador = ? AND r.Concluido_Em IS NULL;
+    '''
+    liberadas = 0
+    try:
+        with conexao.cursor() as cursor:
+            if particoes is None:
+                cursor.execute(comando.format(juncao=''), [execucao, trabalhador])
+                liberadas = max(cursor.rowcount, 0)
+                METRICAS.incrementar('db_comandos')
+            else:
+                for lote in _lotes(sorted(particoes), LINHAS_POR_INSERT):
+                    valores = ', '.join(['(?, ?)'] * len(lote))
+                    juncao = (f'INNER JOIN (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo) '
+                              f'ON r.Data_Posicao = p.Data_Posicao AND r.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo')
+                    cursor.execute(comando.format(juncao=juncao),
+                                   [valor for particao in lote for valor in particao] + [execucao, trabalhador])
+                    liberadas += max(cursor.rowcount, 0)
+                    METRICAS.incrementar('db_comandos')
+            conexao.commit()
+        return liberadas
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao liberar reservas: {e}')
+        return None
+
+@_aceita_pool
+def consultar_reservas_ativas(conexao, nome_tabela, execucao, trabalhador, data_inicial, data_final):
+    '''
+    Consulta as partições da `execucao` entre as datas informadas que ainda
+    não foram concluídas e estão reservadas, dentro da validade, por outro
+    trabalhador.
+
+    Retorno:
+        tuple: (quantidade, segundos até a primeira expiração), ou None em caso de erro.
+    '''
+    resultado = executar_query(conexao, f'''
+        SELECT COUNT(*), MIN(DATEDIFF(SECOND, SYSUTCDATETIME(), Expira_Em))
+        FROM {_tabela_reservas(nome_tabela)}
+        WHERE Execucao = ? AND Data_Posicao BETWEEN ? AND ? AND Concluido_Em IS NULL
+            AND Trabalhador <> ? AND Expira_Em > SYSUTCDATETIME();
+    ''', [execucao, data_inicial, data_final, trabalhador])
+    if resultado is None:
+        return None
+    quantidade, segundos = resultado[0]
+    return quantidade, max(segundos or 0, 0)
+
+def _concluir_reservas(cursor, nome_tabela, reserva):
+    '''
+    Marca, sem commit, as partições da reserva como concluídas, desde que
+    ainda pertençam ao trabalhador. As linhas atualizadas ficam bloqueadas
+    até o fim da transação.
+
+    Retorno:
+        set: Partições (Data_Posicao, ID_CNPJ_Fundo) efetivamente concluídas.
+    '''
+    concluidas = set()
+    for lote in _lotes(sorted(reserva['particoes']), LINHAS_POR_INSERT):
+        valores = ', '.join(['(?, ?)'] * len(lote))
+        cursor.execute(f'''
+            UPDATE r SET Concluido_Em = SYSUTCDATETIME()
+            OUTPUT CONVERT(CHAR(10), inserted.Data_Posicao, 23), inserted.ID_CNPJ_Fundo
+            FROM {_tabela_reservas(nome_tabela)} r
+            INNER JOIN (VALUES {valores}) AS p (Data_Posicao, ID_CNPJ_Fundo)
+                ON r.Data_Posicao = p.Data_Posicao AND r.ID_CNPJ_Fundo = p.ID_CNPJ_Fundo
+            WHERE r.Execucao = ? AND r.Trabalhador = ? AND r.Concluido_Em IS NULL;
+        ''', [valor for particao in lote for valor in particao] + [reserva['execucao'], reserva['trabalhador']])
+        METRICAS.incrementar('db_comandos')
+        concluidas.update((data, cnpj) for data, cnpj in cursor.fetchall())
+    return concluidas
+
+@_aceita_pool
+def concluir_reservas(conexao, nome_tabela, reserva):
+    '''
+    Conclui as partições da reserva que não tiveram dados a carregar (ex.:
+    extrato sem entradas). Retorna a quantidade concluída, ou None.
+    '''
+    try:
+        with conexao.cursor() as cursor:
+            concluidas = _concluir_reservas(cursor, nome_tabela, reserva)
+            conexao.commit()
+        return len(concluidas)
+    except Exception as e:
+        conexao.rollback()
+        print(f'Erro ao concluir reservas: {e}')
+        return None
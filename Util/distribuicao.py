@@ -0,0 +1,208 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import zlib
+from Util.controle_taxa import calcular_espera
+from Util.db_integracao import (preparar_reservas, reservar_particoes, renovar_reservas, liberar_reservas,
+                                concluir_reservas, consultar_reservas_ativas)
+
+# Validade, em segundos, de uma reserva sem renovação (ver DistribuidorTrabalho)
+DURACAO_RESERVA_PADRAO = 900
+TENTATIVAS_RESERVA = 3
+
+def ler_shard(texto):
+    ''' Converte "i/n" (1 <= i <= n) em (i, n); usado como `type` do argparse. '''
+    try:
+        indice, total = (int(parte) for parte in texto.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Shard inválido: {texto} (use i/n, ex.: 2/4)')
+    if not 1 <= indice <= total:
+        raise argparse.ArgumentTypeError(f'Shard inválido: {texto} (é preciso 1 <= i <= n)')
+    return indice, total
+
+def pertence_ao_shard(cnpj, data, shard):
+    '''
+    Indica se a unidade de trabalho (CNPJ, data) pertence ao shard (i, n),
+    pelo CRC32 de "cnpj|data" (ou só do CNPJ, com data None, para que todas
+    as datas de um fundo fiquem no mesmo shard). O resultado é o mesmo em
+    qualquer máquina.
+    '''
+    indice, total = shard
+    chave = cnpj if data is None else f'{cnpj}|{data}'
+    return zlib.crc32(chave.encode('utf-8')) % total == indice - 1
+
+def nome_trabalhador():
+    ''' Identificação padrão do processo nas reservas: máquina e PID. '''
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+class DistribuidorTrabalho:
+    '''
+    Divide as unidades de trabalho (data, CNPJ) entre processos, em uma ou
+    várias máquinas, por meio da tabela de reservas no banco (ver
+    db_integracao.reservar_particoes).
+
+    O shard é apenas uma preferência: cada processo começa pelas unidades do
+    seu shard e, depois de percorrê-las, passa a aceitar as de qualquer shard
+    (ver assumir_outros_shards), assumindo as que ninguém reservou e as
+    reservas expiradas de um processo que parou de renová-las (ex.: máquina
+    caiu). Antes de buscar uma unidade, o processo a reserva por
+    `duracao_reserva` segundos; reservas mantidas são renovadas em segundo
+    plano a cada terço desse tempo. Unidades concluídas na mesma `execucao`
+    não são reservadas de novo. A conclusão é gravada na transação da carga,
+    de modo que nenhuma partição é carregada duas vezes.
+
+    Com `por_fundo`, o shard é definido só pelo CNPJ (usado no --modo-periodo,
+    em que cada fundo é consultado por janela de datas); todos os processos
+    de uma mesma execução devem usar a mesma opção.
+    '''
+
+    def __init__(self, conexao, nome_tabela, shard, execucao, trabalhador=None, duracao_reserva=DURACAO_RESERVA_PADRAO,
+                 por_fundo=False):
+        self.conexao = conexao
+        self.nome_tabela = nome_tabela
+        self.shard = shard
+        self.execucao = execucao
+        self.trabalhador = trabalhador or nome_trabalhador()
+        self.duracao_reserva = max(30, int(duracao_reserva))
+        self.por_fundo = por_fundo
+        self.somente_shard = True
+        self._reservadas = {}
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._renovacao = None
+
+    def iniciar(self):
+        ''' Garante a tabela de reservas e inicia a renovação periódica. Retorna False em caso de erro. '''
+        if not preparar_reservas(self.conexao, self.nome_tabela):
+            return False
+        self._parar.clear()
+        self._renovacao = threading.Thread(target=self._renovar, name='renovacao-reservas', daemon=True)
+        self._renovacao.start()
+        print(f'Execução distribuída "{self.execucao}": shard {self.shard[0]}/{self.shard[1]}, '
+              f'trabalhador {self.trabalhador}, reservas de {self.duracao_reserva} s.')
+        return True
+
+    def _renovar(self):
+        while not self._parar.wait(self.duracao_reserva / 3):
+            with self._trava:
+                if not self._reservadas:
+                    continue
+            renovar_reservas(self.conexao, self.nome_tabela, self.execucao, self.trabalhador, self.duracao_reserva)
+
+    def fechar(self):
+        ''' Encerra a renovação e libera as reservas ainda não concluídas, para outro processo assumi-las. '''
+        if self._renovacao is None:
+            return
+        self._parar.set()
+        self._renovacao.join()
+        self._renovacao = None
+        liberadas = liberar_reservas(self.conexao, self.nome_tabela, self.execucao, self.trabalhador)
+        if liberadas:
+            print(f'{liberadas} reserva(s) não concluída(s) liberada(s).')
+        with self._trava:
+            self._reservadas.clear()
+
+    def assumir_outros_shards(self, assumir=True):
+        ''' Passa a reservar unidades de qualquer shard (ou volta a se restringir ao próprio, com False). '''
+        self.somente_shard = not assumir
+
+    def candidatos(self, fundos, data):
+        ''' Fundos da data que este processo pode reservar: os do seu shard ou, ao assumir outros shards, todos. '''
+        if not self.somente_shard:
+            return list(fundos)
+        chave_data = None if self.por_fundo else data
+        return [fundo for fundo in fundos if pertence_ao_shard(fundo['cnpj'], chave_data, self.shard)]
+
+    def reservar(self, fundos, data):
+        '''
+        Filtra os fundos que este processo pode reservar na data (ver
+        candidatos) e reserva as unidades correspondentes.
+
+        Retorno:
+            list: Fundos reservados por este processo (os demais já foram
+                  concluídos ou estão reservados por outro processo).
+        '''
+        candidatos = self.candidatos(fundos, data)
+        if not candidatos:
+            return []
+        particoes = [(data, fundo['cnpj']) for fundo in candidatos]
+
+        reservadas = None
+        for tentativa in range(TENTATIVAS_RESERVA):
+            reservadas = reservar_particoes(self.conexao, self.nome_tabela, self.execucao, self.trabalhador,
+                                            particoes, self.duracao_reserva)
+            if reservadas is not None:
+                break
+            time.sleep(calcular_espera(tentativa, base=1.0))
+        if reservadas is None:
+            print(f'{data}: não foi possível reservar as {len(candidatos)} unidade(s) candidata(s).')
+            return []
+
+        cnpjs = {cnpj for _, cnpj in reservadas}
+        with self._trava:
+            self._reservadas.setdefault(data, set()).update(cnpjs)
+        origem = 'do shard' if self.somente_shard else 'de qualquer shard'
+        print(f'{data}: {len(cnpjs)} de {len(candidatos)} unidade(s) {origem} reservada(s); '
+              f'as demais já foram concluídas ou estão com outro trabalhador.')
+        return [fundo for fundo in candidatos if fundo['cnpj'] in cnpjs]
+
+    def espera_pendencias(self, datas):
+        '''
+        Verifica se restam, entre as datas, unidades não concluídas com
+        reserva válida de outro trabalhador.
+
+        Retorno:
+            float: Segundos a aguardar antes de tentar assumi-las (até a
+                   primeira expiração, limitado a um terço da duração da
+                   reserva), ou None se não restar nenhuma ou em caso de erro.
+        '''
+        if not datas:
+            return None
+        ativas = consultar_reservas_ativas(self.conexao, self.nome_tabela, self.execucao, self.trabalhador,
+                                           min(datas), max(datas))
+        if not ativas or not ativas[0]:
+            return None
+        quantidade, segundos = ativas
+        espera = min(segundos + 1, self.duracao_reserva / 3)
+        print(f'{quantidade} unidade(s) com outro(s) trabalhador(es); nova verificação em {espera:.0f} s.')
+        return espera
+
+    def registrar_obtidos(self, data, cnpjs):
+        ''' Mantém reservadas apenas as unidades cujo extrato foi obtido e libera as demais. '''
+        with self._trava:
+            nao_obtidas = self._reservadas.get(data, set()) - set(cnpjs)
+        if nao_obtidas:
+            self.liberar(data, nao_obtidas)
+
+    def reserva(self, data, cnpjs=None):
+        ''' Reserva das unidades da data (ou apenas dos `cnpjs`), no formato de sincronizar_particoes. '''
+        with self._trava:
+            reservadas = self._reservadas.get(data, set())
+            if cnpjs is not None:
+                reservadas = reservadas & set(cnpjs)
+            particoes = [(data, cnpj) for cnpj in sorted(reservadas)]
+        return {'execucao': self.execucao, 'trabalhador': self.trabalhador, 'particoes': particoes}
+
+    def concluir_sem_carga(self, data):
+        ''' Conclui as unidades da data que não tiveram entradas a carregar. '''
+        reserva = self.reserva(data)
+        if reserva['particoes']:
+            concluir_reservas(self.conexao, self.nome_tabela, reserva)
+        self.finalizar(data)
+
+    def liberar(self, data, cnpjs=None):
+        ''' Libera as unidades da data (ou apenas dos `cnpjs`) após uma falha, para nova tentativa. '''
+        reserva = self.reserva(data, cnpjs)
+        if reserva['particoes']:
+            liberar_reservas(self.conexao, self.nome_tabela, self.execucao, self.trabalhador, reserva['particoes'])
+        self.finalizar(data, cnpjs)
+
+    def finalizar(self, data, cnpjs=None):
+        ''' Esquece as unidades da data (ou apenas dos `cnpjs`), já concluídas ou liberadas. '''
+        with self._trava:
+            if cnpjs is None:
+                self._reservadas.pop(data, None)
+            elif data in self._reservadas:
+                self._reservadas[data] -= set(cnpjs)
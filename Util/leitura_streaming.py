@@ -0,0 +1,201 @@
+import codecs
+import json
+import pandas as pd
+
+TAMANHO_LOTE_PADRAO = 50000
+TAMANHO_BLOCO_HTTP = 64 * 1024
+
+# Tipos das colunas de `entradas`; campos ausentes na resposta ficam nulos
+COLUNAS_ENTRADA = {
+    'titulo': object,
+    'tituloCp': object,
+    'data': object,
+    'historico': object,
+    'tipo': object,
+    'debito': 'float64',
+    'credito': 'float64',
+    'saldo': 'float64',
+    'isDetalheTotal': object,
+}
+
+class RespostaIncompleta(ValueError):
+    '''O corpo da resposta terminou antes do fim do documento JSON.'''
+
+class _LeitorIncremental:
+    '''
+    Leitor de JSON sobre um fluxo de blocos de bytes. Mantém em memória apenas
+    o trecho ainda não consumido, e decodifica valores completos com raw_decode.
+    '''
+
+    def __init__(self, blocos):
+        self._blocos = iter(blocos)
+        self._decodificador = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._fim = False
+
+    def _ler_mais(self):
+        ''' Acrescenta o próximo bloco ao buffer, descartando o trecho já consumido. '''
+        if self._fim:
+            return False
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        for bloco in self._blocos:
+            if bloco:
+                self._buffer += self._decodificador.decode(bloco)
+                return True
+        self._buffer += self._decodificador.decode(b'', final=True)
+        self._fim = True
+        return True
+
+    def _caractere(self):
+        ''' Retorna o próximo caractere significativo, sem consumi-lo. '''
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._ler_mais() or (self._fim and self._pos >= len(self._buffer)):
+                raise RespostaIncompleta('JSON terminou inesperadamente')
+
+    def esperar(self, caractere):
+        ''' Consome o caractere esperado ou falha. '''
+        atual = self._caractere()
+        if atual != caractere:
+            raise ValueError(f"JSON inesperado: '{caractere}' esperado, '{atual}' encontrado")
+        self._pos += 1
+
+    def consumir_se(self, caractere):
+        ''' Consome o caractere se ele for o próximo, retornando se consumiu. '''
+        if self._caractere() == caractere:
+            self._pos += 1
+            return True
+        return False
+
+    def espiar(self):
+        return self._caractere()
+
+    def valor(self):
+        ''' Decodifica e consome o próximo valor JSON completo. '''
+        self._caractere()
+        while True:
+            try:
+                valor, fim = self._json.raw_decode(self._buffer, self._pos)
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if fim < len(self._buffer) or self._fim:
+                    self._pos = fim
+                    return valor
+            except json.JSONDecodeError:
+                if self._fim:
+                    raise
+            if not self._ler_mais():
+                raise RespostaIncompleta('JSON terminou inesperadamente')
+
+    def chaves(self):
+        ''' Itera sobre as chaves de um objeto, deixando o valor de cada uma para o chamador. '''
+        self.esperar('{')
+        if self.consumir_se('}'):
+            return
+        while True:
+            chave = self.valor()
+            self.esperar(':')
+            yield chave
+            if self.consumir_se('}'):
+                return
+            self.esperar(',')
+
+    def itens(self):
+        ''' Itera sobre os elementos de uma lista, deixando cada valor para o chamador. '''
+        self.esperar('[')
+        if self.consumir_se(']'):
+            return
+        while True:
+            yield
+            if self.consumir_se(']'):
+                return
+            self.esperar(',')
+
+def iterar_eventos_demonstrativo(blocos):
+    '''
+    Percorre incrementalmente uma resposta de getDemonstrativoCaixa.
+
+    Apenas uma entrada por vez é materializada. Os demais campos do primeiro
+    demonstrativo e o campo `errors` são lidos normalmente (são pequenos).
+
+    Entrada:
+        blocos (iterable): Blocos de bytes do corpo da resposta
+                           (ex.: response.iter_content()).
+
+    Retorno:
+        Gerador de eventos:
+            ('campo', nome, valor) para cada campo escalar do demonstrativo;
+            ('entrada', dict) para cada item de `entradas`;
+            ('errors', lista) se a resposta trouxer erros.
+    '''
+    leitor = _LeitorIncremental(blocos)
+    for chave in leitor.chaves():
+        if chave != 'data' or leitor.espiar() != '{':
+            valor = leitor.valor()
+            if chave == 'errors' and valor:
+                yield ('errors', valor)
+            continue
+
+        for chave_data in leitor.chaves():
+            if chave_data != 'getDemonstrativoCaixa' or leitor.espiar() != '[':
+                leitor.valor()
+                continue
+
+            for posicao, _ in enumerate(leitor.itens()):
+                if posicao > 0 or leitor.espiar() != '{':
+                    # Assim como normalize_df, só o primeiro demonstrativo é usado
+                    leitor.valor()
+                    continue
+                for campo in leitor.chaves():
+                    if campo == 'entradas' and leitor.espiar() == '[':
+                        for _ in leitor.itens():
+                            yield ('entrada', leitor.valor())
+                    else:
+                        yield ('campo', campo, leitor.valor())
+
+def _montar_lote(entradas, cnpj):
+    ''' Converte as entradas acumuladas em um DataFrame com tipos explícitos por coluna. '''
+    df = pd.DataFrame(entradas)
+    for nome, dtype in COLUNAS_ENTRADA.items():
+        if nome not in df.columns:
+            df[nome] = None
+        if df[nome].dtype != dtype:
+            df[nome] = df[nome].astype(dtype)
+    df['ID_CNPJ_Fundo'] = cnpj
+    return df
+
+def iterar_lotes_entradas(eventos, cnpj, tamanho_lote=TAMANHO_LOTE_PADRAO, campos=None):
+    '''
+    Agrupa as entradas de iterar_eventos_demonstrativo em DataFrames de até
+    `tamanho_lote` linhas, no mesmo formato produzido por normalize_df.
+
+    Entrada:
+        eventos (iterable): Eventos de iterar_eventos_demonstrativo.
+        cnpj (str): CNPJ (somente dígitos) gravado em ID_CNPJ_Fundo.
+        campos (dict): Se informado, recebe os campos escalares do demonstrativo
+                       (ex.: nomeDoFundo) à medida que são lidos.
+
+    Retorno:
+        Gerador de DataFrames. Lança ValueError se a resposta trouxer `errors`.
+    '''
+    campos = {} if campos is None else campos
+    entradas = []
+
+    for evento in eventos:
+        if evento[0] == 'entrada':
+            entradas.append(evento[1])
+            if len(entradas) >= tamanho_lote:
+                yield _montar_lote(entradas, cnpj)
+                entradas = []
+        elif evento[0] == 'campo':
+            campos[evento[1]] = evento[2]
+        else:
+            raise ValueError(f'Não foi possível buscar demonstrativo de caixa: {evento[1]}')
+
+    if entradas:
+        yield _montar_lote(entradas, cnpj)
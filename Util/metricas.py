@@ -0,0 +1,268 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Limites (em segundos) dos histogramas de latência HTTP
+LIMITES_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Limites dos histogramas de linhas por fundo
+LIMITES_LINHAS = (10, 100, 1000, 10000, 100000, 1000000)
+MODOS_PERFIL = ('cprofile', 'tracemalloc')
+ETAPAS = ('autenticacao', 'busca', 'normalizacao', 'mapeamento_ids', 'tratamento', 'carga', 'delete', 'insert')
+PREFIXO_PROMETHEUS = 'vortx'
+# Contadores de respostas HTTP por status (http_status_200, http_status_429...)
+PREFIXO_STATUS_HTTP = 'http_status_'
+
+class _Histograma:
+    def __init__(self, limites):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        posicao = len(self.limites)
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                posicao = i
+                break
+        self.contagens[posicao] += 1
+        self.soma += valor
+        self.contagem += 1
+
+    def como_dict(self):
+        acumulado = 0
+        baldes = {}
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            baldes[str(limite)] = acumulado
+        return {'contagem': self.contagem, 'soma': round(self.soma, 6), 'baldes': baldes}
+
+class Metricas:
+    '''
+    Coleta, de forma segura entre threads, as métricas de uma execução:
+    tempo por etapa, histogramas (latência HTTP, linhas por fundo), contadores
+    (bytes recebidos, comandos enviados ao banco etc.) e linhas por fundo.
+
+    Opcionalmente perfila uma única etapa com cProfile ou tracemalloc
+    (ver configurar_perfil).
+    '''
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.iniciado_em = datetime.now()
+        self._inicio = time.perf_counter()
+        self._etapas = {}
+        self._histogramas = {}
+        self._contadores = {}
+        self._linhas_por_fundo = {}
+        self._perfil_etapa = None
+        self._perfil_modo = None
+        self._perfil_pasta = None
+        self._perfilador = None
+        self._perfil_ativo = False
+        self._capturas_memoria = 0
+        self._maior_pico = None
+
+    def configurar_perfil(self, etapa, modo='cprofile', pasta='./Relatorios'):
+        ''' Ativa a captura de cProfile ou tracemalloc para a etapa informada. '''
+        if modo not in MODOS_PERFIL:
+            raise ValueError(f'Modo de perfil desconhecido: {modo}')
+        self._perfil_etapa = etapa
+        self._perfil_modo = modo
+        self._perfil_pasta = pasta
+
+    @contextmanager
+    def medir(self, etapa):
+        ''' Mede a duração do bloco e a acumula na etapa. '''
+        perfilar = False
+        if etapa == self._perfil_etapa:
+            with self._trava:
+                # cProfile e tracemalloc não suportam capturas simultâneas da mesma etapa
+                perfilar = not self._perfil_ativo
+                self._perfil_ativo = self._perfil_ativo or perfilar
+        if perfilar:
+            self._iniciar_perfil()
+
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            if perfilar:
+                self._parar_perfil()
+            with self._trava:
+                dados = self._etapas.setdefault(etapa, {'execucoes': 0, 'segundos': 0.0, 'maximo': 0.0})
+                dados['execucoes'] += 1
+                dados['segundos'] += duracao
+                dados['maximo'] = max(dados['maximo'], duracao)
+
+    def observar(self, nome, valor, limites=LIMITES_LATENCIA):
+        ''' Registra um valor no histograma `nome`. '''
+        with self._trava:
+            histograma = self._histogramas.get(nome)
+            if histograma is None:
+                histograma = self._histogramas[nome] = _Histograma(limites)
+            histograma.observar(valor)
+
+    def incrementar(self, nome, valor=1):
+        ''' Soma `valor` ao contador `nome`. '''
+        with self._trava:
+            self._contadores[nome] = self._contadores.get(nome, 0) + valor
+
+    def registrar_linhas_fundo(self, cnpj, linhas):
+        ''' Acumula as linhas recebidas de um fundo e as registra no histograma de linhas por fundo. '''
+        self.observar('linhas_por_fundo', linhas, LIMITES_LINHAS)
+        with self._trava:
+            self._linhas_por_fundo[cnpj] = self._linhas_por_fundo.get(cnpj, 0) + int(linhas)
+
+    def _iniciar_perfil(self):
+        if self._perfil_modo == 'cprofile':
+            if self._perfilador is None:
+                self._perfilador = cProfile.Profile()
+            self._perfilador.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+            tracemalloc.reset_peak()
+
+    def _parar_perfil(self):
+        if self._perfil_modo == 'cprofile':
+            self._perfilador.disable()
+        else:
+            # Guarda apenas a captura da execução com o maior pico de memória
+            atual, pico = tracemalloc.get_traced_memory()
+            self._capturas_memoria += 1
+            if self._maior_pico is None or pico > self._maior_pico[1]:
+                self._maior_pico = (atual, pico, tracemalloc.take_snapshot())
+        with self._trava:
+            self._perfil_ativo = False
+
+    def _salvar_perfil(self, sufixo):
+        ''' Grava o resultado da captura, retornando o caminho do arquivo ou None. '''
+        if self._perfil_etapa is None:
+            return None
+        os.makedirs(self._perfil_pasta, exist_ok=True)
+        base = os.path.join(self._perfil_pasta, f'perfil_{self._perfil_etapa}_{sufixo}')
+
+        if self._perfil_modo == 'cprofile':
+            if self._perfilador is None:
+                return None
+            self._perfilador.dump_stats(f'{base}.prof')
+            texto = io.StringIO()
+            pstats.Stats(self._perfilador, stream=texto).sort_stats('cumulative').print_stats(30)
+            with open(f'{base}.txt', 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto.getvalue())
+            return f'{base}.prof'
+
+        if self._maior_pico is None:
+            return None
+        atual, pico, snapshot = self._maior_pico
+        with open(f'{base}.txt', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(f'Execuções capturadas: {self._capturas_memoria}\n')
+            arquivo.write(f'Maior pico: {pico / 1024 / 1024:.1f} MB (memória retida ao final: {atual / 1024 / 1024:.1f} MB)\n\n')
+            for estatistica in snapshot.statistics('lineno')[:30]:
+                arquivo.write(f'{estatistica}\n')
+        return f'{base}.txt'
+
+    def relatorio(self):
+        ''' Retorna todas as métricas coletadas em um dict serializável em JSON. '''
+        with self._trava:
+            return {
+                'iniciado_em': self.iniciado_em.isoformat(timespec='seconds'),
+                'duracao_segundos': round(time.perf_counter() - self._inicio, 3),
+                'etapas': {
+                    etapa: {
+                        'execucoes': dados['execucoes'],
+                        'segundos': round(dados['segundos'], 6),
+                        'maximo': round(dados['maximo'], 6),
+                    }
+                    for etapa, dados in sorted(self._etapas.items())
+                },
+                'histogramas': {nome: histograma.como_dict() for nome, histograma in sorted(self._histogramas.items())},
+                'contadores': dict(sorted(self._contadores.items())),
+                'linhas_por_fundo': dict(sorted(self._linhas_por_fundo.items())),
+            }
+
+    def texto_prometheus(self):
+        ''' Formata as métricas no formato texto do Prometheus (textfile collector). '''
+        relatorio = self.relatorio()
+        p = PREFIXO_PROMETHEUS
+        linhas = [
+            f'# HELP {p}_execucao_segundos Duração da execução até a exportação.',
+            f'# TYPE {p}_execucao_segundos gauge',
+            f'{p}_execucao_segundos {relatorio["duracao_segundos"]}',
+            f'# HELP {p}_etapa_segundos_total Tempo acumulado por etapa.',
+            f'# TYPE {p}_etapa_segundos_total counter',
+        ]
+        linhas += [f'{p}_etapa_segundos_total{{etapa="{etapa}"}} {dados["segundos"]}'
+                   for etapa, dados in relatorio['etapas'].items()]
+        linhas += [f'# HELP {p}_etapa_execucoes_total Execuções por etapa.', f'# TYPE {p}_etapa_execucoes_total counter']
+        linhas += [f'{p}_etapa_execucoes_total{{etapa="{etapa}"}} {dados["execucoes"]}'
+                   for etapa, dados in relatorio['etapas'].items()]
+
+        # Os contadores http_status_<código> formam uma única família, rotulada pelo status
+        respostas_http = {nome[len(PREFIXO_STATUS_HTTP):]: valor for nome, valor in relatorio['contadores'].items()
+                          if nome.startswith(PREFIXO_STATUS_HTTP)}
+        if respostas_http:
+            linhas += [f'# HELP {p}_http_respostas_total Respostas HTTP recebidas da API, por status.',
+                       f'# TYPE {p}_http_respostas_total counter']
+            linhas += [f'{p}_http_respostas_total{{status="{status}"}} {valor}' for status, valor in respostas_http.items()]
+
+        for nome, valor in relatorio['contadores'].items():
+            if not nome.startswith(PREFIXO_STATUS_HTTP):
+                linhas += [f'# TYPE {p}_{nome}_total counter', f'{p}_{nome}_total {valor}']
+
+        for nome, histograma in relatorio['histogramas'].items():
+            linhas.append(f'# TYPE {p}_{nome} histogram')
+            linhas += [f'{p}_{nome}_bucket{{le="{limite}"}} {contagem}' for limite, contagem in histograma['baldes'].items()]
+            linhas += [f'{p}_{nome}_sum {histograma["soma"]}', f'{p}_{nome}_count {histograma["contagem"]}']
+
+        linhas += [f'# TYPE {p}_ultima_exportacao_timestamp_segundos gauge',
+                   f'{p}_ultima_exportacao_timestamp_segundos {time.time():.0f}']
+        return '\n'.join(linhas) + '\n'
+
+    def exportar(self, pasta='./Relatorios', caminho_prometheus=None):
+        '''
+        Grava o relatório JSON da execução em `pasta`, o arquivo do Prometheus
+        (se `caminho_prometheus` for informado, com substituição atômica) e a
+        captura de perfil, se configurada.
+
+        Retorno:
+            list: Caminhos dos arquivos gravados.
+        '''
+        sufixo = self.iniciado_em.strftime('%Y%m%d_%H%M%S')
+        os.makedirs(pasta, exist_ok=True)
+        caminhos = [os.path.join(pasta, f'metricas_{sufixo}.json')]
+        with open(caminhos[0], 'w', encoding='utf-8') as arquivo:
+            json.dump(self.relatorio(), arquivo, indent=2, ensure_ascii=False)
+
+        if caminho_prometheus:
+            pasta_prometheus = os.path.dirname(caminho_prometheus)
+            if pasta_prometheus:
+                os.makedirs(pasta_prometheus, exist_ok=True)
+            temporario = f'{caminho_prometheus}.tmp'
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(self.texto_prometheus())
+            os.replace(temporario, caminho_prometheus)
+            caminhos.append(caminho_prometheus)
+
+        perfil = self._salvar_perfil(sufixo)
+        if perfil:
+            caminhos.append(perfil)
+        return caminhos
+
+    def resumo_etapas(self):
+        ''' Texto curto com o tempo total de cada etapa, do maior para o menor. '''
+        etapas = self.relatorio()['etapas']
+        ordenadas = sorted(etapas.items(), key=lambda item: item[1]['segundos'], reverse=True)
+        return ', '.join(f'{etapa} {dados["segundos"]:.2f} s' for etapa, dados in ordenadas)
+
+# Instância usada por todos os módulos da execução
+METRICAS = Metricas()
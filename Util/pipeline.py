@@ -0,0 +1,131 @@
+import queue
+import threading
+
+_FIM = object()
+
+def _colocar(fila, item, parar):
+    '''Coloca um item na fila, desistindo se o pipeline for interrompido.'''
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _consumir(fila, parar):
+    '''Itera sobre os itens da fila até o marcador de fim ou a interrupção do pipeline.'''
+    while not parar.is_set():
+        try:
+            item = fila.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _FIM:
+            # Repassa o marcador às demais threads do mesmo estágio
+            _colocar(fila, _FIM, parar)
+            return
+        yield item
+
+class _EntradaCompartilhada:
+    '''Iterador que pode ser consumido por várias threads ao mesmo tempo.'''
+
+    def __init__(self, itens):
+        self._itens = iter(itens)
+        self._trava = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._trava:
+            return next(self._itens)
+
+def _executar_estagio(nome, funcao, entrada, saida, parar, erros, encerrar):
+    '''Aplica a função do estágio a cada item de entrada e repassa o resultado adiante.'''
+    try:
+        for item in entrada:
+            if parar.is_set():
+                break
+            resultado = funcao(item)
+            if resultado is None:
+                continue
+            if saida is not None and not _colocar(saida, resultado, parar):
+                break
+    except Exception as e:
+        print(f'Erro no estágio {nome}: {e}')
+        erros.append(e)
+        parar.set()
+    finally:
+        encerrar()
+
+def executar_pipeline(itens, estagios, tamanhos_fila=None):
+    '''
+    Executa estágios encadeados em threads separadas, ligadas por filas limitadas.
+
+    Cada estágio processa um item por vez, na ordem de chegada, e entrega o
+    resultado ao próximo estágio. Assim o estágio N trabalha no item i enquanto o
+    estágio N+1 trabalha no item i-1. Quando uma fila está cheia o estágio
+    anterior aguarda (backpressure). Se a função de um estágio retornar None,
+    o item é descartado.
+
+    Um estágio pode ter várias threads (ex.: cargas em paralelo, cada uma com
+    sua conexão); nesse caso seus itens deixam de seguir a ordem de chegada.
+
+    Entrada:
+        itens (iterable): Itens de entrada do primeiro estágio.
+        estagios (list): Lista de tuplas (nome, funcao) ou (nome, funcao, threads).
+        tamanhos_fila (list): Capacidade de cada fila entre estágios
+                              (len(estagios) - 1 valores). Padrão: 1.
+
+    Se algum estágio falhar, o pipeline é interrompido e a exceção é relançada.
+    '''
+    if not estagios:
+        return
+
+    quantidade_filas = len(estagios) - 1
+    tamanhos_fila = list(tamanhos_fila or [])
+    tamanhos_fila += [1] * (quantidade_filas - len(tamanhos_fila))
+    filas = [queue.Queue(maxsize=max(1, int(t))) for t in tamanhos_fila[:quantidade_filas]]
+
+    parar = threading.Event()
+    erros = []
+    threads = []
+
+    for posicao, estagio in enumerate(estagios):
+        nome, funcao = estagio[:2]
+        quantidade = max(1, int(estagio[2])) if len(estagio) > 2 else 1
+        saida = filas[posicao] if posicao < quantidade_filas else None
+        entrada_inicial = _EntradaCompartilhada(itens) if posicao == 0 else None
+
+        # Só a última thread do estágio a terminar sinaliza o fim ao estágio seguinte
+        restantes = [quantidade]
+        trava = threading.Lock()
+
+        def encerrar(saida=saida, restantes=restantes, trava=trava):
+            with trava:
+                restantes[0] -= 1
+                ultima = restantes[0] == 0
+            if ultima and saida is not None:
+                _colocar(saida, _FIM, parar)
+
+        for numero in range(quantidade):
+            entrada = entrada_inicial if posicao == 0 else _consumir(filas[posicao - 1], parar)
+            thread = threading.Thread(
+                target=_executar_estagio,
+                args=(nome, funcao, entrada, saida, parar, erros, encerrar),
+                name=f'pipeline-{nome}' if quantidade == 1 else f'pipeline-{nome}-{numero + 1}',
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        parar.set()
+        raise
+
+    if erros:
+        raise erros[0]
@@ -1,99 +1,175 @@
 import json
+import numpy as np
 import pandas as pd
 import os
-from Util.db_integracao import obter_id_cota_cadastro
+from Util.db_integracao import obter_ids_cota_cadastro
 
-def normalize_df(pasta='./Temp_file'):
+def _extrair_df(dados, cnpj, origem):
     '''
-    Lê todos os arquivos JSON da pasta e retorna um DataFrame consolidado.
+    Extrai as entradas de um JSON de demonstrativo de caixa.
+    Retorna (DataFrame, nome_fundo) ou None se o JSON não puder ser aproveitado.
+    '''
+    # Tratamento para respostas com "errors"
+    if "errors" in dados and dados["errors"]:
+        print(f"{origem}: Não foi possível buscar demonstrativo de caixa")
+        return None
+
+    try:
+        entradas = dados['data']['getDemonstrativoCaixa'][0]['entradas']
+        nome_fundo = dados['data']['getDemonstrativoCaixa'][0].get('nomeDoFundo', 'Fundo desconhecido')
+        df = pd.DataFrame(entradas)
+        df['ID_CNPJ_Fundo'] = cnpj
+        return df, nome_fundo
+    except (KeyError, IndexError, TypeError):
+        print(f"Erro ao processar {origem}: estrutura inesperada.")
+        return None
+
+def normalize_registros(registros):
+    '''
+    Consolida em um DataFrame os extratos recebidos em memória.
+
+    Entrada:
+        registros (iterable): Tuplas (cnpj, dados), como as geradas por
+                              service.iterar_extratos.
     '''
     todos_dfs = []
     nomes_fundos = {}
 
-    if not os.path.exists(pasta):
-        print(f"Pasta '{pasta}' não encontrada.")
-        return pd.DataFrame(), {}
+    for cnpj, dados in registros:
+        extraido = _extrair_df(dados, cnpj, f'extrato_{cnpj}')
+        if extraido is not None:
+            df, nome_fundo = extraido
+            nomes_fundos[cnpj] = nome_fundo
+            todos_dfs.append(df)
 
-    lista_arquivos = os.listdir(pasta)
+    df_final = pd.concat(todos_dfs, ignore_index=True) if todos_dfs else pd.DataFrame()
+    return df_final, nomes_fundos
 
-    for arquivo in lista_arquivos:
+def _ler_arquivos_json(pasta):
+    '''Lê os arquivos extrato_<cnpj>.json da pasta, gerando tuplas (cnpj, dados).'''
+    for arquivo in os.listdir(pasta):
         if arquivo.endswith('.json'):
             caminho = os.path.join(pasta, arquivo)
             with open(caminho, 'r', encoding='utf-8') as file:
                 dados = json.load(file)
+            # Extrai CNPJ do nome do arquivo
+            cnpj = arquivo.replace('extrato_', '').replace('.json', '')
+            yield cnpj, dados
+
+def normalize_df(pasta='./Temp_file'):
+    '''
+    Lê todos os arquivos JSON da pasta e retorna um DataFrame consolidado.
+    '''
+    if not os.path.exists(pasta):
+        print(f"Pasta '{pasta}' não encontrada.")
+        return pd.DataFrame(), {}
 
-                # Tratamento para arquivos com "errors"
-                if "errors" in dados and dados["errors"]:
-                    print(f"{arquivo}: Não foi possível buscar demonstrativo de caixa")
-                    continue
+    return normalize_registros(_ler_arquivos_json(pasta))
 
-                try:
-                    entradas = dados['data']['getDemonstrativoCaixa'][0]['entradas']
-                    nome_fundo = dados['data']['getDemonstrativoCaixa'][0].get('nomeDoFundo', 'Fundo desconhecido')
-                    df = pd.DataFrame(entradas)
+def mapear_ids_conta(conexao, nomes_fundos, cache_ids=None):
+    '''
+    Mapeia os IDs de conta com base nos nomes dos fundos.
 
-                    # Extrai CNPJ do nome do arquivo
-                    cnpj = arquivo.replace('extrato_', '').replace('.json', '')
-                    df['ID_CNPJ_Fundo'] = cnpj
-                    nomes_fundos[cnpj] = nome_fundo
-                    todos_dfs.append(df)
-                except (KeyError, IndexError, TypeError):
-                    print(f"Erro ao processar {arquivo}: estrutura inesperada.")
+    Os nomes ausentes de `cache_ids` são resolvidos em uma única consulta e o
+    resultado (inclusive nomes não encontrados, com None) fica memorizado no
+    próprio `cache_ids`, de modo que as datas seguintes da execução não
+    consultam o banco. Quem mantém o cache por mais tempo (ex.: --servico)
+    deve descartar os None periodicamente, para que nomes cadastrados depois
+    sejam encontrados.
+    '''
+    if cache_ids is None:
+        cache_ids = {}
 
-    df_final = pd.concat(todos_dfs, ignore_index=True) if todos_dfs else pd.DataFrame()
-    return df_final, nomes_fundos
+    pendentes = [nome for nome in set(nomes_fundos.values()) if nome not in cache_ids]
+    if pendentes:
+        encontrados = obter_ids_cota_cadastro(conexao, pendentes)
+        for nome in pendentes:
+            cache_ids[nome] = encontrados.get(nome)
+            if cache_ids[nome] is None:
+                print(f'\nID_Cota_Cadastro: Nenhum resultado encontrado para {nome}.\n')
 
-def mapear_ids_conta(conexao, nomes_fundos):
-    '''Mapeia os IDs de conta com base nos nomes dos fundos.'''
     mapa_ids = {}
     for cnpj, nome_fundo in nomes_fundos.items():
-        id_conta = obter_id_cota_cadastro(conexao, nome_fundo)
+        id_conta = cache_ids.get(nome_fundo)
         mapa_ids[cnpj] = id_conta if id_conta else '0'  # Preenche com '0' se não encontrar
     return mapa_ids
 
+COLUNAS_DESCARTADAS = ['titulo', 'tituloCp', 'tipo', 'debito', 'credito', 'isDetalheTotal']
+ID_TRANSACTION = 'PYTHON_V1.0'
+
+def _por_valor_unico(serie, funcao):
+    '''
+    Aplica `funcao` (que recebe e retorna um pd.Index) apenas aos valores
+    distintos da série e redistribui o resultado para todas as linhas.
+    '''
+    if serie.hasnans:
+        # factorize unifica None e NaN; nesse caso raro, aplica sobre todos os valores
+        return funcao(pd.Index(serie, dtype=object)).to_numpy(dtype=object)
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return funcao(pd.Index(unicos)).to_numpy(dtype=object)[codigos]
+
 def tratar_colunas(df, id_cota_cadastro):
-    '''Trata as colunas do DataFrame para padronização e formatação.'''
+    '''
+    Trata as colunas do DataFrame para padronização e formatação.
+
+    Todas as operações são vetorizadas e o DataFrame de entrada não é alterado.
+    Tipos do resultado: Contabil, ID_Transaction e ID_CNPJ_Fundo categóricos,
+    ID_Cota_Cadastro int32 e Valor_Total float64.
+    '''
     if 'ID_CNPJ_Fundo' not in df.columns:
         print("Coluna 'ID_CNPJ_Fundo' não encontrada no DataFrame.")
         return df  # ou lançar uma exceção, dependendo do fluxo desejado
 
-    # Concatenar valores das colunas e deletar as colunas que não serão utilizadas
+    quantidade = len(df)
+
+    # Concatenar valores das colunas e descartar as colunas que não serão utilizadas
     if 'titulo' in df.columns and 'tituloCp' in df.columns:
-        df['Observacao'] = df['titulo'] + ' - ' + df['tituloCp']
-        df.drop(['titulo', 'tituloCp', 'tipo', 'debito', 'credito', 'isDetalheTotal'], axis=1, inplace=True)
+        observacao = df['titulo'] + ' - ' + df['tituloCp']
+        descartadas = set(COLUNAS_DESCARTADAS)
     else:
-        df['Observacao'] = ''
+        observacao = ''
+        descartadas = set()
+
+    # As colunas mantidas são referenciadas, sem cópia; a ordem final é a mesma
+    # da versão anterior: colunas originais, Observacao, Contabil, faltantes.
+    colunas = {coluna: df[coluna] for coluna in df.columns if coluna not in descartadas}
+    colunas['Observacao'] = observacao
 
     # Criar coluna Contabil com base na coluna saldo
     if 'saldo' in df.columns:
-        df['Contabil'] = df['saldo'].apply(lambda x: 'C' if x >= 0 else 'D')
-        df['saldo'] = df['saldo'].abs()  # Remove o sinal negativo
+        saldo = df['saldo'].to_numpy(dtype='float64')
+        colunas['Contabil'] = pd.Categorical.from_codes((~(saldo >= 0)).astype('int8'), categories=['C', 'D'])
+        colunas['saldo'] = np.abs(saldo)  # Remove o sinal negativo
     else:
-        df['Contabil'] = ''
-    
-    # Formatar coluna data
+        colunas['Contabil'] = ''
+
+    # Formatar coluna data: todas as linhas costumam ter a mesma data, então a
+    # conversão é feita só sobre os valores distintos
     if 'data' in df.columns:
-        df['data'] = pd.to_datetime(df['data']).dt.strftime('%Y-%m-%d')
-    
+        colunas['data'] = _por_valor_unico(df['data'], lambda datas: pd.to_datetime(datas).strftime('%Y-%m-%d'))
+
     renomear_colunas = {
-        'data': 'Data_Posicao', 
-        'historico': 'Lancamento', 
+        'data': 'Data_Posicao',
+        'historico': 'Lancamento',
         'saldo': 'Valor_Total'
     }
 
     for coluna in renomear_colunas:
-        if coluna not in df.columns:
-            df[coluna] = ''
-    df.rename(columns=renomear_colunas, inplace=True)
-    
-    
-    df['ID_Cota_Cadastro'] = df['ID_CNPJ_Fundo'].map(id_cota_cadastro)
-    df['ID_Cota_Cadastro'] = df['ID_Cota_Cadastro'].astype(int)
-    
-    df['ID_Transaction'] = 'PYTHON_V1.0'
+        if coluna not in colunas:
+            colunas[coluna] = ''
+    colunas = {renomear_colunas.get(coluna, coluna): valores for coluna, valores in colunas.items()}
+
+    cnpjs = pd.Categorical(df['ID_CNPJ_Fundo'])
+    ids_por_cnpj = np.array([int(id_cota_cadastro[cnpj]) for cnpj in cnpjs.categories], dtype='int32')
+    colunas['ID_CNPJ_Fundo'] = cnpjs
+    colunas['ID_Cota_Cadastro'] = ids_por_cnpj[cnpjs.codes]
+
+    colunas['ID_Transaction'] = pd.Categorical.from_codes(np.zeros(quantidade, dtype='int8'), categories=[ID_TRANSACTION])
 
     # Padronizar texto da coluna 'Lancamento'
-    if 'Lancamento' in df.columns:
-        df['Lancamento'] = df['Lancamento'].astype(str).str.upper()
+    if isinstance(colunas['Lancamento'], str):
+        colunas['Lancamento'] = colunas['Lancamento'].upper()
+    else:
+        colunas['Lancamento'] = _por_valor_unico(colunas['Lancamento'], lambda textos: textos.astype(str).str.upper())
 
-    return df
\ No newline at end of file
+    return pd.DataFrame(colunas, index=df.index, copy=False)
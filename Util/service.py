@@ -1,112 +1,570 @@
 import requests
 import json
+import hashlib
 import os
 import glob
+import shutil
+import threading
+from datetime import date
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Util.leitura_streaming import iterar_eventos_demonstrativo, iterar_lotes_entradas, TAMANHO_LOTE_PADRAO, TAMANHO_BLOCO_HTTP
+from Util.controle_taxa import AgendadorRequisicoes
+from Util.autenticacao import autenticar
+from Util.metricas import METRICAS
 
 def obter_token(token, login):
     '''
     Obtém um token de autenticação da API da Vortx.
 
+    Para reaproveitar o token entre execuções e renová-lo automaticamente,
+    use autenticacao.GerenciadorToken.
+
     Retorno:
         str: O token de autenticação se a solicitação for bem-sucedida, caso contrário, None.
     '''
-    
-    url = 'https://apis.vortx.com.br/vxlogin/api/user/AuthUserApi'
+    resposta = autenticar(token, login)
+    if resposta:
+        print(f'Token obtido com sucesso!')
+        return resposta.get('token')
+    return None
+
+def criar_sessao(max_conexoes=10):
+    '''
+    Cria uma sessão HTTP com pool de conexões keep-alive, reutilizada por
+    todas as requisições de uma execução.
+
+    Entrada:
+        max_conexoes (int): Quantidade máxima de conexões mantidas no pool.
+    '''
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_conexoes)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+URL_GRAPHQL = 'https://apis.vortx.com.br/frontier/graphql'
+HEADERS_JSON = {'Content-Type': 'application/json'}
+
+CAMPOS_DEMONSTRATIVO = '''
+            carteira
+            nomeDoFundo
+            dataInicio
+            dataFim
+            entradas {
+                titulo
+                tituloCp
+                data
+                historico
+                tipo
+                debito
+                credito
+                saldo
+                isDetalheTotal
+            }
+'''
+
+QUERY_DEMONSTRATIVO = f'''
+    query GetDemonstrativoCaixa($cnpjFundo: String!, $data: Date!) {{
+        getDemonstrativoCaixa(cnpjFundo: $cnpjFundo, data: $data) {{{CAMPOS_DEMONSTRATIVO}        }}
+    }}
+'''
+
+# A chave de cache depende só dos campos selecionados, de modo que respostas
+# obtidas individualmente ou em lote (aliases) são intercambiáveis
+HASH_QUERY_DEMONSTRATIVO = hashlib.sha256(' '.join(CAMPOS_DEMONSTRATIVO.split()).encode('utf-8')).hexdigest()[:16]
+
+def montar_query_lote(quantidade):
+    '''
+    Monta uma query com `quantidade` seleções de getDemonstrativoCaixa, cada
+    uma com o alias f<i> e as variáveis $cnpjFundo<i> e $data<i>.
+    '''
+    variaveis = ', '.join(f'$cnpjFundo{i}: String!, $data{i}: Date!' for i in range(quantidade))
+    selecoes = ''.join(
+        f'''
+        f{i}: getDemonstrativoCaixa(cnpjFundo: $cnpjFundo{i}, data: $data{i}) {{{CAMPOS_DEMONSTRATIVO}        }}'''
+        for i in range(quantidade)
+    )
+    return f'''
+    query GetDemonstrativoCaixaLote({variaveis}) {{{selecoes}
+    }}
+'''
+
+def somente_digitos(cnpj):
+    '''Remove a pontuação de um CNPJ no formato 00.000.000/0000-00.'''
+    return cnpj.replace("/", "").replace(".", "").replace("-", "")
+
+def salvar_extrato_json(pasta, cnpj, dados):
+    '''Salva o JSON de um extrato em `pasta/extrato_<cnpj>.json`, no formato lido por normalize_df.'''
+    nome_arquivo = os.path.join(pasta, f'extrato_{cnpj}.json')
+    with open(nome_arquivo, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, indent=2, ensure_ascii=False)
+    return nome_arquivo
 
-    # Dados para solicitação do token
+def _consultar_cnpj(sessao, access_token, fundo, data_posicao_db, agendador, falhas=None):
+    '''
+    Consulta o demonstrativo de caixa de um único fundo e retorna o JSON da
+    resposta, ou None (registrando o motivo em `falhas`) se não houver resposta.
+    '''
+    cnpj = fundo['cnpj_formatado']
     payload = {
-        'token': token,
-        'login': login
+        'query': QUERY_DEMONSTRATIVO,
+        'variables': {
+            'data': str(data_posicao_db),
+            'cnpjFundo': str(cnpj)
         }
-    
-    headers = {
-        'Content-Type': 'application/json'
+    }
+
+    try:
+        response = agendador.post(sessao, URL_GRAPHQL, descricao=cnpj, headers=HEADERS_JSON, token=access_token,
+                                  json=payload, timeout=20)
+        if response.status_code == 200:
+            return response.json()
+        print(f'Erro ao consultar {cnpj}: {response.status_code} - {response.text}')
+        motivo = f'status {response.status_code}'
+    except requests.Timeout:
+        print(f'Não foi possível buscar demonstrativo de caixa para o CNPJ {cnpj} nessa data {data_posicao_db}.')
+        motivo = 'timeout'
+    except requests.RequestException as e:
+        print(f'Erro de comunicação ao consultar {cnpj}: {e}')
+        motivo = f'erro de comunicação: {e}'
+    except ValueError:
+        print(f'Resposta inválida ao consultar {cnpj}.')
+        motivo = 'resposta inválida'
+    if falhas is not None:
+        falhas.registrar(fundo['cnpj'], data_posicao_db, motivo)
+    return None
+
+def separar_resposta_lote(resposta, quantidade):
+    '''
+    Divide a resposta de uma query montada por montar_query_lote em uma
+    resposta por alias, no mesmo formato da consulta individual.
+
+    Erros com `path` são atribuídos apenas ao alias correspondente; erros sem
+    `path` (ex.: falha de validação da query) valem para todos os aliases.
+    Um alias ausente ou nulo sem erro próprio (inclusive com `data` nulo) não
+    é uma resposta válida e vem como None, para ser consultado individualmente.
+    '''
+    dados = resposta.get('data') or {}
+    erros_por_alias = {f'f{i}': [] for i in range(quantidade)}
+    for erro in resposta.get('errors') or []:
+        caminho = erro.get('path') or []
+        if caminho and caminho[0] in erros_por_alias:
+            erros_por_alias[caminho[0]].append(erro)
+        else:
+            for erros in erros_por_alias.values():
+                erros.append(erro)
+
+    respostas = []
+    for i in range(quantidade):
+        alias = f'f{i}'
+        if dados.get(alias) is None and not erros_por_alias[alias]:
+            respostas.append(None)
+            continue
+        separada = {'data': {'getDemonstrativoCaixa': dados.get(alias)}}
+        if erros_por_alias[alias]:
+            separada['errors'] = erros_por_alias[alias]
+        respostas.append(separada)
+    return respostas
+
+def _consultar_lote(sessao, access_token, fundos, data_posicao_db, agendador, falhas=None):
+    '''
+    Consulta o demonstrativo de vários fundos em uma única requisição (aliases).
+    Se a requisição do lote falhar como um todo, cada fundo é consultado
+    individualmente; o mesmo vale para os fundos sem resposta no lote.
+
+    Retorno:
+        list: Tuplas (fundo, dados), com dados None para consultas sem resposta.
+    '''
+    if len(fundos) == 1:
+        return [(fundos[0], _consultar_cnpj(sessao, access_token, fundos[0], data_posicao_db, agendador, falhas))]
+
+    variaveis = {}
+    for i, fundo in enumerate(fundos):
+        variaveis[f'cnpjFundo{i}'] = fundo['cnpj_formatado']
+        variaveis[f'data{i}'] = str(data_posicao_db)
+    payload = {'query': montar_query_lote(len(fundos)), 'variables': variaveis}
+
+    try:
+        response = agendador.post(sessao, URL_GRAPHQL, descricao=f'Lote de {len(fundos)} CNPJs',
+                                  headers=HEADERS_JSON, token=access_token, json=payload, timeout=20 + 5 * len(fundos))
+        if response.status_code == 200:
+            separadas = separar_resposta_lote(response.json(), len(fundos))
+            incompletos = sum(1 for dados in separadas if dados is None)
+            if incompletos:
+                print(f'Lote de {len(fundos)} CNPJs sem resposta para {incompletos} CNPJ(s); consultando-os individualmente.')
+            return [(fundo, dados if dados is not None
+                     else _consultar_cnpj(sessao, access_token, fundo, data_posicao_db, agendador, falhas))
+                    for fundo, dados in zip(fundos, separadas)]
+        print(f'Erro ao consultar lote de {len(fundos)} CNPJs: {response.status_code} - {response.text}')
+    except requests.RequestException as e:
+        print(f'Erro de comunicação ao consultar lote de {len(fundos)} CNPJs: {e}')
+    except ValueError:
+        print(f'Resposta inválida ao consultar lote de {len(fundos)} CNPJs.')
+
+    print('Consultando os CNPJs do lote individualmente.')
+    return [(fundo, _consultar_cnpj(sessao, access_token, fundo, data_posicao_db, agendador, falhas)) for fundo in fundos]
+
+def iterar_extratos(access_token, fundos, data_posicao_db, max_workers=8, sessao=None, pasta_arquivo=None, cache=None,
+                    fundos_por_requisicao=1, pre_carregados=None, agendador=None, falhas=None, arquivo=None):
+    '''
+    Consulta os extratos financeiros de uma lista de CNPJs na API da Vortx e
+    entrega cada resposta em memória, à medida que as consultas terminam.
+
+    As consultas são feitas em paralelo, com no máximo `max_workers` requisições
+    em andamento, reutilizando uma única sessão HTTP (keep-alive) para todos os CNPJs.
+    Falhas transitórias (timeout, 5xx, 429) são refeitas pelo `agendador`.
+
+    Entrada:
+        access_token (str | GerenciadorToken): O token de acesso para autenticação na API.
+                                               Com um GerenciadorToken, o token é renovado
+                                               antes de expirar e após um 401.
+        fundos (list): Registros de fundo com as chaves 'cnpj' (somente dígitos)
+                       e 'cnpj_formatado' (00.000.000/0000-00).
+        data_posicao_db (str): Data de posição no formato aaaa-mm-dd.
+        max_workers (int): Quantidade máxima de requisições simultâneas.
+                           Com 1, os CNPJs são consultados em série.
+        sessao (requests.Session): Sessão a reutilizar. Se omitida, uma nova é
+                                   criada e encerrada ao final da chamada.
+        pasta_arquivo (str): Se informada, cada resposta também é gravada em
+                             disco nessa pasta, como JSON indentado (depuração).
+        cache (CacheRespostas): Cache local consultado antes da API e
+                                alimentado com as respostas sem erros.
+        fundos_por_requisicao (int): Quantidade de fundos agrupados em uma
+                                     mesma requisição GraphQL, via aliases.
+        pre_carregados (dict): Respostas já obtidas para esta data, por CNPJ
+                               (ver obter_extratos_periodo); esses fundos não
+                               são consultados novamente.
+        agendador (AgendadorRequisicoes): Controla novas tentativas e, se tiver
+                                          um LimiteAdaptativo, a concorrência
+                                          efetiva. Se omitido, apenas refaz as
+                                          requisições com falha transitória.
+        falhas (RegistroFalhas): Recebe os pares (CNPJ, data) sem extrato
+                                 (sem resposta ou com `errors`).
+        arquivo (ArquivoExtratos): Arquivo permanente que recebe as respostas
+                                   sem erros; respostas do cache só são
+                                   gravadas se ainda não estiverem arquivadas.
+                                   Falhas ao arquivar não interrompem a busca.
+
+    Retorno:
+        Gerador de tuplas (cnpj, dados), com o CNPJ sem pontuação e o JSON da resposta.
+    '''
+    def entregar(fundo, dados, origem='API'):
+        cnpj = fundo['cnpj']
+        if falhas is not None:
+            if dados.get('errors'):
+                falhas.registrar(cnpj, data_posicao_db, dados['errors'][0].get('message', dados['errors'][0]))
+            else:
+                falhas.remover(cnpj, data_posicao_db)
+        if cache is not None and origem in ('API', 'período') and not dados.get('errors'):
+            cache.salvar(cnpj, data_posicao_db, HASH_QUERY_DEMONSTRATIVO, dados)
+        if arquivo is not None and not dados.get('errors') and (origem != 'cache' or not arquivo.contem(cnpj, data_posicao_db)):
+            arquivo.gravar(cnpj, data_posicao_db, dados)
+        if pasta_arquivo:
+            salvar_extrato_json(pasta_arquivo, cnpj, dados)
+            print(f'Extrato salvo para {fundo["cnpj_formatado"]}')
+        else:
+            print(f'Extrato obtido para {fundo["cnpj_formatado"]} ({origem})')
+        return cnpj, dados
+
+    # Respostas já obtidas por período ou disponíveis no cache local não são consultadas na API
+    pre_carregados = pre_carregados or {}
+    pendentes = []
+    for fundo in fundos:
+        if fundo['cnpj'] in pre_carregados:
+            yield entregar(fundo, pre_carregados[fundo['cnpj']], origem='período')
+            continue
+        dados = cache.obter(fundo['cnpj'], data_posicao_db, HASH_QUERY_DEMONSTRATIVO) if cache is not None else None
+        if dados is not None:
+            yield entregar(fundo, dados, origem='cache')
+        else:
+            pendentes.append(fundo)
+
+    if not pendentes:
+        return
+
+    max_workers = max(1, int(max_workers or 1))
+    sessao_propria = sessao is None
+    if sessao_propria:
+        sessao = criar_sessao(max_workers)
+    agendador = agendador or AgendadorRequisicoes()
+
+    tamanho_grupo = max(1, int(fundos_por_requisicao or 1))
+    grupos = [pendentes[i:i + tamanho_grupo] for i in range(0, len(pendentes), tamanho_grupo)]
+
+    try:
+        if max_workers == 1:
+            resultados = (_consultar_lote(sessao, access_token, grupo, data_posicao_db, agendador, falhas) for grupo in grupos)
+            for resultado in resultados:
+                for fundo, dados in resultado:
+                    if dados is not None:
+                        yield entregar(fundo, dados)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futuros = [
+                    executor.submit(_consultar_lote, sessao, access_token, grupo, data_posicao_db, agendador, falhas)
+                    for grupo in grupos
+                ]
+                for futuro in as_completed(futuros):
+                    for fundo, dados in futuro.result():
+                        if dados is not None:
+                            yield entregar(fundo, dados)
+    finally:
+        if sessao_propria:
+            sessao.close()
+
+QUERY_DEMONSTRATIVO_PERIODO = f'''
+    query GetDemonstrativoCaixaPeriodo($cnpjFundo: String!, $dataInicio: Date!, $dataFim: Date!) {{
+        getDemonstrativoCaixa(cnpjFundo: $cnpjFundo, dataInicio: $dataInicio, dataFim: $dataFim) {{{CAMPOS_DEMONSTRATIVO}        }}
+    }}
+'''
+
+def dividir_por_data(dados, datas):
+    '''
+    Divide a resposta de uma consulta por período em uma resposta por data,
+    no mesmo formato da consulta diária, separando as entradas pelo campo `data`.
+
+    Só são geradas as datas de `datas` cobertas pelo intervalo dataInicio/dataFim
+    informado na resposta; datas sem entradas geram um demonstrativo vazio.
+
+    Retorno:
+        dict: data (aaaa-mm-dd) -> resposta no formato diário.
+    '''
+    demonstrativo = dados['data']['getDemonstrativoCaixa'][0]
+    inicio = str(demonstrativo.get('dataInicio') or '')[:10]
+    fim = str(demonstrativo.get('dataFim') or '')[:10]
+
+    entradas_por_data = {}
+    for entrada in demonstrativo.get('entradas') or []:
+        entradas_por_data.setdefault(str(entrada.get('data'))[:10], []).append(entrada)
+
+    respostas = {}
+    for data in datas:
+        if not inicio or not fim or not inicio <= data <= fim:
+            continue
+        diario = {campo: valor for campo, valor in demonstrativo.items() if campo != 'entradas'}
+        diario.update({'dataInicio': data, 'dataFim': data, 'entradas': entradas_por_data.get(data, [])})
+        respostas[data] = {'data': {'getDemonstrativoCaixa': [diario]}}
+    return respostas
+
+def _consultar_periodo(sessao, access_token, fundo, datas, agendador):
+    '''
+    Consulta o demonstrativo de um fundo para o intervalo entre a menor e a
+    maior das `datas` e o divide por data. Retorna {} se a API não atender o período.
+    '''
+    payload = {
+        'query': QUERY_DEMONSTRATIVO_PERIODO,
+        'variables': {
+            'cnpjFundo': fundo['cnpj_formatado'],
+            'dataInicio': min(datas),
+            'dataFim': max(datas)
         }
-    
-    # Faz a solicitação POST para obter o token
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        print(f'Token obtido com sucesso!')
-        return response.json().get('token')
-    else:
-        print(f'Erro ao autenticar: {response.status_code}, {response.text}')
-        return None
-    
-    
-    
-def obter_extrato(access_token, caminho_arquivo, cnpjs_convencionais, data_posicao_db):
+    }
+    cnpj = fundo['cnpj_formatado']
+
+    try:
+        response = agendador.post(sessao, URL_GRAPHQL, descricao=f'Período de {cnpj}',
+                                  headers=HEADERS_JSON, token=access_token, json=payload, timeout=60)
+        if response.status_code != 200:
+            print(f'Consulta por período indisponível para {cnpj}: {response.status_code} - {response.text}')
+            return {}
+        dados = response.json()
+        if dados.get('errors'):
+            print(f'Consulta por período indisponível para {cnpj}: {dados["errors"]}')
+            return {}
+        return dividir_por_data(dados, datas)
+    except requests.RequestException as e:
+        print(f'Erro de comunicação ao consultar período de {cnpj}: {e}')
+    except (KeyError, IndexError, TypeError, ValueError):
+        print(f'Consulta por período de {cnpj}: estrutura inesperada.')
+    return {}
+
+def agrupar_em_janelas(datas, dias_por_periodo):
+    ''' Agrupa as datas (aaaa-mm-dd), em ordem, em janelas de até `dias_por_periodo` dias corridos. '''
+    janelas = []
+    for data in sorted(datas):
+        if janelas and (date.fromisoformat(data) - date.fromisoformat(janelas[-1][0])).days < dias_por_periodo:
+            janelas[-1].append(data)
+        else:
+            janelas.append([data])
+    return janelas
+
+def obter_extratos_periodo(access_token, fundos, datas, max_workers=8, sessao=None, dias_por_periodo=31,
+                           agendador=None, filtro=None):
+    '''
+    Obtém os extratos de vários dias com uma consulta por fundo e janela
+    (dataInicio/dataFim), em vez de uma consulta por fundo e dia.
+
+    Entrada:
+        datas (list): Datas de posição válidas (aaaa-mm-dd); só elas são mantidas.
+        dias_por_periodo (int): Tamanho máximo, em dias corridos, de cada janela.
+        agendador (AgendadorRequisicoes): Ver iterar_extratos.
+        filtro (callable): Recebe (fundo, janela) e retorna as datas da janela
+                           a consultar para o fundo (ex.: só as do shard ou as
+                           que falharam); sem datas, a janela não é consultada.
+
+    Retorno:
+        dict: data -> {cnpj: resposta no formato diário}, para passar como
+              `pre_carregados` de iterar_extratos. Fundos e datas ausentes
+              (janela não atendida pela API) devem ser consultados dia a dia.
+    '''
+    janelas = agrupar_em_janelas(datas, dias_por_periodo)
+
+    max_workers = max(1, int(max_workers or 1))
+    sessao_propria = sessao is None
+    if sessao_propria:
+        sessao = criar_sessao(max_workers)
+    agendador = agendador or AgendadorRequisicoes()
+
+    pre_carregados = {data: {} for data in datas}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            consultas = [(fundo, filtro(fundo, janela) if filtro else janela) for fundo in fundos for janela in janelas]
+            futuros = {
+                executor.submit(_consultar_periodo, sessao, access_token, fundo, datas_fundo, agendador): (fundo, datas_fundo)
+                for fundo, datas_fundo in consultas
+                if datas_fundo
+            }
+            for futuro in as_completed(futuros):
+                fundo, janela = futuros[futuro]
+                respostas = futuro.result()
+                for data, dados in respostas.items():
+                    pre_carregados[data][fundo['cnpj']] = dados
+                print(f'Extrato de {fundo["cnpj_formatado"]} obtido por período para {len(respostas)} de {len(janela)} data(s).')
+    finally:
+        if sessao_propria:
+            sessao.close()
+    return pre_carregados
+
+class ExtratosPorPeriodo:
+    '''
+    Consultas por período (ver obter_extratos_periodo) feitas sob demanda,
+    uma janela de cada vez, para a etapa de busca do pipeline.
+
+    A primeira data pedida de uma janela consulta a janela inteira; as demais
+    datas da janela são entregues da memória e cada resposta é descartada
+    assim que entregue. Assim, só uma janela fica em memória por vez e a
+    consulta da janela seguinte se sobrepõe ao tratamento e à carga das
+    datas anteriores.
+
+    Entrada:
+        filtro (callable): Ver obter_extratos_periodo.
+    '''
+
+    def __init__(self, access_token, fundos, datas, max_workers=8, sessao=None, dias_por_periodo=31,
+                 agendador=None, filtro=None):
+        self.access_token = access_token
+        self.fundos = fundos
+        self.max_workers = max_workers
+        self.sessao = sessao
+        self.agendador = agendador
+        self.filtro = filtro
+        self.dias_por_periodo = dias_por_periodo
+        self.janelas = agrupar_em_janelas(datas, dias_por_periodo)
+        self._janela_da_data = {data: indice for indice, janela in enumerate(self.janelas) for data in janela}
+        self._consultadas = set()
+        self._respostas = {}
+        self._trava = threading.Lock()
+
+    def obter(self, data):
+        '''
+        Retorna as respostas da data por CNPJ (consultando a janela, se
+        preciso) e as descarta. Retorna None para datas fora das janelas.
+        '''
+        indice = self._janela_da_data.get(data)
+        if indice is None:
+            return None
+        with self._trava:
+            if indice not in self._consultadas:
+                self._consultadas.add(indice)
+                self._respostas.update(obter_extratos_periodo(
+                    self.access_token, self.fundos, self.janelas[indice], max_workers=self.max_workers,
+                    sessao=self.sessao, dias_por_periodo=self.dias_por_periodo,
+                    agendador=self.agendador, filtro=self.filtro,
+                ))
+            return self._respostas.pop(data, None)
+
+def obter_extrato(access_token, caminho_arquivo, cnpjs_convencionais, data_posicao_db, max_workers=8, sessao=None,
+                  agendador=None, falhas=None, arquivo=None):
     '''
     Obtém extratos financeiros para uma lista de CNPJs usando a API da Vortx
-    e salva cada extrato em um arquivo JSON separado.
+    e salva cada extrato em um arquivo JSON separado ou, com `arquivo`, no
+    arquivo permanente compactado (ver ArquivoExtratos).
 
     Entrada:
-        access_token (str): O token de acesso para autenticação na API.
+        access_token (str | GerenciadorToken): O token de acesso para autenticação na API.
         caminho_arquivo (str): O caminho base para salvar os arquivos JSON.
                                O nome do arquivo será gerado com base no CNPJ.
+        max_workers (int): Quantidade máxima de requisições simultâneas.
+        sessao (requests.Session): Sessão a reutilizar (ver iterar_extratos).
+        agendador, falhas, arquivo: Ver iterar_extratos.
     '''
+    pasta = None if arquivo is not None else os.path.dirname(caminho_arquivo) or '.'
+    fundos = [{'cnpj': somente_digitos(cnpj), 'cnpj_formatado': cnpj} for cnpj in cnpjs_convencionais]
+    for _ in iterar_extratos(access_token, fundos, data_posicao_db,
+                             max_workers=max_workers, sessao=sessao, pasta_arquivo=pasta,
+                             agendador=agendador, falhas=falhas, arquivo=arquivo):
+        pass
 
-    url = "https://apis.vortx.com.br/frontier/graphql"
+def _contar_bytes(blocos):
+    '''Repassa os blocos da resposta, somando seu tamanho às métricas de bytes recebidos.'''
+    for bloco in blocos:
+        METRICAS.incrementar('http_bytes_recebidos', len(bloco))
+        yield bloco
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {access_token}'
-    }
+def iterar_lotes_extrato(sessao, access_token, fundo, data_posicao_db, tamanho_lote=TAMANHO_LOTE_PADRAO, campos=None,
+                        agendador=None, falhas=None):
+    '''
+    Consulta o demonstrativo de caixa de um fundo lendo a resposta em fluxo,
+    sem materializar o documento inteiro, e entrega as entradas em DataFrames
+    de até `tamanho_lote` linhas (ver leitura_streaming.iterar_lotes_entradas).
 
-    for cnpj in cnpjs_convencionais:
-        payload = {
-            'query': '''
-                query GetDemonstrativoCaixa($cnpjFundo: String!, $data: Date!) {
-                    getDemonstrativoCaixa(cnpjFundo: $cnpjFundo, data: $data) {
-                        entradas {
-                            titulo
-                            tituloCp
-                            data
-                            historico
-                            tipo
-                            debito
-                            credito
-                            saldo
-                            isDetalheTotal
-                        }
-                        carteira
-                        nomeDoFundo
-                        dataInicio
-                        dataFim
-                    }
-                }
-            ''',
-            'variables': {
-                'data': str(data_posicao_db),
-                'cnpjFundo': str(cnpj)
-            }
+    Entrada:
+        fundo (dict): Registro de fundo com 'cnpj' e 'cnpj_formatado'.
+        campos (dict): Recebe os campos do demonstrativo (nomeDoFundo etc.).
+                       Como a query os seleciona antes de `entradas`, já
+                       estão preenchidos quando o primeiro lote é entregue.
+        agendador (AgendadorRequisicoes): Ver iterar_extratos. Só a abertura
+                                          da requisição é refeita; falhas
+                                          durante a leitura não.
+        falhas (RegistroFalhas): Recebe o par (CNPJ, data) se a API não
+                                 responder com status 200.
+
+    Retorno:
+        Gerador de DataFrames. Se a API responder com status diferente de 200,
+        a mensagem é exibida e nada é entregue. Falhas durante a leitura
+        (comunicação, JSON truncado ou `errors` na resposta) são lançadas para
+        que o chamador descarte os lotes já recebidos.
+    '''
+    payload = {
+        'query': QUERY_DEMONSTRATIVO,
+        'variables': {
+            'data': str(data_posicao_db),
+            'cnpjFundo': fundo['cnpj_formatado']
         }
+    }
 
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=20)
-            if response.status_code == 200:
-                nome_arquivo = os.path.join(
-                    os.path.dirname(caminho_arquivo),
-                    f'extrato_{cnpj.replace("/", "").replace(".", "").replace("-", "")}.json'
-                )
-                with open(nome_arquivo, 'w', encoding='utf-8') as arquivo:
-                    json.dump(response.json(), arquivo, indent=2, ensure_ascii=False)
-                print(f'Extrato salvo para {cnpj}')
-            else:
-                print(f'Erro ao consultar {cnpj}: {response.status_code} - {response.text}')
-        except requests.Timeout:
-            print(f'Não foi possível buscar demonstrativo de caixa para o CNPJ {cnpj} nessa data {data_posicao_db}.')
-            continue
-        except requests.RequestException as e:
-            print(f'Erro de comunicação ao consultar {cnpj}: {e}')
-            continue
+    agendador = agendador or AgendadorRequisicoes()
+    with agendador.post(sessao, URL_GRAPHQL, descricao=fundo['cnpj_formatado'],
+                        headers=HEADERS_JSON, token=access_token, json=payload, timeout=20, stream=True) as response:
+        if response.status_code != 200:
+            print(f'Erro ao consultar {fundo["cnpj_formatado"]}: {response.status_code} - {response.text}')
+            if falhas is not None:
+                falhas.registrar(fundo['cnpj'], data_posicao_db, f'status {response.status_code}')
+            return
+        eventos = iterar_eventos_demonstrativo(_contar_bytes(response.iter_content(chunk_size=TAMANHO_BLOCO_HTTP)))
+        yield from iterar_lotes_entradas(eventos, fundo['cnpj'], tamanho_lote, campos)
 
 def limpar_pasta(diretorio):
     '''
-    Limpa o diretório especificado, removendo todos os arquivos dentro dele.
+    Limpa o diretório especificado, removendo todos os arquivos e subpastas dentro dele.
     Se o diretório não existir, ele será criado.
     '''
     if os.path.isdir(diretorio):
         for arquivo in glob.glob(os.path.join(diretorio, '*')):
-            os.remove(arquivo)
+            if os.path.isdir(arquivo):
+                shutil.rmtree(arquivo)
+            else:
+                os.remove(arquivo)
     else:
         os.makedirs(diretorio, exist_ok=True)
\ No newline at end of file
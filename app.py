@@ -1,28 +1,630 @@
 import time
 import os
 import argparse
-from datetime import datetime
+import signal
+import threading
+from collections import Counter
+from functools import partial
+from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
-from Util.db_integracao import conectar_banco, obter_cnpj_fundo, deletar_dados_existentes, inserir_dados
-from Util.service import obter_token, obter_extrato, limpar_pasta
-from Util.processa_relatorios import normalize_df, tratar_colunas, mapear_ids_conta
+from Util.db_integracao import PoolConexoes, sincronizar_particoes, substituir_particoes_em_lotes, ESTRATEGIAS_CARGA
+from Util.service import iterar_extratos, ExtratosPorPeriodo, HASH_QUERY_DEMONSTRATIVO, iterar_lotes_extrato, limpar_pasta, criar_sessao
+from Util.processa_relatorios import normalize_registros, tratar_colunas, mapear_ids_conta
+from Util.pipeline import executar_pipeline
+from Util.cache_respostas import CacheRespostas
+from Util.arquivo_extratos import ArquivoExtratos
+from Util.cadastro_fundos import carregar_fundos, mapa_ids_cota
+from Util.autenticacao import GerenciadorToken
+from Util.controle_taxa import LimiteAdaptativo, AgendadorRequisicoes, RegistroFalhas, ler_relatorio_falhas, calcular_espera
+from Util.leitura_streaming import TAMANHO_LOTE_PADRAO
+from Util.metricas import METRICAS, ETAPAS, MODOS_PERFIL
+from Util.distribuicao import DistribuidorTrabalho, ler_shard, DURACAO_RESERVA_PADRAO
 from Util.auxiliar import preencher_args_com_input, gerar_datas, filtrar_por_datas_existentes, normalizar_date
 
 DAYS_AGO_DEFAULT = 1
+MAX_WORKERS_DEFAULT = 8
+FILA_DEFAULT = 2
+CACHE_MAX_MB_DEFAULT = 512
+CACHE_DIAS_RECENTES_DEFAULT = 1
+ESTRATEGIA_CARGA_DEFAULT = 'fast'
+DIAS_POR_PERIODO_DEFAULT = 31
+MAX_TENTATIVAS_DEFAULT = 4
+CONCORRENCIA_INICIAL_DEFAULT = 4
+LATENCIA_ALVO_DEFAULT = 5.0
+INTERVALO_SERVICO_DEFAULT = 300
+JANELA_SERVICO_DEFAULT = 3
+CONEXOES_DEFAULT = 4
+CARGAS_PARALELAS_DEFAULT = 1
+PASTA_ARQUIVO_DEFAULT = './Arquivo'
 
-def main():
-    tempo_inicial = time.time()
+def buscar_extratos_data(access_token, pasta_saida, fundos, max_workers, fundos_por_requisicao, sessao, cache, periodo,
+                         agendador, falhas, arquivo, pendentes, distribuidor, d):
+    ''' Busca os extratos de todos os CNPJs (ou dos reservados, na execução distribuída) para a data e os mantém em memória. '''
+    data_posicao_str = d.strftime('%Y-%m-%d')
+    print(f'\nProcessando extrato para {data_posicao_str}')
+    if pendentes is not None:
+        # Reprocessamento: apenas os CNPJs que falharam nessa data
+        fundos = [fundo for fundo in fundos if fundo['cnpj'] in pendentes.get(data_posicao_str, ())]
+    if distribuidor is not None:
+        fundos = distribuidor.reservar(fundos, data_posicao_str)
+    pasta_data = None
+    if pasta_saida:
+        # Cópia opcional em disco dos JSONs, uma subpasta por data
+        pasta_data = os.path.join(pasta_saida, data_posicao_str)
+        os.makedirs(pasta_data, exist_ok=True)
+    with METRICAS.medir('busca'):
+        registros = list(iterar_extratos(access_token, fundos, data_posicao_str,
+                                         max_workers=max_workers, sessao=sessao, pasta_arquivo=pasta_data,
+                                         cache=cache, fundos_por_requisicao=fundos_por_requisicao,
+                                         pre_carregados=periodo.obter(data_posicao_str) if periodo else None,
+                                         agendador=agendador, falhas=falhas, arquivo=arquivo))
+    if distribuidor is not None:
+        # Unidades sem extrato voltam a ficar disponíveis para outra tentativa
+        distribuidor.registrar_obtidos(data_posicao_str, [cnpj for cnpj, dados in registros if not dados.get('errors')])
+    return data_posicao_str, registros
+
+def ler_extratos_arquivados_data(arquivo, fundos, pendentes, distribuidor, d):
+    ''' Lê do arquivo local os extratos da data, sem consultar a API (--replay); substitui buscar_extratos_data. '''
+    data_posicao_str = d.strftime('%Y-%m-%d')
+    print(f'\nReprocessando extratos arquivados de {data_posicao_str}')
+    if pendentes is not None:
+        fundos = [fundo for fundo in fundos if fundo['cnpj'] in pendentes.get(data_posicao_str, ())]
+    if distribuidor is not None:
+        fundos = distribuidor.reservar(fundos, data_posicao_str)
+    with METRICAS.medir('busca'):
+        registros = list(arquivo.iterar_data(data_posicao_str, [fundo['cnpj'] for fundo in fundos]))
+    if len(registros) < len(fundos):
+        print(f'{len(fundos) - len(registros)} fundo(s) sem extrato arquivado em {data_posicao_str}.')
+    if distribuidor is not None:
+        distribuidor.registrar_obtidos(data_posicao_str, [cnpj for cnpj, _ in registros])
+    return data_posicao_str, registros
+
+def transformar_extratos_data(conexao, cache_ids_cota, distribuidor, item):
+    ''' Consolida os extratos da data e aplica o tratamento de colunas. '''
+    data_posicao_str, registros = item
+    with METRICAS.medir('normalizacao'):
+        df, nomes_fundos = normalize_registros(registros)
+    if df.empty or 'ID_CNPJ_Fundo' not in df.columns:
+        print(f'DataFrame está vazio para {data_posicao_str}. Nenhum dado foi inserido.')
+        if distribuidor is not None:
+            distribuidor.concluir_sem_carga(data_posicao_str)
+        return None
+    for cnpj, linhas in df['ID_CNPJ_Fundo'].value_counts(sort=False).items():
+        METRICAS.registrar_linhas_fundo(cnpj, linhas)
+
+    with METRICAS.medir('mapeamento_ids'):
+        mapa_ids_cota = mapear_ids_conta(conexao, nomes_fundos, cache_ids_cota)
+    with METRICAS.medir('tratamento'):
+        return tratar_colunas(df, mapa_ids_cota)
+
+def carregar_extratos_data(conexao, nome_tabela, estrategia_carga, forcar_carga, resumo_carga, datas_com_erro, trava_resumo,
+                           distribuidor, df):
+    ''' Substitui, em uma única transação, os dados de cada CNPJ na data que mudaram desde a última carga. '''
+    data_posicao_str = str(df['Data_Posicao'].iloc[0])
+    reserva = distribuidor.reserva(data_posicao_str) if distribuidor is not None else None
+    with METRICAS.medir('carga'):
+        resumo = sincronizar_particoes(conexao, nome_tabela, df, estrategia=estrategia_carga, forcar=forcar_carga,
+                                       reserva=reserva)
+    if distribuidor is not None:
+        if resumo is None:
+            distribuidor.liberar(data_posicao_str)
+        else:
+            distribuidor.finalizar(data_posicao_str)
+    with trava_resumo:
+        if resumo is None:
+            datas_com_erro.update(df['Data_Posicao'].astype(str).unique())
+        else:
+            resumo_carga.update(resumo)
+
+def processar_data_streaming(conexao, sessao, access_token, fundos, cache_ids_cota, nome_tabela,
+                             estrategia_carga, tamanho_lote, agendador, falhas, pendentes, distribuidor, d):
+    '''
+    Busca, trata e carrega cada fundo da data em lotes, sem materializar o extrato inteiro.
+    Retorna False se o extrato de algum fundo não foi obtido ou se sua carga falhou.
+    '''
+    data_posicao_str = d.strftime('%Y-%m-%d')
+    print(f'\nProcessando extrato para {data_posicao_str} (streaming)')
+    if pendentes is not None:
+        fundos = [fundo for fundo in fundos if fundo['cnpj'] in pendentes.get(data_posicao_str, ())]
+    if distribuidor is not None:
+        fundos = distribuidor.reservar(fundos, data_posicao_str)
+    sucesso = True
+    for fundo in fundos:
+        campos = {}
+        lotes = iterar_lotes_extrato(sessao, access_token, fundo, data_posicao_str, tamanho_lote, campos,
+                                     agendador=agendador, falhas=falhas)
+
+        def lotes_tratados(lotes=lotes, campos=campos, fundo=fundo):
+            linhas = 0
+            for lote in lotes:
+                linhas += len(lote)
+                nome_fundo = campos.get('nomeDoFundo', 'Fundo desconhecido')
+                with METRICAS.medir('mapeamento_ids'):
+                    mapa_ids_cota = mapear_ids_conta(conexao, {fundo['cnpj']: nome_fundo}, cache_ids_cota)
+                with METRICAS.medir('tratamento'):
+                    tratado = tratar_colunas(lote, mapa_ids_cota)
+                yield tratado
+            METRICAS.registrar_linhas_fundo(fundo['cnpj'], linhas)
+            if distribuidor is not None and falhas.contem(fundo['cnpj'], data_posicao_str):
+                # Sem extrato, a unidade não pode ser dada como concluída: desfaz a transação
+                raise RuntimeError(f'extrato de {fundo["cnpj_formatado"]} não obtido')
+
+        reserva = distribuidor.reserva(data_posicao_str, [fundo['cnpj']]) if distribuidor is not None else None
+        # No modo streaming, busca e carga de um fundo se intercalam; o tempo fica na etapa 'carga'
+        with METRICAS.medir('carga'):
+            resultado = substituir_particoes_em_lotes(conexao, nome_tabela, lotes_tratados(), estrategia=estrategia_carga,
+                                                      reserva=reserva)
+        if resultado is None:
+            if not falhas.contem(fundo['cnpj'], data_posicao_str):
+                falhas.registrar(fundo['cnpj'], data_posicao_str, 'falha na leitura ou carga em lotes')
+            sucesso = False
+        elif falhas.contem(fundo['cnpj'], data_posicao_str):
+            # Resposta diferente de 200: nada foi lido nem carregado para o fundo
+            sucesso = False
+        if distribuidor is not None:
+            if resultado is None:
+                distribuidor.liberar(data_posicao_str, [fundo['cnpj']])
+            else:
+                distribuidor.finalizar(data_posicao_str, [fundo['cnpj']])
+    return sucesso
+
+def conexoes_necessarias(args):
+    '''
+    Conexões com o banco em uso ao mesmo tempo, no pior caso: uma por carga
+    em paralelo, uma para os IDs de cota na transformação, uma para as
+    reservas na busca e, na execução distribuída, uma para renová-las.
+    '''
+    return args.cargas_paralelas + 2 + (1 if args.shard else 0)
+
+class ContextoExecucao:
+    '''
+    Recursos reaproveitados entre processamentos: pool de conexões com o banco,
+    sessão HTTP, token, cache e arquivo de respostas e cadastro de fundos. No
+    modo --servico, um único contexto atende todos os ciclos.
+    '''
+
+    def __init__(self, args, credenciais_banco, access_token, estrategia_carga):
+        self.args = args
+        self.credenciais_banco = credenciais_banco
+        self.access_token = access_token
+        self.estrategia_carga = estrategia_carga
+        self.nome_tabela = 'EXTRATO.Movimento_Conta'
+        self.conexao = None
+        self.sessao = None
+        self.agendador = None
+        self.cache = None
+        self.arquivo = None
+        self.fundos = None
+        self.cache_ids_cota = {}
+        self.distribuidor = None
+        self.pasta_saida = './Temp_file/' if args.salvar_json else None
+
+    def conectar(self):
+        ''' Cria o pool na primeira chamada e garante que o banco responde, refazendo conexões que caíram. '''
+        if self.conexao is None:
+            self.conexao = PoolConexoes(*self.credenciais_banco, tamanho=self.args.conexoes)
+        return self.conexao.verificar()
+
+    def preparar(self, forcar_fundos=False):
+        '''
+        Valida o token e carrega o cadastro de fundos (revalidado a cada chamada
+        por uma consulta de assinatura). Sessão HTTP, agendador, cache e
+        arquivo de respostas são criados apenas na primeira chamada. Com
+        --replay, a API não é usada: nem o token nem a sessão são necessários.
+
+        Retorno:
+            bool: False se o token ou o cadastro de fundos não puderem ser obtidos.
+        '''
+        args = self.args
+        if not args.replay and not self.access_token.obter():
+            print('Falha ao obter token de acesso.')
+            return False
+
+        fundos = carregar_fundos(self.conexao, forcar=forcar_fundos)
+        if not fundos:
+            print('Nenhum fundo encontrado. Abortando.')
+            return False
+        self.fundos = fundos
+        # IDs de cota já conhecidos pelo cadastro de fundos, reutilizados em todas as datas.
+        # Nomes não encontrados antes são consultados de novo: podem ter sido cadastrados desde então
+        for nome in [nome for nome, id_cota in self.cache_ids_cota.items() if id_cota is None]:
+            del self.cache_ids_cota[nome]
+        self.cache_ids_cota.update(mapa_ids_cota(fundos))
+
+        if self.arquivo is None and (args.arquivar or args.replay):
+            self.arquivo = ArquivoExtratos(args.pasta_arquivo)
+        if args.replay:
+            return True
+
+        if self.sessao is None:
+            if self.pasta_saida:
+                limpar_pasta(self.pasta_saida)
+            self.sessao = criar_sessao(args.max_workers)
+            # Concorrência efetiva ajustada por AIMD, limitada pelo número de threads
+            self.agendador = AgendadorRequisicoes(
+                LimiteAdaptativo(inicial=args.concorrencia_inicial, maximo=args.max_workers,
+                                 latencia_alvo=args.latencia_alvo),
+                max_tentativas=args.max_tentativas,
+            )
+            if not args.no_cache:
+                self.cache = CacheRespostas(tamanho_maximo_mb=args.cache_max_mb,
+                                            dias_recentes=args.cache_dias_recentes,
+                                            atualizar=args.refresh)
+        return True
+
+    def distribuir(self, execucao):
+        '''
+        Ativa a execução distribuída (--shard): as unidades (data, CNPJ) passam
+        a ser reservadas na tabela de reservas antes da busca.
+        Retorna False se a tabela de reservas não puder ser preparada.
+        '''
+        if self.distribuidor is None:
+            distribuidor = DistribuidorTrabalho(self.conexao, self.nome_tabela, self.args.shard, execucao,
+                                                trabalhador=self.args.trabalhador,
+                                                duracao_reserva=self.args.duracao_reserva,
+                                                por_fundo=self.args.modo_periodo)
+            if not distribuidor.iniciar():
+                return False
+            self.distribuidor = distribuidor
+        return True
+
+    def fechar(self):
+        if self.distribuidor is not None:
+            self.distribuidor.fechar()
+        if self.sessao:
+            self.sessao.close()
+        if self.cache:
+            self.cache.fechar()
+        if self.arquivo is not None:
+            self.arquivo.fechar()
+        if self.conexao is not None:
+            self.conexao.fechar()
+        print('Conexão com banco encerrada.')
+
+def processar_datas(contexto, datas_validas, falhas, pendentes=None):
+    '''
+    Busca, trata e carrega os extratos das datas informadas.
+
+    Retorno:
+        set: Datas (aaaa-mm-dd) cuja carga no banco falhou.
+    '''
+    args = contexto.args
+    datas_com_erro = set()
+
+    if args.streaming:
+        for d in datas_validas:
+            if not processar_data_streaming(contexto.conexao, contexto.sessao, contexto.access_token, contexto.fundos,
+                                            contexto.cache_ids_cota, contexto.nome_tabela, contexto.estrategia_carga,
+                                            args.tamanho_lote, contexto.agendador, falhas, pendentes,
+                                            contexto.distribuidor, d):
+                datas_com_erro.add(d.strftime('%Y-%m-%d'))
+        return datas_com_erro
+
+    # No modo por período, cada fundo é consultado uma vez por janela de datas,
+    # sob demanda, na etapa de busca; o que a API não atender é consultado dia a dia.
+    # Ao assumir unidades de outros shards, restam poucas: a busca é diária
+    distribuidor = contexto.distribuidor
+    periodo = None
+    if (args.modo_periodo and not args.replay and len(datas_validas) > 1
+            and (distribuidor is None or distribuidor.somente_shard)):
+        def datas_do_fundo(fundo, janela):
+            '''
+            Datas da janela que cabem a este processo para o fundo (reprocessamento
+            e shard) e ainda não estão no cache local, que a busca usa diretamente.
+            '''
+            if pendentes is not None:
+                janela = [data for data in janela if fundo['cnpj'] in pendentes.get(data, ())]
+            if distribuidor is not None:
+                janela = [data for data in janela if distribuidor.candidatos([fundo], data)]
+            if contexto.cache is not None:
+                janela = [data for data in janela
+                          if not contexto.cache.contem(fundo['cnpj'], data, HASH_QUERY_DEMONSTRATIVO)]
+            return janela
+
+        periodo = ExtratosPorPeriodo(contexto.access_token, contexto.fundos,
+                                     [d.strftime('%Y-%m-%d') for d in datas_validas],
+                                     max_workers=args.max_workers, sessao=contexto.sessao,
+                                     dias_por_periodo=args.dias_por_periodo,
+                                     agendador=contexto.agendador, filtro=datas_do_fundo)
+
+    # Processamento por data em pipeline: busca -> transformação -> carga
+    resumo_carga = Counter()
+    trava_resumo = threading.Lock()
+    if args.replay:
+        # Reprocessamento local: a busca lê o arquivo de extratos em vez da API
+        busca = partial(ler_extratos_arquivados_data, contexto.arquivo, contexto.fundos, pendentes, contexto.distribuidor)
+    else:
+        busca = partial(buscar_extratos_data, contexto.access_token, contexto.pasta_saida,
+                        contexto.fundos, args.max_workers, args.fundos_por_requisicao, contexto.sessao,
+                        contexto.cache, periodo, contexto.agendador, falhas, contexto.arquivo, pendentes,
+                        contexto.distribuidor)
+    executar_pipeline(
+        datas_validas,
+        [
+            ('busca', busca),
+            ('transformacao', partial(transformar_extratos_data, contexto.conexao, contexto.cache_ids_cota,
+                                      contexto.distribuidor)),
+            ('carga', partial(carregar_extratos_data, contexto.conexao, contexto.nome_tabela, contexto.estrategia_carga,
+                              args.forcar_carga, resumo_carga, datas_com_erro, trava_resumo, contexto.distribuidor),
+             args.cargas_paralelas),
+        ],
+        tamanhos_fila=[args.fila_transformacao, args.fila_carga],
+    )
+    print(f'\nResumo da carga: {resumo_carga["ignoradas"]} partição(ões) sem alteração, '
+          f'{resumo_carga["substituidas"]} substituída(s), {resumo_carga["novas"]} nova(s); '
+          f'{resumo_carga["inseridas"]} linha(s) inserida(s).')
+    if resumo_carga['reservas_perdidas']:
+        print(f'{resumo_carga["reservas_perdidas"]} partição(ões) descartada(s) por reserva assumida por outro trabalhador.')
+    return datas_com_erro
+
+def assumir_unidades_restantes(contexto, datas_validas, falhas, pendentes=None, parar=None):
+    '''
+    Execução distribuída, após o próprio shard: processa as unidades das datas
+    que ainda não foram reservadas ou cujas reservas expiraram, de qualquer
+    shard. Enquanto outros trabalhadores mantiverem reservas válidas, aguarda
+    e tenta de novo, para assumir as de um trabalhador que tenha parado.
+
+    Retorno:
+        set: Datas (aaaa-mm-dd) cuja carga falhou.
+    '''
+    distribuidor = contexto.distribuidor
+    parar = parar or threading.Event()
+    datas_str = [d.strftime('%Y-%m-%d') for d in datas_validas]
+    datas_com_erro = set()
+    print('\nShard concluído; assumindo unidades restantes de outros shards.')
+    distribuidor.assumir_outros_shards()
+    try:
+        while not parar.is_set():
+            datas_com_erro |= processar_datas(contexto, datas_validas, falhas, pendentes)
+            espera = distribuidor.espera_pendencias(datas_str)
+            if espera is None:
+                break
+            parar.wait(espera)
+    finally:
+        distribuidor.assumir_outros_shards(False)
+    return datas_com_erro
+
+def relatar_falhas(falhas):
+    ''' Grava o relatório de pares (CNPJ, data) sem extrato, se houver. '''
+    caminho_falhas = falhas.salvar()
+    if caminho_falhas:
+        print(f'\n{len(falhas.listar())} par(es) (CNPJ, data) sem extrato. Relatório: {caminho_falhas}')
+        print(f'Para buscar apenas esses pares: --reprocessar-falhas {caminho_falhas}')
+
+def exportar_metricas(args):
+    ''' Grava o relatório JSON de métricas (e o arquivo do Prometheus, se configurado) e exibe o tempo por etapa. '''
+    try:
+        caminhos = METRICAS.exportar(caminho_prometheus=args.metricas_prometheus)
+    except OSError as e:
+        print(f'Não foi possível gravar as métricas: {e}')
+        return
+    resumo = METRICAS.resumo_etapas()
+    if resumo:
+        print(f'\nTempo por etapa: {resumo}')
+    print(f'Métricas: {", ".join(caminhos)}')
 
-    # Parser de argumentos
+def executar_uma_vez(contexto, datas_candidatas, pendentes=None):
+    ''' Processa uma única vez as datas candidatas que estiverem liberadas no banco. '''
+    datas_validas = filtrar_por_datas_existentes(contexto.conexao, datas_candidatas)
+
+    print('\nResumo das datas:')
+    print('Candidatas:', [d.strftime('%Y-%m-%d') for d in datas_candidatas])
+    print('Válidas no banco:', [d.strftime('%Y-%m-%d') for d in datas_validas])
+    print()
+
+    # Verifica se há datas válidas
+    if not datas_validas:
+        print('Nenhuma Data_Posicao válida encontrada. Abortando.')
+        return
+
+    if not contexto.preparar(forcar_fundos=contexto.args.atualizar_fundos):
+        return
+
+    falhas = RegistroFalhas()
+    try:
+        processar_datas(contexto, datas_validas, falhas, pendentes)
+        if contexto.distribuidor is not None:
+            assumir_unidades_restantes(contexto, datas_validas, falhas, pendentes)
+    finally:
+        relatar_falhas(falhas)
+
+def executar_servico(contexto):
+    '''
+    Modo residente: a cada `--intervalo-servico` segundos, consulta as datas
+    liberadas (ID_Status_Dia = 1) nos últimos `--janela-servico` dias e processa
+    as que ainda não foram processadas nesta execução, reaproveitando conexão,
+    sessão HTTP, token e caches. Datas cuja carga falhou são processadas de
+    novo no ciclo seguinte; nas que ficaram com extratos não obtidos (timeout,
+    status diferente de 200, `errors` da API), apenas esses fundos são buscados
+    de novo, enquanto a data estiver na janela. Se a conexão com o banco cair,
+    ela é refeita.
+
+    SIGINT/SIGTERM encerram o serviço ao fim do ciclo em andamento.
+    '''
+    args = contexto.args
+    parar = threading.Event()
+
+    def encerrar(sinal, _frame):
+        print(f'\nSinal {signal.Signals(sinal).name} recebido. Encerrando ao fim do ciclo atual...')
+        parar.set()
+
+    signal.signal(signal.SIGINT, encerrar)
+    signal.signal(signal.SIGTERM, encerrar)
+
+    processadas = set()
+    # Data (aaaa-mm-dd) -> CNPJs sem extrato, buscados de novo no ciclo seguinte
+    sem_extrato = {}
+    erros_seguidos = 0
+    primeiro_ciclo = True
+    print(f'Serviço iniciado: verificando novas datas a cada {args.intervalo_servico} s '
+          f'(janela de {args.janela_servico} dia(s)).')
+
+    while not parar.is_set():
+        espera = args.intervalo_servico
+        try:
+            if not contexto.conectar():
+                raise ConnectionError('não foi possível conectar ao banco')
+            if args.shard and not contexto.distribuir(args.execucao or 'servico'):
+                raise ConnectionError('não foi possível preparar a tabela de reservas')
+
+            hoje = date.today()
+            candidatas = [hoje - timedelta(days=dias) for dias in range(args.janela_servico, -1, -1)]
+            novas = [d for d in filtrar_por_datas_existentes(contexto.conexao, candidatas) if d not in processadas]
+            # Datas que saíram da janela não são mais tentadas
+            sem_extrato = {data: cnpjs for data, cnpjs in sem_extrato.items()
+                           if data in {d.strftime('%Y-%m-%d') for d in novas}}
+
+            if novas:
+                print(f'\nNovas datas liberadas: {[d.strftime("%Y-%m-%d") for d in novas]}')
+                if contexto.preparar(forcar_fundos=args.atualizar_fundos and primeiro_ciclo):
+                    primeiro_ciclo = False
+                    falhas = RegistroFalhas()
+                    pendentes = None
+                    if sem_extrato:
+                        # Datas novas (ou com carga falha) por inteiro; as demais, só os fundos sem extrato
+                        todos = {fundo['cnpj'] for fundo in contexto.fundos}
+                        pendentes = {d.strftime('%Y-%m-%d'): sem_extrato.get(d.strftime('%Y-%m-%d'), todos)
+                                     for d in novas}
+                    try:
+                        datas_com_erro = processar_datas(contexto, novas, falhas, pendentes)
+                        if contexto.distribuidor is not None:
+                            datas_com_erro |= assumir_unidades_restantes(contexto, novas, falhas, pendentes, parar=parar)
+                    finally:
+                        relatar_falhas(falhas)
+
+                    nao_obtidos = {}
+                    for falha in falhas.listar():
+                        nao_obtidos.setdefault(falha['data'], set()).add(falha['cnpj'])
+                    for d in novas:
+                        data = d.strftime('%Y-%m-%d')
+                        sem_extrato.pop(data, None)
+                        if data in datas_com_erro:
+                            continue
+                        if data in nao_obtidos:
+                            sem_extrato[data] = nao_obtidos[data]
+                        else:
+                            processadas.add(d)
+                    exportar_metricas(args)
+                    if datas_com_erro:
+                        print(f'Carga com erro para {sorted(datas_com_erro)}; nova tentativa no próximo ciclo.')
+                    if sem_extrato:
+                        print(f'Extratos não obtidos em {sorted(sem_extrato)}; '
+                              f'{sum(len(cnpjs) for cnpjs in sem_extrato.values())} fundo(s) buscado(s) de novo no próximo ciclo.')
+            erros_seguidos = 0
+        except Exception as e:
+            erros_seguidos += 1
+            espera = max(5.0, calcular_espera(erros_seguidos, base=5, teto=args.intervalo_servico))
+            print(f'Erro no ciclo do serviço ({erros_seguidos} seguido(s)): {e}. Nova tentativa em {espera:.0f} s.')
+
+        parar.wait(espera)
+
+    print('Serviço encerrado.')
+
+def criar_parser():
+    ''' Parser dos argumentos de linha de comando (também usado pelo benchmark ponta a ponta). '''
     parser = argparse.ArgumentParser(description='Script com leitura e validação de datas')
     parser.add_argument('--data', type=lambda s: datetime.strptime(s, '%Y-%m-%d'))
     parser.add_argument('--data-inicial', type=lambda s: datetime.strptime(s, '%Y-%m-%d'))
     parser.add_argument('--data-final', type=lambda s: datetime.strptime(s, '%Y-%m-%d'))
     parser.add_argument('--days-ago', type=int)
+    parser.add_argument('--fila-transformacao', type=int, default=FILA_DEFAULT,
+                        help='Quantidade de datas já buscadas aguardando transformação')
+    parser.add_argument('--fila-carga', type=int, default=FILA_DEFAULT,
+                        help='Quantidade de datas já transformadas aguardando carga no banco')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS_DEFAULT,
+                        help='Quantidade máxima de consultas simultâneas à API VORTX')
+    parser.add_argument('--fundos-por-requisicao', type=int, default=1,
+                        help='Quantidade de fundos agrupados em uma mesma requisição GraphQL (aliases)')
+    parser.add_argument('--modo-periodo', action='store_true',
+                        help='Consulta cada fundo uma vez por janela de datas (dataInicio/dataFim) em vez de dia a dia')
+    parser.add_argument('--dias-por-periodo', type=int, default=DIAS_POR_PERIODO_DEFAULT,
+                        help='Tamanho máximo, em dias, de cada janela no --modo-periodo')
+    parser.add_argument('--salvar-json', action='store_true',
+                        help='Grava também os JSONs retornados pela API em ./Temp_file/<data>/')
+    parser.add_argument('--arquivar', action='store_true',
+                        help='Guarda as respostas da API no arquivo permanente compactado, por data, '
+                             'com índice por (CNPJ, data) (não se aplica ao --streaming)')
+    parser.add_argument('--pasta-arquivo', default=PASTA_ARQUIVO_DEFAULT,
+                        help='Pasta do arquivo permanente de extratos (--arquivar e --replay)')
+    parser.add_argument('--replay', action='store_true',
+                        help='Reprocessa as datas a partir do arquivo permanente, sem consultar a API')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Não usa o cache local de respostas da API')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignora o cache na leitura e o atualiza com novas consultas')
+    parser.add_argument('--cache-max-mb', type=float, default=CACHE_MAX_MB_DEFAULT,
+                        help='Tamanho máximo do cache local, em MB')
+    parser.add_argument('--cache-dias-recentes', type=int, default=CACHE_DIAS_RECENTES_DEFAULT,
+                        help='Datas a partir de hoje menos N dias são sempre consultadas na API')
+    parser.add_argument('--estrategia-carga', choices=ESTRATEGIAS_CARGA,
+                        help='Forma de inserção no banco (padrão: ESTRATEGIA_CARGA do .env ou fast)')
+    parser.add_argument('--atualizar-fundos', action='store_true',
+                        help='Recarrega o cadastro de fundos do banco mesmo sem alterações detectadas')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Lê cada extrato em fluxo e carrega em lotes, com memória limitada (para extratos muito grandes)')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                        help='Quantidade de entradas por lote no modo --streaming')
+    parser.add_argument('--forcar-carga', action='store_true',
+                        help='Regrava todas as partições (data, CNPJ), mesmo as que não mudaram desde a última carga')
+    parser.add_argument('--max-tentativas', type=int, default=MAX_TENTATIVAS_DEFAULT,
+                        help='Tentativas por requisição em caso de timeout, 5xx ou 429')
+    parser.add_argument('--concorrencia-inicial', type=int, default=CONCORRENCIA_INICIAL_DEFAULT,
+                        help='Requisições simultâneas no início; o limite se ajusta até --max-workers')
+    parser.add_argument('--latencia-alvo', type=float, default=LATENCIA_ALVO_DEFAULT,
+                        help='Latência, em segundos, acima da qual a concorrência é reduzida')
+    parser.add_argument('--reprocessar-falhas', metavar='ARQUIVO',
+                        help='Busca apenas os pares (CNPJ, data) listados em um relatório de falhas')
+    parser.add_argument('--conexoes', type=int, default=CONEXOES_DEFAULT,
+                        help='Tamanho do pool de conexões com o banco (aumentado, se preciso, para atender '
+                             '--cargas-paralelas)')
+    parser.add_argument('--cargas-paralelas', type=int, default=CARGAS_PARALELAS_DEFAULT,
+                        help='Quantidade de datas carregadas no banco ao mesmo tempo, cada uma com sua conexão')
+    parser.add_argument('--metricas-prometheus', metavar='ARQUIVO',
+                        help='Grava também as métricas no formato texto do Prometheus (textfile collector)')
+    parser.add_argument('--perfilar-etapa', choices=ETAPAS,
+                        help='Captura o perfil de uma etapa (as etapas rodam em threads próprias; '
+                             'a busca só mede a espera pelas consultas em paralelo)')
+    parser.add_argument('--perfilar-modo', choices=MODOS_PERFIL, default='cprofile',
+                        help='Ferramenta usada em --perfilar-etapa: tempo de CPU (cprofile) ou alocações (tracemalloc)')
+    parser.add_argument('--shard', type=ler_shard, metavar='I/N',
+                        help='Execução distribuída: processa primeiro as unidades (data, CNPJ) do shard I de N e '
+                             'depois as não reservadas ou expiradas dos demais, reservando-as no banco para que '
+                             'vários processos dividam a carga')
+    parser.add_argument('--execucao', metavar='NOME',
+                        help='Identifica a carga distribuída nas reservas; processos com o mesmo nome compartilham '
+                             'as unidades concluídas (padrão: período das datas, ou "servico")')
+    parser.add_argument('--trabalhador', metavar='NOME',
+                        help='Nome deste processo nas reservas (padrão: máquina:PID); reutilizá-lo após uma queda '
+                             'retoma as reservas sem esperar a expiração')
+    parser.add_argument('--duracao-reserva', type=int, default=DURACAO_RESERVA_PADRAO,
+                        help='Segundos até uma reserva não renovada poder ser assumida por outro processo')
+    parser.add_argument('--servico', action='store_true',
+                        help='Permanece em execução e processa cada nova Data_Posicao assim que for liberada')
+    parser.add_argument('--intervalo-servico', type=int, default=INTERVALO_SERVICO_DEFAULT,
+                        help='Segundos entre as verificações de novas datas no modo --servico')
+    parser.add_argument('--janela-servico', type=int, default=JANELA_SERVICO_DEFAULT,
+                        help='Dias anteriores a hoje verificados a cada ciclo no modo --servico')
+    return parser
+
+def main():
+    tempo_inicial = time.time()
+
+    parser = criar_parser()
     args = parser.parse_args()
+    if args.replay and (args.streaming or args.servico):
+        parser.error('--replay não pode ser combinado com --streaming nem com --servico')
+    if args.cargas_paralelas < 1:
+        parser.error('--cargas-paralelas deve ser pelo menos 1')
+    if args.conexoes < conexoes_necessarias(args):
+        # Com menos conexões, as etapas esperariam pelo pool até o TimeoutError
+        print(f'--conexoes {args.conexoes} não atende --cargas-paralelas {args.cargas_paralelas}; '
+              f'usando {conexoes_necessarias(args)} conexões.')
+        args.conexoes = conexoes_necessarias(args)
 
-    # Completa os argumentos com inputs se necessário
-    preencher_args_com_input(args, DAYS_AGO_DEFAULT)
+    # Completa os argumentos com inputs se necessário. O modo serviço não é
+    # interativo e, no reprocessamento, as datas vêm do relatório de falhas
+    if not args.servico and not args.reprocessar_falhas:
+        preencher_args_com_input(args, DAYS_AGO_DEFAULT)
 
     # Normaliza datas
     data_arg = normalizar_date(args.data) if args.data else None
@@ -37,66 +639,47 @@ def main():
     database = os.getenv('DB_NAME')
     username = os.getenv('DB_USER')
     password = os.getenv('DB_PASS')
+    estrategia_carga = args.estrategia_carga or os.getenv('ESTRATEGIA_CARGA', ESTRATEGIA_CARGA_DEFAULT)
+    if estrategia_carga not in ESTRATEGIAS_CARGA:
+        print(f'Estratégia de carga inválida: {estrategia_carga}. Opções: {", ".join(ESTRATEGIAS_CARGA)}')
+        return
 
-    conexao = conectar_banco(server, database, username, password)
-    if not conexao:
+    if args.perfilar_etapa:
+        METRICAS.configurar_perfil(args.perfilar_etapa, args.perfilar_modo)
+
+    # Token de acesso, reaproveitado entre execuções e renovado quando necessário
+    contexto = ContextoExecucao(args, (server, database, username, password),
+                                GerenciadorToken(token, login), estrategia_carga)
+    if not contexto.conectar():
         print('Erro ao conectar ao banco.')
         return
 
     try:
-        # Gera e filtra datas
-        datas_candidatas = gerar_datas(data_arg, data_inicial_arg, data_final_arg, args.days_ago)
-        datas_validas = filtrar_por_datas_existentes(conexao, datas_candidatas)
-
-        print('\nResumo das datas:')
-        print('Candidatas:', [d.strftime('%Y-%m-%d') for d in datas_candidatas])
-        print('Válidas no banco:', [d.strftime('%Y-%m-%d') for d in datas_validas])
-        print()
-
-        # Verifica se há datas válidas
-        if not datas_validas:
-            print('Nenhuma Data_Posicao válida encontrada. Abortando.')
-            return
-
-        # Token de acesso
-        access_token = obter_token(token, login)
-        if not access_token:
-            print('Falha ao obter token de acesso.')
+        if args.servico:
+            executar_servico(contexto)
             return
 
-        cnpjs_convencionais = obter_cnpj_fundo(conexao)
-        pasta_saida = './Temp_file/'
-        caminho_base = os.path.join(pasta_saida, 'extrato.json')
-
-        limpar_pasta(pasta_saida)
-
-        # Processamento por data
-        for d in datas_validas:
-            data_posicao_str = d.strftime('%Y-%m-%d')
-            print(f'\nProcessando extrato para {data_posicao_str}')
-            obter_extrato(access_token, caminho_base, cnpjs_convencionais, data_posicao_str)
+        # Gera as datas candidatas
+        pendentes = None
+        if args.reprocessar_falhas:
+            pendentes = ler_relatorio_falhas(args.reprocessar_falhas)
+            datas_candidatas = sorted(datetime.strptime(data, '%Y-%m-%d').date() for data in pendentes)
+        else:
+            datas_candidatas = gerar_datas(data_arg, data_inicial_arg, data_final_arg, args.days_ago)
 
-            df, nomes_fundos = normalize_df(str(pasta_saida))
-            if df.empty or 'ID_CNPJ_Fundo' not in df.columns:
-                print('DataFrame está vazio. Nenhum dado foi inserido.')
-                continue
+        if args.shard and datas_candidatas:
+            execucao = args.execucao or f'{min(datas_candidatas):%Y%m%d}-{max(datas_candidatas):%Y%m%d}'
+            if not contexto.distribuir(execucao):
+                print('Não foi possível preparar a execução distribuída.')
+                return
 
-            mapa_ids_cota = mapear_ids_conta(conexao, nomes_fundos)
-            df = tratar_colunas(df, mapa_ids_cota)
-
-            nome_tabela = 'EXTRATO.Movimento_Conta'
-            data_posicao_df = df['Data_Posicao'].iloc[0]
-
-            for cnpj in df['ID_CNPJ_Fundo'].unique():
-                deletar_dados_existentes(conexao, data_posicao_df, nome_tabela, cnpj)
-
-            inserir_dados(conexao, nome_tabela, df)
+        executar_uma_vez(contexto, datas_candidatas, pendentes)
 
     finally:
-        conexao.close()
-        print('Conexão com banco encerrada.')
+        contexto.fechar()
+        exportar_metricas(args)
         tempo_final = time.time()
         print(f'\nTempo total de execução: {tempo_final - tempo_inicial:.2f} segundos')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
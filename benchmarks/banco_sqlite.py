@@ -0,0 +1,288 @@
+'''
+Banco SQLite que substitui o SQL Server nos benchmarks.
+
+conectar_sqlite retorna uma conexão com a parte da interface do pyodbc usada
+por Util.db_integracao (cursor como gerenciador de contexto, rowcount,
+fast_executemany, setinputsizes) e traduz os comandos T-SQL que o módulo
+emite (DELETE e UPDATE com junção em VALUES, OUTPUT, o MERGE das reservas,
+OBJECT_ID, SELECT TOP 0 ... INTO #tabela, CONVERT, DATEADD/DATEDIFF) para o
+dialeto do SQLite. Os esquemas EXTRATO, ISYS e Solis são bancos anexados;
+'EXTRATO.Movimento_Conta' é usado sem alterações e os nomes de três partes
+(ex.: [ISYS].[Cota].[Cota_Nomenclatura]) viram ISYS.Cota_Cota_Nomenclatura.
+PoolSQLite é o PoolConexoes de Util.db_integracao sobre esse banco, para
+executar o fluxo de app.py (cadastro de fundos, datas liberadas, pipeline,
+sincronização e reservas) como em produção.
+
+Os tempos não reproduzem os do SQL Server; servem para comparar versões do
+código entre si.
+'''
+import os
+import re
+import sqlite3
+from datetime import datetime
+import numpy as np
+from Util.db_integracao import PoolConexoes, CNPJ_ADMINISTRADOR_VORTX
+
+TABELA_EXTRATO = 'EXTRATO.Movimento_Conta'
+
+DDL_EXTRATO = [
+    '''
+    CREATE TABLE IF NOT EXISTS EXTRATO.Movimento_Conta (
+        Data_Posicao TEXT NOT NULL,
+        Lancamento TEXT,
+        Valor_Total REAL,
+        ID_CNPJ_Fundo TEXT NOT NULL,
+        Observacao TEXT,
+        Contabil TEXT,
+        ID_Cota_Cadastro INTEGER,
+        ID_Transaction TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS EXTRATO.IX_Movimento_Conta_Particao ON Movimento_Conta (Data_Posicao, ID_CNPJ_Fundo)',
+]
+
+# Tabelas lidas por obter_data_posicao, obter_fundos e obter_ids_cota_cadastro, apenas com as colunas usadas
+DDL_CADASTRO = [
+    'CREATE TABLE IF NOT EXISTS Solis.Data_Data (Data_Posicao DATETIME NOT NULL, ID_Status_Dia INTEGER NOT NULL)',
+    '''
+    CREATE TABLE IF NOT EXISTS ISYS.ApiVORTX_FundosVORTX (
+        ID_Fundo_VORTX INTEGER, Nome_Fundo TEXT, ID_CNPJ_Fundo TEXT, Data_criacao TEXT, ID_Status INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ISYS.Cadastro_Fundo (
+        ID_Fundo INTEGER, ID_CNPJ_Fundo TEXT, Nome_Fundo TEXT, Pasta_Carteira_Padrao TEXT,
+        ID_Tipo_Fundo INTEGER, Is_Gestao_Solis INTEGER
+    )
+    ''',
+    'CREATE TABLE IF NOT EXISTS ISYS.Parametro_Tipo_Fundo (ID_Tipo_Fundo INTEGER, Tipo_Fundo_Abreviado TEXT)',
+    'CREATE TABLE IF NOT EXISTS ISYS.Cota_Cota_Cadastro (ID_Cota_Cadastro INTEGER, ID_Fundo_Cadastro INTEGER, ID_Cota_Tipo INTEGER)',
+    '''
+    CREATE TABLE IF NOT EXISTS ISYS.Cota_Cota_Nomenclatura (
+        ID_Cota_Cadastro INTEGER, Nomenclatura_Carteira TEXT, CNPJ_Administrador TEXT,
+        Conta_Carteira TEXT, ID_Status INTEGER
+    )
+    ''',
+]
+ESQUEMAS = ('EXTRATO', 'ISYS', 'Solis')
+
+# Tipos numpy chegam como parâmetros via DataFrame.itertuples (ex.: ID_Cota_Cadastro int32)
+for _tipo in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64):
+    sqlite3.register_adapter(_tipo, int)
+sqlite3.register_adapter(np.float32, float)
+sqlite3.register_adapter(np.bool_, bool)
+# Solis.Data.Data.Data_Posicao é lida como datetime, como no pyodbc
+sqlite3.register_converter('DATETIME', lambda valor: datetime.fromisoformat(valor.decode()))
+
+_OBJECT_ID = re.compile(r"^\s*SELECT OBJECT_ID\(\?, 'U'\);?\s*$", re.I)
+# MERGE de reservar_particoes: parâmetros das partições seguidos de execução,
+# trabalhador (condição), trabalhador, duração (UPDATE), execução, trabalhador, duração (INSERT)
+_MERGE_RESERVAS = re.compile(r'^\s*MERGE ([\w.]+) WITH \(HOLDLOCK\) AS r\s+USING \(VALUES (.+?)\) AS p \(', re.I | re.S)
+_OUTPUT = re.compile(r'\s+OUTPUT (.+?)(?=\s+FROM\b|\s*;|\s*$)', re.I | re.S)
+
+def _update_com_juncao(encontrado):
+    ''' UPDATE t SET ... FROM tabela t INNER JOIN (VALUES ...) AS p (colunas) ON ... [WHERE ...] '''
+    alias, atribuicoes, tabela, valores, colunas, filtro = encontrado.groups()
+    comando = f'UPDATE {tabela} AS {alias} SET {atribuicoes} WHERE ({colunas}) IN (VALUES {valores})'
+    return comando + (f' AND {filtro.strip()}' if filtro else '')
+
+# Traduções aplicadas em ordem a cada comando
+_TRADUCOES = [
+    (re.compile(r"IF OBJECT_ID\(N'[\w.]+', N'U'\) IS NULL\s+CREATE TABLE", re.I), 'CREATE TABLE IF NOT EXISTS'),
+    # Nomes de três partes: [ISYS].[Cota].[Cota_Nomenclatura] -> ISYS.Cota_Cota_Nomenclatura
+    (re.compile(r'\[?\b(ISYS|Solis)\]?\.\[?(\w+)\]?\.\[?(\w+)\]?', re.I), r'\1.\2_\3'),
+    (re.compile(r'COUNT_BIG\(', re.I), 'COUNT('),
+    # Sem BINARY_CHECKSUM no SQLite: a assinatura do cadastro muda só com a quantidade de linhas
+    (re.compile(r'CHECKSUM_AGG\(BINARY_CHECKSUM\([^)]*\)\)', re.I), 'COUNT(*)'),
+    (re.compile(r'DATETIME2\(\d\)', re.I), 'TEXT'),
+    (re.compile(r'DATEADD\(SECOND, \?, SYSUTCDATETIME\(\)\)', re.I), "datetime('now', printf('%+d seconds', ?))"),
+    (re.compile(r'DATEDIFF\(SECOND, SYSUTCDATETIME\(\), (\w+)\)', re.I),
+     r"CAST(round((julianday(\1) - julianday('now')) * 86400) AS INTEGER)"),
+    (re.compile(r'SYSUTCDATETIME\(\)', re.I), "datetime('now')"),
+    (re.compile(r'SYSDATETIME\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'CONVERT\(CHAR\(10\), ([\w.]+), 23\)', re.I), r'substr(\1, 1, 10)'),
+    # DELETE t FROM tabela t INNER JOIN (VALUES ...) AS p (colunas) ON ...
+    (re.compile(r'DELETE (\w+) FROM ([\w.]+) \1\s+INNER JOIN \(VALUES (.+?)\) AS \w+ \(([^)]*)\)\s+ON [^;]*', re.I | re.S),
+     r'DELETE FROM \2 WHERE (\4) IN (VALUES \3)'),
+    (re.compile(r'UPDATE (\w+) SET (.+?)\s+FROM ([\w.]+) \1\s+INNER JOIN \(VALUES (.+?)\) AS \w+ \(([^)]*)\)'
+                r'\s+ON (?:(?!\bWHERE\b)[^;])*(?:\bWHERE\b([^;]*))?', re.I | re.S), _update_com_juncao),
+    # UPDATE t SET ... FROM tabela t WHERE ... (sem junção)
+    (re.compile(r'UPDATE (\w+) SET (.+?)\s+FROM ([\w.]+) \1\s+WHERE', re.I | re.S), r'UPDATE \3 AS \1 SET \2 WHERE'),
+    # SELECT ... INNER JOIN (VALUES ...) AS p (colunas) ON ...: a lista vira uma CTE
+    (re.compile(r'^(\s*SELECT .+?)INNER JOIN \(VALUES (.+?)\) AS (\w+) (\([^)]*\))', re.I | re.S),
+     r'WITH \3\4 AS (VALUES \2) \1INNER JOIN \3'),
+    (re.compile(r"IF OBJECT_ID\('tempdb\.\.#(\w+)'\) IS NOT NULL DROP TABLE #\w+", re.I), r'DROP TABLE IF EXISTS temp.\1'),
+    (re.compile(r'SELECT TOP 0 (.+?) INTO #(\w+) FROM ([\w.]+)', re.I | re.S), r'CREATE TEMP TABLE \2 AS SELECT \1 FROM \3 LIMIT 0'),
+    (re.compile(r'#(\w+)'), r'temp.\1'),
+]
+
+def _mover_output(query):
+    ''' OUTPUT inserted.colunas (T-SQL) vira RETURNING colunas, ao fim do comando. '''
+    saida = _OUTPUT.search(query)
+    if saida is None:
+        return query
+    comando = (query[:saida.start()] + query[saida.end():]).rstrip().rstrip(';')
+    return f'{comando} RETURNING {saida.group(1).replace("inserted.", "")};'
+
+def _traduzir_merge_reservas(encontrado, params):
+    '''
+    Converte o MERGE de reservar_particoes em um INSERT ... ON CONFLICT DO
+    UPDATE ... WHERE com RETURNING: só as partições inseridas ou efetivamente
+    reservadas de novo são retornadas, como no OUTPUT do MERGE.
+    '''
+    tabela, valores = encontrado.groups()
+    particoes = list(params[:-7])
+    execucao, trabalhador, duracao = params[-3:]
+    query = f'''
+        WITH p (Data_Posicao, ID_CNPJ_Fundo) AS (VALUES {valores})
+        INSERT INTO {tabela} AS r (Execucao, Data_Posicao, ID_CNPJ_Fundo, Trabalhador, Expira_Em, Tentativas)
+        SELECT ?, Data_Posicao, ID_CNPJ_Fundo, ?, datetime('now', printf('%+d seconds', ?)), 1 FROM p WHERE true
+        ON CONFLICT (Execucao, Data_Posicao, ID_CNPJ_Fundo) DO UPDATE
+            SET Trabalhador = excluded.Trabalhador, Expira_Em = excluded.Expira_Em, Tentativas = r.Tentativas + 1
+            WHERE r.Concluido_Em IS NULL AND (r.Expira_Em <= datetime('now') OR r.Trabalhador = ?)
+        RETURNING substr(Data_Posicao, 1, 10), ID_CNPJ_Fundo
+    '''
+    return query, particoes + [execucao, trabalhador, duracao, params[-6]]
+
+def traduzir(query):
+    ''' Converte um comando T-SQL emitido por Util.db_integracao para o SQLite. '''
+    query = _mover_output(query)
+    for padrao, substituicao in _TRADUCOES:
+        query = padrao.sub(substituicao, query)
+    return query
+
+class _Cursor:
+    def __init__(self, conexao):
+        self._conexao = conexao
+        self._cursor = conexao._sqlite.cursor()
+        # Aceitos para compatibilidade com o pyodbc; sem efeito no SQLite
+        self.fast_executemany = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def setinputsizes(self, tamanhos):
+        pass
+
+    def execute(self, query, params=None):
+        if _OBJECT_ID.match(query):
+            # OBJECT_ID(nome, 'U'): 1 se a tabela existir, senão NULL
+            query, params = 'SELECT ?', [1 if self._conexao.existe_tabela(params[0]) else None]
+        elif _MERGE_RESERVAS.match(query):
+            self._cursor.execute(*_traduzir_merge_reservas(_MERGE_RESERVAS.match(query), list(params)))
+            return self
+        self._cursor.execute(traduzir(query), list(params or []))
+        return self
+
+    def executemany(self, query, linhas):
+        self._cursor.executemany(traduzir(query), linhas)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+class ConexaoSQLite:
+    ''' Conexão SQLite com a interface de conexão do pyodbc (cursor, commit, rollback, close). '''
+
+    def __init__(self, caminho=None):
+        self._sqlite = sqlite3.connect(':memory:', check_same_thread=False, timeout=60,
+                                       detect_types=sqlite3.PARSE_DECLTYPES)
+        for esquema in ESQUEMAS:
+            self._sqlite.execute(f'ATTACH DATABASE ? AS {esquema}', [caminho_esquema(caminho, esquema)])
+            if caminho:
+                # Várias conexões (PoolSQLite): leitores não bloqueiam a carga
+                self._sqlite.execute(f'PRAGMA {esquema}.journal_mode=WAL')
+
+    def existe_tabela(self, nome):
+        esquema, _, tabela = nome.rpartition('.')
+        encontrada = self._sqlite.execute(
+            f"SELECT 1 FROM {esquema or 'main'}.sqlite_master WHERE type = 'table' AND name = ?", [tabela]
+        ).fetchone()
+        return encontrada is not None
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self._sqlite.commit()
+
+    def rollback(self):
+        self._sqlite.rollback()
+
+    def close(self):
+        self._sqlite.close()
+
+def caminho_esquema(caminho, esquema):
+    ''' Arquivo do esquema: o próprio `caminho` para EXTRATO e <caminho sem extensão>_<esquema>.db para os demais. '''
+    if not caminho:
+        return ':memory:'
+    if esquema == 'EXTRATO':
+        return caminho
+    return f'{os.path.splitext(caminho)[0]}_{esquema.lower()}.db'
+
+def conectar_sqlite(caminho=None):
+    '''
+    Abre o banco de testes com a tabela EXTRATO.Movimento_Conta e as tabelas
+    de cadastro criadas.
+
+    Entrada:
+        caminho (str): Arquivo do esquema EXTRATO (os demais esquemas ficam ao
+                       lado, ver caminho_esquema). Se omitido, o banco fica em memória.
+    '''
+    conexao = ConexaoSQLite(caminho)
+    for comando in DDL_EXTRATO + DDL_CADASTRO:
+        conexao._sqlite.execute(comando)
+    conexao.commit()
+    return conexao
+
+class PoolSQLite(PoolConexoes):
+    ''' PoolConexoes cujas conexões são abertas por conectar_sqlite sobre o mesmo arquivo. '''
+
+    def __init__(self, caminho, tamanho=4, **opcoes):
+        super().__init__(None, None, None, None, tamanho=tamanho, **opcoes)
+        self._caminho = caminho
+
+    def _abrir(self):
+        return conectar_sqlite(self._caminho)
+
+def popular_cadastro(conexao, cnpjs, datas, nome_fundo='FUNDO SINTETICO {cnpj}'):
+    '''
+    Cadastra os fundos (um por CNPJ, somente dígitos, com a nomenclatura
+    `nome_fundo` e o ID_Cota_Cadastro 1000 + posição) e libera as datas
+    (ID_Status_Dia = 1) para obter_fundos e obter_data_posicao.
+    O nome padrão é o nomeDoFundo de benchmarks.servidor_vortx.
+
+    Retorno:
+        dict: CNPJ (somente dígitos) -> ID_Cota_Cadastro (str).
+    '''
+    ids = {}
+    with conexao.cursor() as cursor:
+        cursor.execute('INSERT INTO ISYS.Parametro_Tipo_Fundo VALUES (1, ?)', ['FIDC'])
+        for i, cnpj in enumerate(cnpjs, start=1):
+            nome = nome_fundo.format(cnpj=cnpj)
+            ids[cnpj] = str(1000 + i)
+            cursor.execute('INSERT INTO ISYS.ApiVORTX_FundosVORTX VALUES (?, ?, ?, ?, 1)', [i, nome, cnpj, '2020-01-01'])
+            cursor.execute('INSERT INTO ISYS.Cadastro_Fundo VALUES (?, ?, ?, ?, 1, 1)', [i, cnpj, nome, f'Carteiras/{cnpj}'])
+            cursor.execute('INSERT INTO ISYS.Cota_Cota_Cadastro VALUES (?, ?, 3)', [1000 + i, i])
+            cursor.execute('INSERT INTO ISYS.Cota_Cota_Nomenclatura VALUES (?, ?, ?, ?, 1)',
+                           [1000 + i, nome, CNPJ_ADMINISTRADOR_VORTX, 'VORTX - CARTEIRA'])
+        cursor.executemany('INSERT INTO Solis.Data_Data VALUES (?, 1)', [(f'{data} 00:00:00',) for data in datas])
+    conexao.commit()
+    return ids
+
+def contar_linhas(conexao, nome_tabela=TABELA_EXTRATO):
+    with conexao.cursor() as cursor:
+        return cursor.execute(f'SELECT COUNT(*) FROM {nome_tabela}').fetchone()[0]
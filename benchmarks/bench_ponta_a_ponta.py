@@ -0,0 +1,379 @@
+'''
+Benchmark ponta a ponta do fluxo de produção: app.executar_uma_vez com o
+cadastro de fundos e as datas liberadas lidos do banco, e o pipeline
+busca (iterar_extratos) -> transformação (normalize_registros, mapear_ids_conta,
+tratar_colunas) -> carga (sincronizar_particoes), opcionalmente com
+--modo-periodo, --fundos-por-requisicao, --cargas-paralelas e --shard.
+Com --fluxo legado, mede o fluxo anterior, em série:
+obter_extrato -> normalize_df -> tratar_colunas -> inserir_dados.
+
+A API da Vortx é substituída por benchmarks.servidor_vortx (em outro
+processo) e o SQL Server por benchmarks.banco_sqlite. Para cada cenário
+(fundos x datas x entradas por fundo e dia) mede, por etapa, o tempo
+acumulado e as linhas por segundo. No fluxo de produção as etapas rodam em
+paralelo (o tempo vem de Util.metricas) e o pico de RSS (psutil) é o da
+execução inteira; no legado, é o de cada etapa.
+
+Com --saida o resultado é gravado em JSON; com --comparar ele é confrontado
+com um resultado anterior e as etapas mais lentas que a tolerância são
+apontadas (código de saída 1).
+
+Uso:
+    python -m benchmarks.bench_ponta_a_ponta
+    python -m benchmarks.bench_ponta_a_ponta --cenarios 50x1x200 200x5x1000 --latencia 0.05 --taxa-429 0.05
+    python -m benchmarks.bench_ponta_a_ponta --modo-periodo --cargas-paralelas 2 --shard 1/2
+    python -m benchmarks.bench_ponta_a_ponta --fluxo legado
+    python -m benchmarks.bench_ponta_a_ponta --saida base.json
+    python -m benchmarks.bench_ponta_a_ponta --comparar base.json --tolerancia 0.15
+'''
+import argparse
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from datetime import date, timedelta
+import psutil
+import app
+from Util import autenticacao, service
+from Util.autenticacao import GerenciadorToken
+from Util.controle_taxa import AgendadorRequisicoes, LimiteAdaptativo, RegistroFalhas
+from Util.db_integracao import inserir_dados, formatar_cnpj, ESTRATEGIAS_CARGA
+from Util.metricas import METRICAS
+from Util.processa_relatorios import normalize_df, tratar_colunas
+from benchmarks.banco_sqlite import conectar_sqlite, contar_linhas, popular_cadastro, PoolSQLite, TABELA_EXTRATO
+from benchmarks.servidor_vortx import ServidorVortxFalso
+
+CENARIOS_PADRAO = ['20x1x100', '100x1x500', '100x5x500']
+FLUXOS = ('producao', 'legado')
+# Etapas de Util.metricas no fluxo de produção, e a execução inteira
+ETAPAS_PRODUCAO = ('busca', 'normalizacao', 'mapeamento_ids', 'tratamento', 'carga', 'executar_uma_vez')
+DATA_INICIAL = date(2025, 8, 1)
+
+class MonitorMemoria:
+    ''' Amostra o RSS do processo em uma thread enquanto o bloco executa, guardando o maior valor (bytes). '''
+
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._processo = psutil.Process()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, self._processo.memory_info().rss)
+
+    def __enter__(self):
+        self.pico = self._processo.memory_info().rss
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, self._processo.memory_info().rss)
+
+def ler_cenario(texto):
+    ''' Converte "FUNDOSxDATASxENTRADAS" (ex.: 100x5x500) em uma tupla de inteiros. '''
+    try:
+        fundos, datas, entradas = (int(parte) for parte in texto.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Cenário inválido: {texto} (use FUNDOSxDATASxENTRADAS, ex.: 100x5x500)')
+    return fundos, datas, entradas
+
+@contextmanager
+def apontar_para(servidor):
+    ''' Direciona autenticação e consultas GraphQL para o servidor de testes durante o bloco. '''
+    originais = autenticacao.URL_LOGIN, service.URL_GRAPHQL
+    autenticacao.URL_LOGIN, service.URL_GRAPHQL = servidor.url_login, servidor.url_graphql
+    try:
+        yield
+    finally:
+        autenticacao.URL_LOGIN, service.URL_GRAPHQL = originais
+
+@contextmanager
+def pasta_de_trabalho(pasta):
+    ''' Executa o bloco em `pasta`, onde app.py grava Cache/ e Relatorios/. '''
+    anterior = os.getcwd()
+    os.makedirs(pasta, exist_ok=True)
+    os.chdir(pasta)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+@contextmanager
+def medir(etapas, etapa, silencioso=True):
+    ''' Acumula em etapas[etapa] o tempo e o pico de RSS do bloco; as linhas são somadas pelo chamador. '''
+    with (redirect_stdout(io.StringIO()) if silencioso else nullcontext()), MonitorMemoria() as monitor:
+        inicio = time.perf_counter()
+        yield
+        duracao = time.perf_counter() - inicio
+    dados = etapas.setdefault(etapa, {'segundos': 0.0, 'linhas': 0, 'pico_rss_mb': 0.0})
+    dados['segundos'] += duracao
+    dados['pico_rss_mb'] = max(dados['pico_rss_mb'], monitor.pico / 1024 / 1024)
+
+def opcoes_servidor(entradas, args):
+    ''' Parâmetros de ServidorVortxFalso para o cenário. '''
+    return {
+        'entradas': entradas,
+        'latencia': args.latencia,
+        'latencia_por_mil': args.latencia_por_mil,
+        'taxa_erro': args.taxa_erro,
+        'taxa_429': args.taxa_429,
+        'max_simultaneas': args.max_simultaneas,
+    }
+
+def argumentos_app(args, datas_posicao):
+    ''' Argumentos de app.py equivalentes às opções do benchmark, sem cache local de respostas. '''
+    opcoes = [
+        '--data-inicial', datas_posicao[0].isoformat(), '--data-final', datas_posicao[-1].isoformat(),
+        '--no-cache', '--estrategia-carga', args.estrategia,
+        '--max-workers', str(args.max_workers), '--concorrencia-inicial', str(args.concorrencia_inicial),
+        '--max-tentativas', str(args.max_tentativas), '--fundos-por-requisicao', str(args.fundos_por_requisicao),
+        '--cargas-paralelas', str(args.cargas_paralelas),
+    ]
+    if args.modo_periodo:
+        opcoes.append('--modo-periodo')
+    if args.shard:
+        opcoes += ['--shard', args.shard]
+    args_app = app.criar_parser().parse_args(opcoes)
+    args_app.conexoes = max(args_app.conexoes, app.conexoes_necessarias(args_app))
+    return args_app
+
+def executar_cenario_producao(fundos, datas, entradas, args, pasta):
+    '''
+    Executa app.executar_uma_vez para as datas do cenário, com o cadastro de
+    fundos e as datas liberadas no banco SQLite e um PoolSQLite como pool de conexões.
+
+    Retorno:
+        dict: Métricas por etapa, totais do cenário e contadores do servidor.
+    '''
+    nome = f'{fundos}x{datas}x{entradas}'
+    pasta_cenario = os.path.join(pasta, nome)
+    shutil.rmtree(pasta_cenario, ignore_errors=True)
+    cnpjs = [f'{i:014d}' for i in range(1, fundos + 1)]
+    datas_posicao = [DATA_INICIAL + timedelta(days=d) for d in range(datas)]
+    args_app = argumentos_app(args, datas_posicao)
+
+    etapas = {}
+    with pasta_de_trabalho(pasta_cenario):
+        caminho_banco = os.path.abspath('extrato.db')
+        conexao = conectar_sqlite(caminho_banco)
+        popular_cadastro(conexao, cnpjs, [d.isoformat() for d in datas_posicao])
+        conexao.close()
+
+        inicio = time.perf_counter()
+        with ServidorVortxFalso(**opcoes_servidor(entradas, args)) as servidor, apontar_para(servidor):
+            contexto = app.ContextoExecucao(args_app, (None, None, None, None),
+                                            GerenciadorToken('token-benchmark', 'login-benchmark', caminho=None),
+                                            args_app.estrategia_carga)
+            contexto.conexao = PoolSQLite(caminho_banco, tamanho=args_app.conexoes)
+            antes = METRICAS.relatorio()
+            try:
+                with medir(etapas, 'executar_uma_vez', not args.verbose):
+                    if not contexto.conectar() or (args_app.shard and not contexto.distribuir(nome)):
+                        raise RuntimeError(f'Banco SQLite indisponível para {nome}; execute com --verbose para ver o erro.')
+                    app.executar_uma_vez(contexto, datas_posicao)
+            finally:
+                with redirect_stdout(io.StringIO()) if not args.verbose else nullcontext():
+                    contexto.fechar()
+            depois = METRICAS.relatorio()
+            estatisticas_servidor = servidor.estatisticas()
+        duracao = time.perf_counter() - inicio
+
+        pares_sem_extrato = 0
+        for caminho in glob.glob(os.path.join('Relatorios', 'falhas_*.json')):
+            with open(caminho, 'r', encoding='utf-8') as arquivo:
+                pares_sem_extrato += len(json.load(arquivo))
+        conexao = conectar_sqlite(caminho_banco)
+        linhas_tabela = contar_linhas(conexao)
+        conexao.close()
+
+    # Util.metricas é global ao processo: o cenário é a diferença entre os dois relatórios
+    linhas_obtidas = sum(depois['linhas_por_fundo'].values()) - sum(antes['linhas_por_fundo'].values())
+    inseridas = depois['contadores'].get('db_linhas_inseridas', 0) - antes['contadores'].get('db_linhas_inseridas', 0)
+    for etapa in ETAPAS_PRODUCAO[:-1]:
+        segundos = depois['etapas'].get(etapa, {}).get('segundos', 0.0) - antes['etapas'].get(etapa, {}).get('segundos', 0.0)
+        etapas[etapa] = {'segundos': segundos, 'linhas': inseridas if etapa == 'carga' else linhas_obtidas,
+                         'pico_rss_mb': None}
+    etapas['executar_uma_vez']['linhas'] = linhas_obtidas
+    etapas = {etapa: etapas[etapa] for etapa in ETAPAS_PRODUCAO}
+    for dados in etapas.values():
+        dados['linhas_por_segundo'] = dados['linhas'] / max(dados['segundos'], 1e-9)
+    return {
+        'etapas': etapas,
+        'segundos_total': duracao,
+        'linhas_esperadas': fundos * datas * entradas,
+        'linhas_tabela': linhas_tabela,
+        'pares_sem_extrato': pares_sem_extrato,
+        'servidor': estatisticas_servidor,
+    }
+
+def executar_cenario_legado(fundos, datas, entradas, args, pasta):
+    '''
+    Executa as quatro etapas do fluxo legado, em série, para cada data do cenário.
+
+    Retorno:
+        dict: Métricas por etapa, totais do cenário e contadores do servidor.
+    '''
+    cnpjs = [formatar_cnpj(f'{i:014d}') for i in range(1, fundos + 1)]
+    mapa_ids = {service.somente_digitos(cnpj): str(1000 + i) for i, cnpj in enumerate(cnpjs)}
+
+    nome = f'{fundos}x{datas}x{entradas}'
+    caminho_banco = os.path.join(pasta, f'extrato_{nome}.db')
+    if os.path.exists(caminho_banco):
+        os.remove(caminho_banco)
+
+    etapas = {}
+    falhas = RegistroFalhas()
+    conexao = conectar_sqlite(caminho_banco)
+    inicio = time.perf_counter()
+    with ServidorVortxFalso(**opcoes_servidor(entradas, args)) as servidor, apontar_para(servidor):
+        token = GerenciadorToken('token-benchmark', 'login-benchmark', caminho=None)
+        agendador = AgendadorRequisicoes(
+            LimiteAdaptativo(inicial=args.concorrencia_inicial, maximo=args.max_workers),
+            max_tentativas=args.max_tentativas,
+        )
+        sessao = service.criar_sessao(args.max_workers)
+        try:
+            for d in range(datas):
+                data_posicao = (DATA_INICIAL + timedelta(days=d)).isoformat()
+                pasta_data = os.path.join(pasta, nome, data_posicao)
+                os.makedirs(pasta_data, exist_ok=True)
+
+                with medir(etapas, 'obter_extrato', not args.verbose):
+                    service.obter_extrato(token, os.path.join(pasta_data, 'extrato.json'), cnpjs, data_posicao,
+                                          max_workers=args.max_workers, sessao=sessao, agendador=agendador, falhas=falhas)
+                with medir(etapas, 'normalize_df', not args.verbose):
+                    df, _ = normalize_df(pasta_data)
+                etapas['obter_extrato']['linhas'] += len(df)
+                etapas['normalize_df']['linhas'] += len(df)
+                if df.empty:
+                    continue
+
+                with medir(etapas, 'tratar_colunas', not args.verbose):
+                    tratado = tratar_colunas(df, mapa_ids)
+                etapas['tratar_colunas']['linhas'] += len(tratado)
+                del df
+
+                with medir(etapas, 'inserir_dados', not args.verbose):
+                    inseridos = inserir_dados(conexao, TABELA_EXTRATO, tratado, estrategia=args.estrategia)
+                if inseridos is None:
+                    raise RuntimeError(f'inserir_dados falhou para {data_posicao}; execute com --verbose para ver o erro.')
+                etapas['inserir_dados']['linhas'] += inseridos
+        finally:
+            sessao.close()
+        estatisticas_servidor = servidor.estatisticas()
+    duracao = time.perf_counter() - inicio
+
+    for dados in etapas.values():
+        dados['linhas_por_segundo'] = dados['linhas'] / max(dados['segundos'], 1e-9)
+    linhas_tabela = contar_linhas(conexao)
+    conexao.close()
+    return {
+        'etapas': etapas,
+        'segundos_total': duracao,
+        'linhas_esperadas': fundos * datas * entradas,
+        'linhas_tabela': linhas_tabela,
+        'pares_sem_extrato': len(falhas.listar()),
+        'servidor': estatisticas_servidor,
+    }
+
+def imprimir_cenario(nome, resultado):
+    print(f'\nCenário {nome}: {resultado["segundos_total"]:.2f} s, '
+          f'{resultado["linhas_tabela"]} de {resultado["linhas_esperadas"]} linha(s) na tabela, '
+          f'{resultado["pares_sem_extrato"]} par(es) sem extrato')
+    servidor = resultado['servidor']
+    print(f'  servidor: {servidor["consultas"]} consulta(s), {servidor["status_429"]} x 429, '
+          f'{servidor["status_500"]} x 500, até {servidor["maximo_simultaneas"]} simultânea(s)')
+    print(f'  {"etapa":<16} | {"tempo (s)":>10} | {"linhas/s":>12} | {"pico RSS (MB)":>13}')
+    for etapa, dados in resultado['etapas'].items():
+        pico = '-' if dados['pico_rss_mb'] is None else f'{dados["pico_rss_mb"]:.1f}'
+        print(f'  {etapa:<16} | {dados["segundos"]:>10.3f} | {dados["linhas_por_segundo"]:>12.0f} | {pico:>13}')
+
+def comparar(base, atual, tolerancia):
+    '''
+    Lista as etapas cujo throughput (linhas/s) caiu mais que `tolerancia`
+    (fração) em relação ao resultado `base`, para os cenários presentes em ambos.
+    '''
+    regressoes = []
+    for nome, resultado in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if not anterior:
+            continue
+        for etapa, dados in resultado['etapas'].items():
+            referencia = anterior['etapas'].get(etapa)
+            if not referencia or not referencia['linhas_por_segundo']:
+                continue
+            razao = dados['linhas_por_segundo'] / referencia['linhas_por_segundo']
+            if razao < 1 - tolerancia:
+                regressoes.append(f'{nome} / {etapa}: {referencia["linhas_por_segundo"]:.0f} -> '
+                                  f'{dados["linhas_por_segundo"]:.0f} linhas/s ({(razao - 1) * 100:+.0f}%)')
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ponta a ponta com API e banco locais')
+    parser.add_argument('--cenarios', type=ler_cenario, nargs='+', default=[ler_cenario(c) for c in CENARIOS_PADRAO],
+                        help='Cenários FUNDOSxDATASxENTRADAS (entradas por fundo e dia)')
+    parser.add_argument('--fluxo', choices=FLUXOS, default='producao',
+                        help='producao: app.executar_uma_vez; legado: obter_extrato, normalize_df e inserir_dados em série')
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS_CARGA, default='fast', help='Estratégia de carga no banco')
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--fundos-por-requisicao', type=int, default=1, help='Fluxo de produção: ver app.py')
+    parser.add_argument('--modo-periodo', action='store_true', help='Fluxo de produção: ver app.py')
+    parser.add_argument('--cargas-paralelas', type=int, default=1, help='Fluxo de produção: ver app.py')
+    parser.add_argument('--shard', metavar='I/N', help='Fluxo de produção: ver app.py (um único processo, que assume os demais shards)')
+    parser.add_argument('--concorrencia-inicial', type=int, default=4)
+    parser.add_argument('--max-tentativas', type=int, default=4)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latência base do servidor (s)')
+    parser.add_argument('--latencia-por-mil', type=float, default=0.0, help='Latência adicional por mil entradas (s)')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de respostas 500')
+    parser.add_argument('--taxa-429', type=float, default=0.0, help='Fração de respostas 429')
+    parser.add_argument('--max-simultaneas', type=int, default=0, help='Limite de consultas simultâneas do servidor (0 = sem limite)')
+    parser.add_argument('--pasta', help='Pasta de trabalho (JSONs e banco SQLite); por padrão, uma pasta temporária')
+    parser.add_argument('--saida', help='Grava o resultado em JSON')
+    parser.add_argument('--comparar', metavar='ARQUIVO', help='Resultado anterior (--saida) a comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='Queda de linhas/s tolerada em --comparar (fração)')
+    parser.add_argument('--verbose', action='store_true', help='Exibe as mensagens das funções medidas')
+    args = parser.parse_args()
+
+    resultado = {'opcoes': {chave: valor for chave, valor in vars(args).items() if chave not in ('cenarios', 'comparar', 'saida')},
+                 'cenarios': {}}
+    executar_cenario = executar_cenario_producao if args.fluxo == 'producao' else executar_cenario_legado
+    with (nullcontext(args.pasta) if args.pasta else tempfile.TemporaryDirectory()) as pasta:
+        pasta = os.path.abspath(pasta)
+        for fundos, datas, entradas in args.cenarios:
+            nome = f'{fundos}x{datas}x{entradas}'
+            resultado['cenarios'][nome] = executar_cenario(fundos, datas, entradas, args, pasta)
+            imprimir_cenario(nome, resultado['cenarios'][nome])
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f'\nResultado gravado em {args.saida}')
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        if not set(base.get('cenarios', {})) & set(resultado['cenarios']):
+            print(f'\nNenhum cenário em comum com {args.comparar}; nada a comparar.')
+            return
+        regressoes = comparar(base, resultado, args.tolerancia)
+        if regressoes:
+            print(f'\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:')
+            for regressao in regressoes:
+                print(f'  {regressao}')
+            sys.exit(1)
+        print(f'\nNenhuma regressão acima de {args.tolerancia:.0%} em relação a {args.comparar}.')
+
+if __name__ == '__main__':
+    main()
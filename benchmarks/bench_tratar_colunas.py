@@ -0,0 +1,126 @@
+'''
+Benchmark de processa_relatorios.tratar_colunas.
+
+Compara a implementação vetorizada atual com a versão anterior (baseada em
+apply/inplace, reproduzida abaixo) em DataFrames sintéticos, medindo tempo e
+pico de memória (tracemalloc) e verificando que os valores produzidos são
+idênticos.
+
+Uso:
+    python -m benchmarks.bench_tratar_colunas
+    python -m benchmarks.bench_tratar_colunas --tamanhos 10000 100000 --fundos 80
+'''
+import argparse
+import gc
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from Util.processa_relatorios import tratar_colunas
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000, 5_000_000]
+
+def tratar_colunas_legado(df, id_cota_cadastro):
+    '''Versão anterior de tratar_colunas, mantida como referência.'''
+    if 'ID_CNPJ_Fundo' not in df.columns:
+        return df
+
+    if 'titulo' in df.columns and 'tituloCp' in df.columns:
+        df['Observacao'] = df['titulo'] + ' - ' + df['tituloCp']
+        df.drop(['titulo', 'tituloCp', 'tipo', 'debito', 'credito', 'isDetalheTotal'], axis=1, inplace=True)
+    else:
+        df['Observacao'] = ''
+
+    if 'saldo' in df.columns:
+        df['Contabil'] = df['saldo'].apply(lambda x: 'C' if x >= 0 else 'D')
+        df['saldo'] = df['saldo'].abs()
+    else:
+        df['Contabil'] = ''
+
+    if 'data' in df.columns:
+        df['data'] = pd.to_datetime(df['data']).dt.strftime('%Y-%m-%d')
+
+    renomear_colunas = {
+        'data': 'Data_Posicao',
+        'historico': 'Lancamento',
+        'saldo': 'Valor_Total'
+    }
+
+    for coluna in renomear_colunas:
+        if coluna not in df.columns:
+            df[coluna] = ''
+    df.rename(columns=renomear_colunas, inplace=True)
+
+    df['ID_Cota_Cadastro'] = df['ID_CNPJ_Fundo'].map(id_cota_cadastro)
+    df['ID_Cota_Cadastro'] = df['ID_Cota_Cadastro'].astype(int)
+
+    df['ID_Transaction'] = 'PYTHON_V1.0'
+
+    if 'Lancamento' in df.columns:
+        df['Lancamento'] = df['Lancamento'].astype(str).str.upper()
+
+    return df
+
+def gerar_extrato(linhas, fundos, semente=0):
+    '''Gera um DataFrame no formato de normalize_df, com `linhas` entradas distribuídas entre `fundos` CNPJs.'''
+    rng = np.random.default_rng(semente)
+    cnpjs = np.array([f'{i:014d}' for i in range(fundos)], dtype=object)
+    historicos = np.array([f'Lançamento tipo {i}' for i in range(200)], dtype=object)
+    titulos = np.array(['Caixa', 'Aplicações', 'Resgates', 'Taxas'], dtype=object)
+    saldo = np.round(rng.normal(0, 100_000, linhas), 2)
+    df = pd.DataFrame({
+        'titulo': titulos[rng.integers(0, len(titulos), linhas)],
+        'tituloCp': titulos[rng.integers(0, len(titulos), linhas)],
+        'data': '2025-08-29T00:00:00',
+        'historico': historicos[rng.integers(0, len(historicos), linhas)],
+        'tipo': 'LANCAMENTO',
+        'debito': np.where(saldo < 0, -saldo, 0.0),
+        'credito': np.where(saldo >= 0, saldo, 0.0),
+        'saldo': saldo,
+        'isDetalheTotal': False,
+        'ID_CNPJ_Fundo': np.sort(cnpjs[rng.integers(0, fundos, linhas)]),
+    })
+    mapa_ids = {cnpj: str(1000 + i) for i, cnpj in enumerate(cnpjs)}
+    return df, mapa_ids
+
+def medir(funcao, df, mapa_ids):
+    '''
+    Retorna (resultado, segundos, pico de memória em MB). O tempo e a memória
+    são medidos em execuções separadas, pois o tracemalloc distorce o tempo.
+    '''
+    entrada = df.copy()
+    gc.collect()
+    inicio = time.perf_counter()
+    resultado = funcao(entrada, mapa_ids)
+    duracao = time.perf_counter() - inicio
+
+    entrada = df.copy()
+    gc.collect()
+    tracemalloc.start()
+    funcao(entrada, mapa_ids)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, duracao, pico / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de tratar_colunas')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--fundos', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f'{"linhas":>10} | {"legado (s)":>10} | {"atual (s)":>10} | {"ganho":>6} | {"pico legado (MB)":>16} | {"pico atual (MB)":>15} | idêntico')
+    for linhas in args.tamanhos:
+        df, mapa_ids = gerar_extrato(linhas, args.fundos)
+
+        # Cada execução recebe uma cópia, pois a versão legada altera a entrada
+        legado, t_legado, m_legado = medir(tratar_colunas_legado, df, mapa_ids)
+        atual, t_atual, m_atual = medir(tratar_colunas, df, mapa_ids)
+
+        # Os valores devem ser idênticos; apenas os tipos (categóricos, int32) mudam
+        pd.testing.assert_frame_equal(atual.astype(legado.dtypes.to_dict()), legado)
+
+        print(f'{linhas:>10} | {t_legado:>10.3f} | {t_atual:>10.3f} | {t_legado / t_atual:>5.1f}x | '
+              f'{m_legado:>16.1f} | {m_atual:>15.1f} | sim')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+'''
+Servidor local que imita os endpoints da Vortx usados pelo projeto
+(vxlogin/api/user/AuthUserApi e frontier/graphql), para benchmarks sem
+acesso à API real.
+
+getDemonstrativoCaixa é respondido com entradas sintéticas e determinísticas
+para cada (CNPJ, data), nas três formas de consulta do projeto: individual,
+em lote (aliases f0, f1, ...) e por período (dataInicio/dataFim). Latência,
+erros 500, respostas 429 e o limite de requisições simultâneas são
+configuráveis. GET /estatisticas retorna os contadores de requisições.
+
+Uso:
+    python -m benchmarks.servidor_vortx --porta 8765 --entradas 500 --latencia 0.05
+'''
+import argparse
+import base64
+import json
+import multiprocessing
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+CAMINHO_LOGIN = '/vxlogin/api/user/AuthUserApi'
+CAMINHO_GRAPHQL = '/frontier/graphql'
+CAMINHO_ESTATISTICAS = '/estatisticas'
+
+TITULOS = ['Caixa', 'Aplicações', 'Resgates', 'Taxas', 'Provisões']
+HISTORICOS = [f'Lançamento sintético tipo {i}' for i in range(200)]
+
+OPCOES_PADRAO = {
+    'entradas': 200,          # Entradas por fundo e dia
+    'latencia': 0.0,          # Latência base de cada consulta (s), com variação de ±50%
+    'latencia_por_mil': 0.0,  # Latência adicional por mil entradas respondidas (s)
+    'taxa_erro': 0.0,         # Fração das consultas respondidas com 500
+    'taxa_429': 0.0,          # Fração das consultas respondidas com 429
+    'max_simultaneas': 0,     # Acima desse número de consultas em andamento, responde 429 (0 = sem limite)
+    'retry_after': 1,         # Valor do cabeçalho Retry-After nas respostas 429 (s)
+    'validade_token': 3600,   # Validade dos tokens emitidos (s)
+    'semente': 0,             # Semente das falhas sorteadas
+}
+
+def gerar_entradas(cnpj, data, quantidade):
+    ''' Gera `quantidade` entradas do demonstrativo; o resultado depende só de (cnpj, data, quantidade). '''
+    rng = random.Random(f'{cnpj}|{data}')
+    entradas = []
+    for _ in range(quantidade):
+        saldo = round(rng.gauss(0, 100_000), 2)
+        entradas.append({
+            'titulo': rng.choice(TITULOS),
+            'tituloCp': rng.choice(TITULOS),
+            'data': f'{data}T00:00:00',
+            'historico': rng.choice(HISTORICOS),
+            'tipo': 'LANCAMENTO',
+            'debito': -saldo if saldo < 0 else 0.0,
+            'credito': saldo if saldo >= 0 else 0.0,
+            'saldo': saldo,
+            'isDetalheTotal': False,
+        })
+    return entradas
+
+def gerar_demonstrativo(cnpj, data_inicio, data_fim, entradas_por_dia):
+    ''' Monta um item de getDemonstrativoCaixa com as entradas de cada dia do intervalo. '''
+    inicio = date.fromisoformat(data_inicio)
+    fim = date.fromisoformat(data_fim)
+    entradas = []
+    dia = inicio
+    while dia <= fim:
+        entradas += gerar_entradas(cnpj, dia.isoformat(), entradas_por_dia)
+        dia += timedelta(days=1)
+    digitos = ''.join(c for c in cnpj if c.isdigit())
+    return {
+        'carteira': digitos[-6:],
+        'nomeDoFundo': f'FUNDO SINTETICO {digitos}',
+        'dataInicio': data_inicio,
+        'dataFim': data_fim,
+        'entradas': entradas,
+    }
+
+def responder_consulta(corpo, entradas_por_dia):
+    '''
+    Resolve uma consulta GraphQL do projeto a partir das variáveis enviadas.
+
+    Retorno:
+        tuple: (resposta, quantidade de entradas geradas).
+    '''
+    variaveis = corpo.get('variables') or {}
+
+    if 'dataInicio' in variaveis:
+        demonstrativo = gerar_demonstrativo(variaveis['cnpjFundo'], variaveis['dataInicio'][:10],
+                                            variaveis['dataFim'][:10], entradas_por_dia)
+        return {'data': {'getDemonstrativoCaixa': [demonstrativo]}}, len(demonstrativo['entradas'])
+
+    if 'cnpjFundo' in variaveis:
+        data = variaveis['data'][:10]
+        demonstrativo = gerar_demonstrativo(variaveis['cnpjFundo'], data, data, entradas_por_dia)
+        return {'data': {'getDemonstrativoCaixa': [demonstrativo]}}, len(demonstrativo['entradas'])
+
+    # Consulta em lote (service.montar_query_lote): variáveis cnpjFundo<i> e data<i>
+    dados = {}
+    quantidade = 0
+    i = 0
+    while f'cnpjFundo{i}' in variaveis:
+        data = variaveis[f'data{i}'][:10]
+        demonstrativo = gerar_demonstrativo(variaveis[f'cnpjFundo{i}'], data, data, entradas_por_dia)
+        dados[f'f{i}'] = [demonstrativo]
+        quantidade += len(demonstrativo['entradas'])
+        i += 1
+    if not dados:
+        return {'errors': [{'message': 'Consulta não reconhecida pelo servidor de testes.'}]}, 0
+    return {'data': dados}, quantidade
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, opcoes):
+        super().__init__(endereco, _Manipulador)
+        self.opcoes = {**OPCOES_PADRAO, **opcoes}
+        self._trava = threading.Lock()
+        self._sorteio = random.Random(self.opcoes['semente'])
+        self._tokens = {}
+        self._em_andamento = 0
+        self.estatisticas = {'logins': 0, 'consultas': 0, 'status_200': 0, 'status_401': 0,
+                             'status_429': 0, 'status_500': 0, 'entradas': 0, 'maximo_simultaneas': 0}
+
+    def contar(self, nome, valor=1):
+        with self._trava:
+            self.estatisticas[nome] += valor
+
+    def sortear(self):
+        with self._trava:
+            return self._sorteio.random()
+
+    def emitir_token(self):
+        ''' Emite um token no formato JWT, com o campo exp lido por autenticacao.ler_expiracao. '''
+        expira_em = int(time.time() + self.opcoes['validade_token'])
+        conteudo = base64.urlsafe_b64encode(json.dumps({'exp': expira_em}).encode('utf-8')).decode('ascii').rstrip('=')
+        token = f'eyJhbGciOiJub25lIn0.{conteudo}.{random.getrandbits(64):016x}'
+        with self._trava:
+            self._tokens[token] = expira_em
+            self.estatisticas['logins'] += 1
+        return token
+
+    def token_valido(self, autorizacao):
+        token = (autorizacao or '').removeprefix('Bearer ')
+        with self._trava:
+            return self._tokens.get(token, 0) > time.time()
+
+    @contextmanager
+    def vaga(self):
+        ''' Reserva uma vaga de consulta simultânea; entrega False se o limite foi atingido. '''
+        limite = self.opcoes['max_simultaneas']
+        with self._trava:
+            admitida = not limite or self._em_andamento < limite
+            if admitida:
+                self._em_andamento += 1
+                self.estatisticas['maximo_simultaneas'] = max(self.estatisticas['maximo_simultaneas'], self._em_andamento)
+        try:
+            yield admitida
+        finally:
+            if admitida:
+                with self._trava:
+                    self._em_andamento -= 1
+
+class _Manipulador(BaseHTTPRequestHandler):
+    # Mantém as conexões abertas entre requisições, como a API real (keep-alive)
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == CAMINHO_ESTATISTICAS:
+            with self.server._trava:
+                estatisticas = dict(self.server.estatisticas)
+            self._responder(200, estatisticas)
+        else:
+            self._responder(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError:
+            self._responder(400, {'message': 'JSON inválido'})
+            return
+
+        servidor = self.server
+        if self.path == CAMINHO_LOGIN:
+            self._responder(200, {'token': servidor.emitir_token()})
+            return
+        if self.path != CAMINHO_GRAPHQL:
+            self._responder(404, {'message': 'Not Found'})
+            return
+
+        servidor.contar('consultas')
+        if not servidor.token_valido(self.headers.get('Authorization')):
+            servidor.contar('status_401')
+            self._responder(401, {'message': 'Unauthorized'})
+            return
+
+        opcoes = servidor.opcoes
+        with servidor.vaga() as admitida:
+            if not admitida or servidor.sortear() < opcoes['taxa_429']:
+                servidor.contar('status_429')
+                self._responder(429, {'message': 'Too Many Requests'}, {'Retry-After': str(opcoes['retry_after'])})
+                return
+            if servidor.sortear() < opcoes['taxa_erro']:
+                servidor.contar('status_500')
+                self._responder(500, {'message': 'Internal Server Error'})
+                return
+
+            resposta, quantidade = responder_consulta(corpo, opcoes['entradas'])
+            espera = opcoes['latencia'] * (0.5 + servidor.sortear()) + opcoes['latencia_por_mil'] * quantidade / 1000
+            if espera > 0:
+                time.sleep(espera)
+            servidor.contar('status_200')
+            servidor.contar('entradas', quantidade)
+            self._responder(200, resposta)
+
+def _servir(porta, opcoes, fila):
+    servidor = _ServidorHTTP(('127.0.0.1', porta), opcoes)
+    fila.put(servidor.server_address[1])
+    servidor.serve_forever()
+
+class ServidorVortxFalso:
+    '''
+    Executa o servidor em um processo separado, para que a geração das
+    respostas não dispute o GIL (nem entre na memória medida) com o código
+    sob teste.
+
+    Uso:
+        with ServidorVortxFalso(entradas=500, latencia=0.02) as servidor:
+            ... servidor.url_base ...
+    '''
+
+    def __init__(self, porta=0, **opcoes):
+        desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f'Opções desconhecidas: {", ".join(sorted(desconhecidas))}')
+        self.porta = porta
+        self.opcoes = opcoes
+        self.url_base = None
+        self._processo = None
+
+    def __enter__(self):
+        fila = multiprocessing.Queue()
+        self._processo = multiprocessing.Process(target=_servir, args=(self.porta, self.opcoes, fila), daemon=True)
+        self._processo.start()
+        self.url_base = f'http://127.0.0.1:{fila.get(timeout=30)}'
+        return self
+
+    def __exit__(self, *excecao):
+        self._processo.terminate()
+        self._processo.join()
+
+    @property
+    def url_login(self):
+        return self.url_base + CAMINHO_LOGIN
+
+    @property
+    def url_graphql(self):
+        return self.url_base + CAMINHO_GRAPHQL
+
+    def estatisticas(self):
+        ''' Contadores de requisições atendidas pelo servidor. '''
+        return requests.get(self.url_base + CAMINHO_ESTATISTICAS, timeout=10).json()
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local que imita a API da Vortx')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--entradas', type=int, default=OPCOES_PADRAO['entradas'], help='Entradas por fundo e dia')
+    parser.add_argument('--latencia', type=float, default=OPCOES_PADRAO['latencia'], help='Latência base (s)')
+    parser.add_argument('--latencia-por-mil', type=float, default=OPCOES_PADRAO['latencia_por_mil'],
+                        help='Latência adicional por mil entradas (s)')
+    parser.add_argument('--taxa-erro', type=float, default=OPCOES_PADRAO['taxa_erro'], help='Fração de respostas 500')
+    parser.add_argument('--taxa-429', type=float, default=OPCOES_PADRAO['taxa_429'], help='Fração de respostas 429')
+    parser.add_argument('--max-simultaneas', type=int, default=OPCOES_PADRAO['max_simultaneas'],
+                        help='Consultas simultâneas acima das quais o servidor responde 429 (0 = sem limite)')
+    parser.add_argument('--validade-token', type=int, default=OPCOES_PADRAO['validade_token'])
+    args = parser.parse_args()
+
+    opcoes = {chave: valor for chave, valor in vars(args).items() if chave != 'porta'}
+    servidor = _ServidorHTTP(('127.0.0.1', args.porta), opcoes)
+    print(f'Servidor de testes em http://127.0.0.1:{servidor.server_address[1]} '
+          f'(login em {CAMINHO_LOGIN}, GraphQL em {CAMINHO_GRAPHQL})')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()